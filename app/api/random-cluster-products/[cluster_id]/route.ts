@@ -0,0 +1,35 @@
+import { type NextRequest, NextResponse } from "next/server"
+import { getBackendUrl } from "@/lib/api-config"
+
+// One page of a cluster for "load more"; seed, page and page_size are passed through
+export async function GET(
+  request: NextRequest,
+  props: { params: Promise<{ cluster_id: string }> }
+) {
+  const params = await props.params
+  const backendUrl = getBackendUrl()
+  const { search } = new URL(request.url)
+
+  const apiUrl = backendUrl
+    ? `${backendUrl}/api/random-cluster-products/${params.cluster_id}${search}`
+    : `http://localhost:8000/api/random-cluster-products/${params.cluster_id}${search}`
+
+  try {
+    const response = await fetch(apiUrl, {
+      method: "GET",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      cache: "no-store",
+    })
+
+    const data = await response.json().catch(() => ({ detail: "Invalid backend response" }))
+    if (!response.ok) {
+      console.error("[Random Cluster Products] FastAPI backend error:", response.status, data)
+    }
+    return NextResponse.json(data, { status: response.status })
+  } catch (error: any) {
+    console.error("[Random Cluster Products] Error fetching from FastAPI backend:", error.message || error)
+    return NextResponse.json({ error: "Failed to connect to backend" }, { status: 502 })
+  }
+}
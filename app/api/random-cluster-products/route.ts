@@ -1,13 +1,15 @@
-import { NextResponse } from "next/server"
+import { type NextRequest, NextResponse } from "next/server"
 import { getBackendUrl } from "@/lib/api-config"
 
-export async function GET() {
+export async function GET(request: NextRequest) {
   const backendUrl = getBackendUrl()
+  // seed, page_size and clusters are passed through
+  const { search } = new URL(request.url)
   
   // Always use the backend URL (should be http://localhost:8000 in dev)
   const apiUrl = backendUrl 
-    ? `${backendUrl}/api/random-cluster-products`
-    : `http://localhost:8000/api/random-cluster-products`
+    ? `${backendUrl}/api/random-cluster-products${search}`
+    : `http://localhost:8000/api/random-cluster-products${search}`
   
   console.log("[Random Cluster Products] Fetching from:", apiUrl)
 
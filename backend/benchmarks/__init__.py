@@ -0,0 +1,4 @@
+"""
+Offline benchmarks for the in-memory indexes.
+Run from the backend directory, e.g. `python -m benchmarks.search_latency`.
+"""
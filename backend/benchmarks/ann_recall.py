@@ -0,0 +1,62 @@
+"""
+Build the IVF-PQ index over clustered synthetic embeddings and report build
+time, memory against the float32 matrix, latency and recall@k against exact
+search for several nprobe values.
+
+    python -m benchmarks.ann_recall --size 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from vectors.ann import IVFPQIndex
+from vectors.store import EmbeddingMatrix
+
+
+def clustered_vectors(size: int, dim: int, centers: int, seed: int = 0) -> np.ndarray:
+    """Topic-like structure: points scattered around random centres"""
+    rng = np.random.default_rng(seed)
+    means = rng.standard_normal((centers, dim)).astype(np.float32)
+    labels = rng.integers(0, centers, size)
+    return means[labels] + 0.6 * rng.standard_normal((size, dim)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--centers", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    ids = [str(i) for i in range(args.size)]
+    exact = EmbeddingMatrix(ids, clustered_vectors(args.size, args.dim, args.centers))
+
+    index = IVFPQIndex.build(ids, exact.matrix)
+    stats = index.stats()
+    print(f"Build: {stats['build_seconds']}s, nlist={stats['nlist']}, m={stats['pq_subvectors']}")
+    print(f"Memory: index {stats['memory_bytes'] / 1e6:.1f} MB vs float32 matrix "
+          f"{exact.nbytes / 1e6:.1f} MB ({exact.nbytes / stats['memory_bytes']:.1f}x smaller)")
+
+    rng = np.random.default_rng(1)
+    query_rows = rng.choice(args.size, args.queries, replace=False)
+    truth = [set(exact.search(exact.matrix[r], args.k)[0].tolist()) for r in query_rows]
+
+    for nprobe in (4, 8, 16, 32):
+        for rerank in (False, True):
+            times, recalls = [], []
+            for row, expected in zip(query_rows, truth):
+                started = time.perf_counter()
+                hits = index.search(exact.matrix[row], args.k, nprobe=nprobe, exact=exact if rerank else None)
+                times.append(time.perf_counter() - started)
+                found = {int(pid) for pid, _ in hits}
+                recalls.append(len(found & expected) / args.k)
+            label = "PQ + exact rerank" if rerank else "PQ only"
+            print(f"nprobe={nprobe:>2} {label:>17}: recall@{args.k} {np.mean(recalls):.3f}, "
+                  f"p50 {np.percentile(times, 50) * 1000:.2f} ms, p99 {np.percentile(times, 99) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
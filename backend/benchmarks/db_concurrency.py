@@ -0,0 +1,106 @@
+"""
+Concurrent-load throughput of route-style handlers against a PostgREST
+stand-in that answers after a fixed delay, comparing the blocking sync
+client called from `async def` (how the routers used to work) with
+database.get_async_supabase / execute. Latency is per handler call; event
+loop lag is what a request that never touches the database waits meanwhile.
+
+    python -m benchmarks.db_concurrency --latency-ms 50 --requests 400 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import database
+from benchmarks.search_latency import percentiles
+from config import settings
+
+
+def start_stub(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = json.dumps([{"id": "p1", "name": "Product"}]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def blocking_handler():
+    supabase = database.get_supabase_client()
+    return supabase.table("products").select("*").eq("id", "p1").execute().data
+
+
+async def async_handler():
+    supabase = await database.get_async_supabase()
+    return (await database.execute(supabase.table("products").select("*").eq("id", "p1"))).data
+
+
+async def probe_lag(lags, stop: asyncio.Event, interval: float = 0.005):
+    """How late a 5ms timer fires: the wait any DB-free request would see"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def load(handler, requests: int, concurrency: int):
+    gate = asyncio.Semaphore(concurrency)
+    samples, lags = [], []
+
+    async def one():
+        async with gate:
+            started = time.perf_counter()
+            await handler()
+            samples.append(time.perf_counter() - started)
+
+    await handler()   # connect / warm the pool outside the measurement
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe_lag(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await prober
+    return requests / elapsed, samples, lags
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    server = start_stub(args.latency_ms / 1000)
+    settings.SUPABASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    settings.SUPABASE_KEY = "benchmark-key"
+    database._supabase_client = None
+    print(f"Stub latency {args.latency_ms}ms, {args.requests} requests, "
+          f"concurrency {args.concurrency}, DB_POOL_SIZE {settings.DB_POOL_SIZE}")
+
+    for label, handler in (("sync client", blocking_handler), ("async client", async_handler)):
+        throughput, samples, lags = asyncio.run(load(handler, args.requests, args.concurrency))
+        print(f"{label:>14}: {throughput:8.1f} req/s  latency ms {percentiles(samples)}  "
+              f"event loop lag ms {percentiles(lags)}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
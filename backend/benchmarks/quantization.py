@@ -0,0 +1,68 @@
+"""
+Export clustered synthetic embeddings to the quantised store and compare
+int8 / float16 search with and without exact re-scoring against the
+float32 matrix: recall@k, score error, scanned bytes and latency.
+
+    python -m benchmarks.quantization --size 100000
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.ann_recall import clustered_vectors
+from vectors.quantized import QuantizedEmbeddingStore, write_store
+from vectors.store import EmbeddingMatrix
+
+
+def pages(ids, vectors, page_size=1000):
+    for start in range(0, len(ids), page_size):
+        yield ids[start:start + page_size], vectors[start:start + page_size]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--centers", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    ids = [str(i) for i in range(args.size)]
+    exact = EmbeddingMatrix(ids, clustered_vectors(args.size, args.dim, args.centers))
+
+    rng = np.random.default_rng(1)
+    queries = exact.matrix[rng.choice(args.size, args.queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(args.dim)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact.search_many(queries, args.k)
+    print(f"float32 matrix: {exact.nbytes / 1e6:.1f} MB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in ("int8", "float16"):
+            directory = f"{tmp}/{dtype}"
+            started = time.time()
+            write_store(directory, pages(ids, exact.matrix), dtype)
+            store = QuantizedEmbeddingStore(directory)
+            print(f"{dtype}: exported in {time.time() - started:.1f}s, scanned {store.nbytes / 1e6:.1f} MB "
+                  f"({exact.nbytes / store.nbytes:.1f}x smaller)")
+
+            for rescore in (False, True):
+                started = time.perf_counter()
+                results = store.search_many(queries, args.k, rescore=rescore)
+                elapsed = time.perf_counter() - started
+                recalls, errors = [], []
+                for (rows, scores), (true_rows, true_scores) in zip(results, truth):
+                    recalls.append(len(set(rows.tolist()) & set(true_rows.tolist())) / args.k)
+                    errors.append(np.abs(scores - true_scores[:len(scores)]).max())
+                label = "+ exact rescore" if rescore else "quantised only"
+                print(f"  {label:>15}: recall@{args.k} {np.mean(recalls):.4f}, "
+                      f"max score error {np.max(errors):.5f}, "
+                      f"{elapsed / args.queries * 1000:.2f} ms/query (batched)")
+            del store
+
+
+if __name__ == "__main__":
+    main()
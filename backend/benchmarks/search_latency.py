@@ -0,0 +1,56 @@
+"""
+Build the search index over a synthetic catalog and report query latency.
+
+    python -m benchmarks.search_latency --size 100000 --queries 2000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import WORDS, BRANDS, make_catalog
+from catalog.facets import FacetIndex
+from catalog.search import SearchIndex
+from catalog.snapshot import CatalogSnapshot
+
+
+def percentiles(samples):
+    arr = np.array(samples) * 1000
+    return {p: round(float(np.percentile(arr, p)), 3) for p in (50, 90, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    snapshot = CatalogSnapshot(make_catalog(args.size))
+    facets = FacetIndex(snapshot)
+    index = SearchIndex(snapshot, facets)
+    print(f"Index: {index.stats()}")
+
+    rnd = random.Random(1)
+    vocabulary = WORDS + [b.lower() for b in BRANDS]
+    workloads = {
+        "single term": lambda: rnd.choice(vocabulary),
+        "two terms": lambda: " ".join(rnd.sample(vocabulary, 2)),
+        "prefix": lambda: rnd.choice(vocabulary)[:3],
+        "typo": lambda: (lambda w: w[:2] + w[3:])(rnd.choice([w for w in vocabulary if len(w) >= 5])),
+    }
+    mask = facets.mask({"category": "appliances"})
+
+    for name, make_query in workloads.items():
+        for label, query_mask in (("", None), (" +category", mask)):
+            samples = []
+            for _ in range(args.queries):
+                query = make_query()
+                started = time.perf_counter()
+                index.search(query, mask=query_mask, limit=20)
+                samples.append(time.perf_counter() - started)
+            print(f"{name + label:>24}: ms {percentiles(samples)}")
+
+
+if __name__ == "__main__":
+    main()
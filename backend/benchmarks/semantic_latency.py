@@ -0,0 +1,72 @@
+"""
+Compare blocked top-k search on the embedding matrix against brute force
+(full matrix product + argsort): latency per query, batched throughput and
+recall@k.
+
+    python -m benchmarks.semantic_latency --size 100000 --queries 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from vectors.store import EmbeddingMatrix
+
+
+def brute_force(matrix: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(matrix @ query))[:k]
+
+
+def recall(found: np.ndarray, exact: np.ndarray) -> float:
+    return len(np.intersect1d(found, exact)) / len(exact)
+
+
+def ms(samples):
+    arr = np.array(samples) * 1000
+    return {p: round(float(np.percentile(arr, p)), 3) for p in (50, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = EmbeddingMatrix([str(i) for i in range(args.size)], rng.standard_normal((args.size, args.dim)))
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    category_mask = rng.random(args.size) < 0.2
+    print(f"Matrix: {args.size} x {args.dim} float32, {matrix.nbytes / 1e6:.1f} MB")
+
+    for label, mask in (("all", None), ("20% filter", category_mask)):
+        brute_times, blocked_times, recalls = [], [], []
+        for query in queries:
+            started = time.perf_counter()
+            scores = matrix.matrix @ query
+            if mask is not None:
+                scores = np.where(mask, scores, -np.inf)
+            exact = np.argsort(-scores)[:args.k]
+            brute_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            rows, _ = matrix.search(query, args.k, mask)
+            blocked_times.append(time.perf_counter() - started)
+            recalls.append(recall(rows, exact))
+
+        print(f"[{label}] brute force ms {ms(brute_times)}")
+        print(f"[{label}] blocked     ms {ms(blocked_times)}  recall@{args.k} {np.mean(recalls):.4f}")
+
+    started = time.perf_counter()
+    for start in range(0, args.queries, args.batch):
+        matrix.search_many(queries[start:start + args.batch], args.k)
+    elapsed = time.perf_counter() - started
+    print(f"[batched x{args.batch}] {args.queries / elapsed:.0f} queries/sec "
+          f"({elapsed / args.queries * 1000:.3f} ms/query amortised)")
+
+
+if __name__ == "__main__":
+    main()
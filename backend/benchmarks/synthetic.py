@@ -0,0 +1,44 @@
+"""
+Synthetic catalog rows shaped like the `products` table, for benchmarks
+"""
+import random
+from typing import Dict, List
+
+CATEGORIES = {
+    "appliances": ["air conditioners", "refrigerators", "washing machines", "kitchen appliances"],
+    "tv, audio & cameras": ["televisions", "headphones", "speakers", "cameras"],
+    "men's clothing": ["t-shirts", "jeans", "shirts", "innerwear"],
+    "women's shoes": ["sandals", "sports shoes", "heels", "flats"],
+    "accessories": ["bags", "watches", "sunglasses", "jewellery"],
+}
+BRANDS = ["Sony", "Samsung", "LG", "Puma", "Nike", "Adidas", "boAt", "Philips", "Titan", "Fastrack"]
+WORDS = (
+    "wireless bluetooth smart led ultra slim cotton running sports classic premium "
+    "portable digital stainless steel leather analog waterproof noise cancelling "
+    "fit casual formal black white blue red inverter star capacity litre inch"
+).split()
+
+
+def make_catalog(size: int, seed: int = 7) -> List[Dict]:
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(size):
+        main_category = rnd.choice(list(CATEGORIES))
+        sub_category = rnd.choice(CATEGORIES[main_category])
+        brand = rnd.choice(BRANDS)
+        price = int(rnd.lognormvariate(7.5, 1.2)) + 99
+        rows.append({
+            "id": f"00000000-0000-4000-8000-{i:012d}",
+            "name": f"{brand} {' '.join(rnd.sample(WORDS, 5))} {sub_category}",
+            "main_category": main_category,
+            "sub_category": sub_category,
+            "brand": brand,
+            "image": "",
+            "link": None,
+            "ratings": f"{rnd.uniform(2.5, 5.0):.1f}",
+            "no_of_ratings": f"{int(rnd.paretovariate(1.2) * 10):,}",
+            "discount_price": f"₹{price:,}",
+            "actual_price": f"₹{int(price * rnd.uniform(1.0, 2.5)):,}",
+            "cluster_id": rnd.randint(1, 50),
+        })
+    return rows
@@ -0,0 +1,3 @@
+"""
+In-memory catalog snapshot and the read indexes derived from it
+"""
@@ -0,0 +1,92 @@
+"""
+Cluster index: cluster metadata and the catalog ordinals of each cluster.
+
+Built with the snapshot, so `/api/random-cluster-products` samples clusters
+and shuffles their products in memory instead of querying `clusters` and
+`products` per request. Shuffles are derived from a seed, which the client
+sends back to page through the same order.
+"""
+import random
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from catalog.snapshot import CatalogSnapshot, get_index, register_index
+from database import get_supabase
+
+
+def fetch_cluster_meta() -> Dict[int, Dict[str, Any]]:
+    """`clusters` rows keyed by id; empty if the table cannot be read"""
+    supabase = get_supabase()
+    if not supabase:
+        return {}
+    try:
+        result = supabase.table("clusters").select("id, title, description, product_count").execute()
+    except Exception as e:
+        print(f"[Catalog] Could not load cluster metadata: {e}")
+        return {}
+    return {int(row["id"]): row for row in result.data or []}
+
+
+class ClusterIndex:
+    def __init__(self, snapshot: CatalogSnapshot, meta: Optional[Dict[int, Dict[str, Any]]] = None):
+        self.snapshot = snapshot
+        self.meta = fetch_cluster_meta() if meta is None else meta
+
+        raw = snapshot.column("cluster_id")
+        codes = np.array([-1 if c is None else int(c) for c in raw], dtype=np.int64)
+        assigned = np.flatnonzero(codes >= 0)
+        order = assigned[np.argsort(codes[assigned], kind="stable")]
+        self.cluster_ids, starts, counts = np.unique(codes[order], return_index=True, return_counts=True)
+        self.ordinals = order.astype(np.int32)     # catalog ordinals grouped by cluster
+        self.offsets = np.append(starts, len(order)).astype(np.int64)
+        self.position = {int(cid): i for i, cid in enumerate(self.cluster_ids)}
+
+    def __len__(self) -> int:
+        return len(self.cluster_ids)
+
+    def size(self, cluster_id: int) -> int:
+        i = self.position.get(cluster_id)
+        return 0 if i is None else int(self.offsets[i + 1] - self.offsets[i])
+
+    def info(self, cluster_id: int) -> Dict[str, Any]:
+        meta = self.meta.get(cluster_id, {})
+        return {
+            "id": cluster_id,
+            "title": meta.get("title") or f"Cluster {cluster_id}",
+            "description": meta.get("description") or "",
+            "total_products": self.size(cluster_id),
+        }
+
+    def sample_clusters(self, count: int, seed: int) -> List[int]:
+        """`count` distinct non-empty clusters, fixed for a given seed"""
+        rng = random.Random(seed)
+        return rng.sample([int(c) for c in self.cluster_ids], min(count, len(self.cluster_ids)))
+
+    def page(self, cluster_id: int, seed: int, page: int, page_size: int) -> List[str]:
+        """One page of the cluster's products in the order shuffled by `seed`"""
+        i = self.position.get(cluster_id)
+        if i is None:
+            return []
+        members = self.ordinals[self.offsets[i]:self.offsets[i + 1]]
+        ids = self.snapshot.ids
+        return [ids[o] for o in members[shuffled_page(len(members), cluster_id, seed, page, page_size)]]
+
+
+def shuffled_page(count: int, cluster_id: int, seed: int, page: int, page_size: int) -> np.ndarray:
+    """
+    Positions, among a cluster's `count` members in id order, on one page of
+    the order shuffled by `seed`. Shared with the cold-cache fallback in main
+    so a client paging with one seed sees the same order either way.
+    """
+    # Seeded per cluster so each cluster's order is independent of which others were drawn
+    order = np.random.default_rng([seed, cluster_id]).permutation(count)
+    start = (page - 1) * page_size
+    return order[start:start + page_size]
+
+
+def get_cluster_index() -> Optional[ClusterIndex]:
+    return get_index("clusters")
+
+
+register_index("clusters", ClusterIndex)
@@ -0,0 +1,118 @@
+"""
+Facet index: category, sub-category and brand counts for the filter sidebar.
+
+Every facet value maps to a sorted int32 array of product ordinals (its
+postings list). Active filters are resolved by intersecting postings,
+smallest first, and counts for each facet come from a bincount over the
+per-product value codes of the matching ordinals.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from catalog.snapshot import CatalogSnapshot, get_index, register_index
+
+# Public filter name -> products column
+FACET_FIELDS = {
+    "category": "main_category",
+    "sub_category": "sub_category",
+    "brand": "brand",
+}
+
+EMPTY_POSTINGS = np.empty(0, dtype=np.int32)
+
+
+class FacetField:
+    """Values, per-product codes and postings for a single facet column"""
+
+    def __init__(self, raw_values: List[Optional[str]]):
+        cleaned = [v.strip() if isinstance(v, str) else None for v in raw_values]
+        self.values: List[str] = sorted({v for v in cleaned if v})
+        self.value_to_code: Dict[str, int] = {v: i for i, v in enumerate(self.values)}
+        # -1 marks products with no value for this facet
+        self.codes = np.array(
+            [self.value_to_code[v] if v else -1 for v in cleaned],
+            dtype=np.int32,
+        )
+
+        # A stable argsort groups ordinals by code while keeping each group sorted
+        order = np.argsort(self.codes, kind="stable").astype(np.int32)
+        sorted_codes = self.codes[order]
+        bounds = np.searchsorted(sorted_codes, np.arange(len(self.values) + 1))
+        self.postings: List[np.ndarray] = [
+            order[bounds[i]:bounds[i + 1]] for i in range(len(self.values))
+        ]
+
+    def lookup(self, value: str) -> np.ndarray:
+        code = self.value_to_code.get(value.strip())
+        if code is None:
+            return EMPTY_POSTINGS
+        return self.postings[code]
+
+
+class FacetIndex:
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.size = len(snapshot)
+        self.fields: Dict[str, FacetField] = {
+            name: FacetField(snapshot.column(column))
+            for name, column in FACET_FIELDS.items()
+        }
+
+    def match(self, filters: Dict[str, Optional[str]], exclude: Optional[str] = None) -> Optional[np.ndarray]:
+        """
+        Sorted ordinals matching every active filter, or None when no filter
+        applies (meaning "all products"). `exclude` skips one facet's own filter.
+        """
+        postings = [
+            self.fields[name].lookup(value)
+            for name, value in filters.items()
+            if value and name != exclude and name in self.fields
+        ]
+        if not postings:
+            return None
+
+        postings.sort(key=len)
+        result = postings[0]
+        for other in postings[1:]:
+            if len(result) == 0:
+                break
+            result = np.intersect1d(result, other, assume_unique=True)
+        return result
+
+    def mask(self, filters: Dict[str, Optional[str]]) -> Optional[np.ndarray]:
+        """Boolean mask over ordinals for the active filters, or None for "all" """
+        ordinals = self.match(filters)
+        if ordinals is None:
+            return None
+        mask = np.zeros(self.size, dtype=bool)
+        mask[ordinals] = True
+        return mask
+
+    def counts(self, name: str, filters: Dict[str, Optional[str]], limit: Optional[int] = None) -> List[Dict]:
+        """
+        Value counts for one facet under the other facets' filters, so the
+        sidebar can still offer alternatives to the currently selected value.
+        """
+        field = self.fields[name]
+        ordinals = self.match(filters, exclude=name)
+        codes = field.codes if ordinals is None else field.codes[ordinals]
+        codes = codes[codes >= 0]
+        counts = np.bincount(codes, minlength=len(field.values))
+
+        nonzero = np.flatnonzero(counts)
+        # Highest count first; the stable sort keeps ties in alphabetical order
+        nonzero = nonzero[np.argsort(-counts[nonzero], kind="stable")]
+        if limit is not None:
+            nonzero = nonzero[:limit]
+        return [{"value": field.values[i], "count": int(counts[i])} for i in nonzero]
+
+    def total(self, filters: Dict[str, Optional[str]]) -> int:
+        ordinals = self.match(filters)
+        return self.size if ordinals is None else int(len(ordinals))
+
+
+def get_facet_index() -> Optional[FacetIndex]:
+    return get_index("facets")
+
+
+register_index("facets", FacetIndex)
@@ -0,0 +1,72 @@
+"""
+Homepage widget aggregates: featured, discounted and globally-loved products.
+
+All three are computed in a single pass over the catalog snapshot whenever it
+refreshes, so the widget endpoints return precomputed id lists instead of
+paging through `products` and parsing price/rating strings per request.
+The selection rules match the original per-request scans in main.py.
+"""
+import time
+from typing import Dict, List, Optional
+
+from catalog.snapshot import CatalogSnapshot, get_index, register_index
+from utils.aggregation import GroupedTopK, TopK
+from utils.parsing import parse_int, parse_rating
+
+FEATURED_SUBCATEGORIES = 4
+FEATURED_PER_SUBCATEGORY = 2
+DISCOUNT_MAX_PRICE = 499
+DISCOUNT_MIN_RATING = 4.0
+DISCOUNTED_LIMIT = 4
+GLOBALLY_LOVED_LIMIT = 20
+
+
+class HomepageAggregates:
+    def __init__(self, snapshot: CatalogSnapshot):
+        started = time.time()
+        featured = GroupedTopK(FEATURED_PER_SUBCATEGORY)
+        discounted = GroupedTopK(1)
+        loved = TopK(GLOBALLY_LOVED_LIMIT)
+
+        for pid, row in zip(snapshot.ids, snapshot.rows):
+            num_ratings = parse_int(row.get("no_of_ratings"))
+            rating = parse_rating(row.get("ratings"))
+
+            sub_cat = row.get("sub_category")
+            if sub_cat:
+                featured.add(sub_cat, num_ratings)
+                if row.get("ratings"):
+                    featured.push(sub_cat, rating, pid)
+
+            main_cat = row.get("main_category")
+            price = parse_int(row.get("discount_price"))
+            if main_cat and 0 < price < DISCOUNT_MAX_PRICE and rating > DISCOUNT_MIN_RATING:
+                discounted.push(main_cat, rating, pid)
+
+            loved.push(num_ratings, pid)
+
+        self.featured: Dict[str, List[str]] = {
+            sub_cat: featured.items(sub_cat) for sub_cat in featured.top_groups(FEATURED_SUBCATEGORIES)
+        }
+        self.discounted: List[str] = [discounted.items(main_cat)[0] for main_cat in discounted.tops][:DISCOUNTED_LIMIT]
+        self.globally_loved: List[str] = loved.items()
+
+        self.computed_at = snapshot.loaded_at
+        self.build_ms = (time.time() - started) * 1000
+
+    def stats(self) -> Dict:
+        return {
+            "computed_at": self.computed_at,
+            "age_seconds": round(time.time() - self.computed_at, 1),
+            "build_ms": round(self.build_ms, 1),
+            "featured_subcategories": len(self.featured),
+            "discounted": len(self.discounted),
+            "globally_loved": len(self.globally_loved),
+        }
+
+
+def get_homepage_aggregates() -> Optional[HomepageAggregates]:
+    return get_index("homepage")
+
+
+register_index("homepage", HomepageAggregates)
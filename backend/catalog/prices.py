@@ -0,0 +1,124 @@
+"""
+Price index: range counts and histograms for the price slider.
+
+Prices are parsed once per refresh into sorted float arrays, one for the
+whole catalog and one per facet value, so a range count is two binary
+searches. Histograms for the default bucket count are precomputed per facet
+value; other filter combinations or bucket counts are computed from the
+sorted array on demand, which only costs one searchsorted over the edges.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from catalog.facets import FacetIndex
+from catalog.snapshot import CatalogSnapshot, get_index, register_index
+from utils.parsing import parse_price
+
+HistogramKey = Tuple[Optional[str], Optional[int]]
+
+
+def _bucket_edges(lo: float, hi: float, buckets: int) -> np.ndarray:
+    if hi <= lo:
+        return np.array([lo, hi])
+    if settings.PRICE_HISTOGRAM_SCALE == "log" and lo > 0:
+        return np.geomspace(lo, hi, buckets + 1)
+    return np.linspace(lo, hi, buckets + 1)
+
+
+def build_histogram(sorted_prices: np.ndarray, buckets: int) -> List[Dict]:
+    """Bucket counts spanning the min..max of an already sorted price array"""
+    if len(sorted_prices) == 0:
+        return []
+    edges = _bucket_edges(float(sorted_prices[0]), float(sorted_prices[-1]), buckets)
+    bounds = np.searchsorted(sorted_prices, edges, side="left")
+    # The last bucket is closed on the right so the maximum price is counted
+    bounds[-1] = len(sorted_prices)
+    counts = np.diff(bounds)
+    return [
+        {"min": round(float(edges[i]), 2), "max": round(float(edges[i + 1]), 2), "count": int(counts[i])}
+        for i in range(len(counts))
+    ]
+
+
+class PriceIndex:
+    def __init__(self, snapshot: CatalogSnapshot, facets: FacetIndex):
+        self.facets = facets
+        self.buckets = settings.PRICE_HISTOGRAM_BUCKETS
+
+        parsed = [parse_price(row) for row in snapshot.rows]
+        # NaN marks products without a usable price
+        self.prices = np.array([np.nan if p is None else p for p in parsed], dtype=np.float64)
+
+        self.sorted_all = np.sort(self.prices[~np.isnan(self.prices)])
+        self.sorted_by_facet: Dict[str, List[np.ndarray]] = {}
+        for name, field in facets.fields.items():
+            per_value = []
+            for postings in field.postings:
+                values = self.prices[postings]
+                per_value.append(np.sort(values[~np.isnan(values)]))
+            self.sorted_by_facet[name] = per_value
+
+        self.histograms: Dict[HistogramKey, List[Dict]] = {
+            (None, None): build_histogram(self.sorted_all, self.buckets)
+        }
+        for name, per_value in self.sorted_by_facet.items():
+            for code, values in enumerate(per_value):
+                self.histograms[(name, code)] = build_histogram(values, self.buckets)
+
+    def _sorted_prices(self, filters: Dict[str, Optional[str]]) -> Tuple[np.ndarray, Optional[HistogramKey]]:
+        """Sorted prices under the filters plus the key of a precomputed histogram, if any"""
+        active = {name: value for name, value in filters.items() if value and name in self.facets.fields}
+        if not active:
+            return self.sorted_all, (None, None)
+
+        if len(active) == 1:
+            name, value = next(iter(active.items()))
+            code = self.facets.fields[name].value_to_code.get(value.strip())
+            if code is None:
+                return self.sorted_all[:0], None
+            return self.sorted_by_facet[name][code], (name, code)
+
+        ordinals = self.facets.match(active)
+        values = self.prices[ordinals]
+        return np.sort(values[~np.isnan(values)]), None
+
+    def count_in_range(self, sorted_prices: np.ndarray, min_price: Optional[float], max_price: Optional[float]) -> int:
+        lo = 0 if min_price is None else int(np.searchsorted(sorted_prices, min_price, side="left"))
+        hi = len(sorted_prices) if max_price is None else int(np.searchsorted(sorted_prices, max_price, side="right"))
+        return max(0, hi - lo)
+
+    def distribution(
+        self,
+        filters: Dict[str, Optional[str]],
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        buckets: Optional[int] = None,
+    ) -> Dict:
+        sorted_prices, key = self._sorted_prices(filters)
+        buckets = buckets or self.buckets
+        if key is not None and buckets == self.buckets:
+            histogram = self.histograms[key]
+        else:
+            histogram = build_histogram(sorted_prices, buckets)
+
+        return {
+            "total": int(len(sorted_prices)),
+            "count": self.count_in_range(sorted_prices, min_price, max_price),
+            "min": float(sorted_prices[0]) if len(sorted_prices) else None,
+            "max": float(sorted_prices[-1]) if len(sorted_prices) else None,
+            "buckets": histogram,
+        }
+
+
+def build_price_index(snapshot: CatalogSnapshot) -> PriceIndex:
+    facets = snapshot.indexes.get("facets") or FacetIndex(snapshot)
+    return PriceIndex(snapshot, facets)
+
+
+def get_price_index() -> Optional[PriceIndex]:
+    return get_index("prices")
+
+
+register_index("prices", build_price_index)
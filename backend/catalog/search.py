@@ -0,0 +1,267 @@
+"""
+Full-text product search over name, brand and categories.
+
+The inverted index is rebuilt with the catalog snapshot. Each term's
+postings are stored as a first ordinal plus delta gaps narrowed to the
+smallest unsigned dtype that holds them (most gaps fit in uint8/uint16),
+with term frequencies as uint8; decoding is a single cumsum. Ranking is
+BM25 over field-weighted term frequencies. Unknown query terms fall back to
+prefix expansion and then to single-edit typo correction, and results can be
+restricted by the facet index's category/brand filters.
+"""
+import bisect
+import math
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from catalog.facets import FacetIndex
+from catalog.snapshot import CatalogSnapshot, get_index, register_index
+
+TOKEN_RE = re.compile(r"[0-9a-z]+")
+STOP_WORDS = {"a", "an", "and", "the", "for", "with", "of", "in", "on", "to", "by", "s"}
+
+# Term frequency weight per field; brand and sub-category hits outrank incidental name words
+FIELD_WEIGHTS = {
+    "name": 1,
+    "brand": 3,
+    "sub_category": 2,
+    "main_category": 1,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Cap on terms a single prefix or typo expands to, to keep queries bounded
+MAX_EXPANSIONS = 20
+TYPO_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789"
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def _narrow_dtype(max_value: int):
+    if max_value <= np.iinfo(np.uint8).max:
+        return np.uint8
+    if max_value <= np.iinfo(np.uint16).max:
+        return np.uint16
+    return np.uint32
+
+
+class Postings:
+    """Delta-compressed postings list for one term"""
+
+    __slots__ = ("first", "gaps", "tfs")
+
+    def __init__(self, ordinals: np.ndarray, tfs: np.ndarray):
+        self.first = int(ordinals[0])
+        gaps = np.diff(ordinals)
+        self.gaps = gaps.astype(_narrow_dtype(int(gaps.max()) if len(gaps) else 0))
+        self.tfs = np.minimum(tfs, 255).astype(np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.tfs)
+
+    def decode(self) -> np.ndarray:
+        ordinals = np.empty(len(self.tfs), dtype=np.int64)
+        ordinals[0] = self.first
+        np.cumsum(self.gaps, dtype=np.int64, out=ordinals[1:])
+        ordinals[1:] += self.first
+        return ordinals
+
+    def nbytes(self) -> int:
+        return self.gaps.nbytes + self.tfs.nbytes + 8
+
+
+def _edits1(word: str) -> set:
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletes = [l + r[1:] for l, r in splits if r]
+    transposes = [l + r[1] + r[0] + r[2:] for l, r in splits if len(r) > 1]
+    replaces = [l + c + r[1:] for l, r in splits if r for c in TYPO_ALPHABET]
+    inserts = [l + c + r for l, r in splits for c in TYPO_ALPHABET]
+    return set(deletes + transposes + replaces + inserts)
+
+
+class SearchIndex:
+    def __init__(self, snapshot: CatalogSnapshot, facets: FacetIndex):
+        started = time.time()
+        self.facets = facets
+        self.snapshot = snapshot
+        self.size = len(snapshot)
+
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        tfs: List[int] = []
+        doc_lengths = np.zeros(self.size, dtype=np.float32)
+
+        for ordinal, row in enumerate(snapshot.rows):
+            weighted: Counter = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(row.get(field)):
+                    weighted[token] += weight
+            doc_lengths[ordinal] = sum(weighted.values())
+            for token, tf in weighted.items():
+                term_ids.append(vocab.setdefault(token, len(vocab)))
+                doc_ids.append(ordinal)
+                tfs.append(tf)
+
+        terms_arr = np.array(term_ids, dtype=np.int32)
+        docs_arr = np.array(doc_ids, dtype=np.int32)
+        tfs_arr = np.array(tfs, dtype=np.int32)
+        # Rows were appended in ordinal order, so a stable sort on term keeps each list sorted
+        order = np.argsort(terms_arr, kind="stable")
+        terms_arr, docs_arr, tfs_arr = terms_arr[order], docs_arr[order], tfs_arr[order]
+        bounds = np.searchsorted(terms_arr, np.arange(len(vocab) + 1))
+
+        self.postings: Dict[str, Postings] = {}
+        for term, term_id in vocab.items():
+            lo, hi = bounds[term_id], bounds[term_id + 1]
+            self.postings[term] = Postings(docs_arr[lo:hi], tfs_arr[lo:hi])
+
+        self.sorted_terms: List[str] = sorted(self.postings)
+        avgdl = float(doc_lengths.mean()) if self.size else 1.0
+        # Per-document BM25 length normalisation, precomputed once
+        self.norm = (BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(avgdl, 1e-6))).astype(np.float32)
+        self.build_seconds = time.time() - started
+
+    # ---------- term resolution ----------
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings[term])
+        return math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+
+    def prefix_terms(self, prefix: str, limit: int = MAX_EXPANSIONS) -> List[str]:
+        """Vocabulary terms starting with `prefix`, most frequent first"""
+        lo = bisect.bisect_left(self.sorted_terms, prefix)
+        hi = bisect.bisect_left(self.sorted_terms, prefix + "\uffff", lo)
+        matches = self.sorted_terms[lo:hi]
+        if len(matches) > limit:
+            matches = sorted(matches, key=lambda t: -len(self.postings[t]))[:limit]
+        return matches
+
+    def typo_terms(self, term: str, limit: int = MAX_EXPANSIONS) -> List[str]:
+        """Vocabulary terms one edit away from `term`, most frequent first"""
+        if len(term) < 4:
+            return []
+        matches = [t for t in _edits1(term) if t in self.postings]
+        return sorted(matches, key=lambda t: -len(self.postings[t]))[:limit]
+
+    def resolve(self, token: str, allow_prefix: bool) -> List[str]:
+        if token in self.postings:
+            return [token]
+        if allow_prefix and len(token) >= 2:
+            expanded = self.prefix_terms(token)
+            if expanded:
+                return expanded
+        return self.typo_terms(token)
+
+    # ---------- querying ----------
+
+    def search(
+        self,
+        query: str,
+        mask: Optional[np.ndarray] = None,
+        offset: int = 0,
+        limit: int = 20,
+    ) -> Tuple[List[Tuple[int, float]], int]:
+        """
+        Rank products for `query`. Returns ([(ordinal, score)], total_matches).
+        Products matching every query term are preferred; if none do, any match counts.
+        """
+        tokens = tokenize(query)
+        if not tokens or self.size == 0:
+            return [], 0
+
+        scores = np.zeros(self.size, dtype=np.float32)
+        matched_terms = np.zeros(self.size, dtype=np.int16)
+        resolved_tokens = 0
+
+        for i, token in enumerate(tokens):
+            # The last token is usually still being typed, so expand it as a prefix
+            terms = self.resolve(token, allow_prefix=(i == len(tokens) - 1))
+            if not terms:
+                continue
+            resolved_tokens += 1
+            token_hit = np.zeros(self.size, dtype=bool)
+            for term in terms:
+                postings = self.postings[term]
+                ordinals = postings.decode()
+                tf = postings.tfs.astype(np.float32)
+                scores[ordinals] += self.idf(term) * tf * (BM25_K1 + 1) / (tf + self.norm[ordinals])
+                token_hit[ordinals] = True
+            matched_terms += token_hit
+
+        if resolved_tokens == 0:
+            return [], 0
+
+        candidates = matched_terms >= resolved_tokens
+        if mask is not None:
+            candidates &= mask
+        if not candidates.any():
+            candidates = matched_terms > 0
+            if mask is not None:
+                candidates &= mask
+
+        hits = np.flatnonzero(candidates)
+        total = int(len(hits))
+        if total == 0:
+            return [], 0
+
+        hit_scores = scores[hits]
+        wanted = min(offset + limit, total)
+        if wanted < total:
+            top = np.argpartition(-hit_scores, wanted - 1)[:wanted]
+        else:
+            top = np.arange(total)
+        top = top[np.argsort(-hit_scores[top], kind="stable")][offset:offset + limit]
+        return [(int(hits[i]), float(hit_scores[i])) for i in top], total
+
+    def autocomplete(self, query: str, limit: int = 8) -> List[Dict]:
+        """
+        Completions for the last token of `query`, keeping the earlier tokens.
+        Falls back to single-edit corrections of the prefix when nothing matches.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        head, prefix = tokens[:-1], tokens[-1]
+
+        terms = self.prefix_terms(prefix, limit)
+        if not terms and len(prefix) >= 3:
+            candidates = set()
+            for variant in _edits1(prefix):
+                candidates.update(self.prefix_terms(variant, limit))
+            terms = sorted(candidates, key=lambda t: -len(self.postings[t]))[:limit]
+
+        lead = " ".join(head)
+        return [
+            {"text": f"{lead} {term}".strip(), "count": len(self.postings[term])}
+            for term in terms
+        ]
+
+    def stats(self) -> Dict:
+        return {
+            "documents": self.size,
+            "terms": len(self.postings),
+            "postings_bytes": sum(p.nbytes() for p in self.postings.values()),
+            "build_seconds": round(self.build_seconds, 3),
+        }
+
+
+def build_search_index(snapshot: CatalogSnapshot) -> SearchIndex:
+    facets = snapshot.indexes.get("facets") or FacetIndex(snapshot)
+    return SearchIndex(snapshot, facets)
+
+
+def get_search_index() -> Optional[SearchIndex]:
+    return get_index("search")
+
+
+register_index("search", build_search_index)
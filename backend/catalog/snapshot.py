@@ -0,0 +1,128 @@
+"""
+Catalog snapshot: the product table loaded once into memory.
+
+Read-mostly endpoints (facets, price ranges, search, homepage widgets) are
+served from indexes derived from this snapshot instead of scanning `products`
+on every request. Index modules register a builder with `register_index`;
+each refresh loads a fresh snapshot, builds every index onto it and then swaps
+the whole snapshot in, so ordinals always agree across indexes.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from config import settings
+from database import get_supabase
+
+CATALOG_COLUMNS = (
+    "id, name, main_category, sub_category, brand, image, link, ratings, "
+    "no_of_ratings, discount_price, actual_price, cluster_id"
+)
+
+# PostgREST caps responses at 1000 rows by default
+PAGE_SIZE = 1000
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of the catalog. Products are addressed by ordinal
+    (their position in `rows`), which is what every derived index stores.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+        self.ids: List[str] = [str(row["id"]) for row in rows]
+        self.id_to_ordinal: Dict[str, int] = {pid: i for i, pid in enumerate(self.ids)}
+        self.indexes: Dict[str, Any] = {}
+        self.loaded_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def column(self, name: str) -> List[Any]:
+        return [row.get(name) for row in self.rows]
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_builders: Dict[str, Callable[[CatalogSnapshot], Any]] = {}
+_refresh_lock = threading.Lock()
+
+
+def register_index(name: str, builder: Callable[[CatalogSnapshot], Any]):
+    """Register a builder whose result is stored as `snapshot.indexes[name]`"""
+    _builders[name] = builder
+    # Late registrations still get built if a snapshot is already loaded
+    if _snapshot is not None:
+        _build_index(_snapshot, name, builder)
+
+
+def _build_index(snapshot: CatalogSnapshot, name: str, builder: Callable[[CatalogSnapshot], Any]):
+    started = time.time()
+    try:
+        snapshot.indexes[name] = builder(snapshot)
+        print(f"[Catalog] Built {name} index in {(time.time() - started) * 1000:.0f}ms")
+    except Exception as e:
+        print(f"[Catalog] Failed to build {name} index: {e}")
+
+
+def get_catalog() -> Optional[CatalogSnapshot]:
+    """Current snapshot, or None if the catalog has not loaded yet"""
+    return _snapshot
+
+
+def get_index(name: str) -> Any:
+    """Index built on the current snapshot, or None if unavailable"""
+    snapshot = _snapshot
+    if snapshot is None:
+        return None
+    return snapshot.indexes.get(name)
+
+
+def fetch_catalog_rows() -> List[Dict[str, Any]]:
+    """Page through `products` ordered by id so pages stay stable during the scan"""
+    supabase = get_supabase()
+    if not supabase:
+        raise Exception("Supabase client not initialized")
+
+    rows: List[Dict[str, Any]] = []
+    offset = 0
+    while offset < settings.CATALOG_MAX_ROWS:
+        result = (
+            supabase.table("products")
+            .select(CATALOG_COLUMNS)
+            .order("id")
+            .range(offset, offset + PAGE_SIZE - 1)
+            .execute()
+        )
+        data = result.data or []
+        rows.extend(data)
+        if len(data) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+    return rows
+
+
+def refresh_catalog() -> Optional[CatalogSnapshot]:
+    """
+    Load a new snapshot and rebuild all registered indexes.
+    Concurrent callers wait for the in-flight refresh instead of starting another.
+    """
+    global _snapshot
+
+    if not _refresh_lock.acquire(blocking=False):
+        with _refresh_lock:
+            return _snapshot
+
+    try:
+        started = time.time()
+        print("[Catalog] Loading catalog snapshot...")
+        snapshot = CatalogSnapshot(fetch_catalog_rows())
+
+        for name, builder in list(_builders.items()):
+            _build_index(snapshot, name, builder)
+
+        _snapshot = snapshot
+        print(f"[Catalog] ✅ Loaded {len(snapshot)} products in {time.time() - started:.2f}s")
+        return snapshot
+    finally:
+        _refresh_lock.release()
@@ -29,6 +29,10 @@ class Settings:
     # Database
     DATABASE_URL: str = os.getenv("POSTGRES_URL", "")
 
+    # Async data access for route handlers (database.get_async_supabase / execute)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))
+    DB_QUERY_TIMEOUT_SECONDS: float = float(os.getenv("DB_QUERY_TIMEOUT_SECONDS", "10"))
+
     # Database - Direct Connection (for Recommendation Engine)
     DB_HOST: str = os.getenv("DB_HOST", "")
     DB_PORT: int = int(os.getenv("DB_PORT", "5432"))
@@ -38,5 +42,98 @@ class Settings:
     
     # Mistral AI
     MISTRAL_API_KEY: str = os.getenv("MISTRAL_API_KEY", "")
+    # Empty for the public API; e.g. a devtools.mistral_stub URL in development
+    MISTRAL_BASE_URL: str = os.getenv("MISTRAL_BASE_URL", "")
+    MISTRAL_POOL_SIZE: int = int(os.getenv("MISTRAL_POOL_SIZE", "10"))
+    # Hard cap on one completion, including the part that runs on after the deadline
+    MISTRAL_TIMEOUT_SECONDS: float = float(os.getenv("MISTRAL_TIMEOUT_SECONDS", "20"))
+    # How long a recommendation waits for the rerank before serving CF order
+    RERANK_DEADLINE_MS: int = int(os.getenv("RERANK_DEADLINE_MS", "1000"))
+    # Estimated size cap of a rerank prompt (rec_engine/prompt.py); fields are dropped to fit
+    RERANK_PROMPT_TOKEN_BUDGET: int = int(os.getenv("RERANK_PROMPT_TOKEN_BUDGET", "1500"))
+
+    # Product lookup cache
+    PRODUCT_CACHE_SIZE: int = int(os.getenv("PRODUCT_CACHE_SIZE", "20000"))
+    PRODUCT_CACHE_TTL_SECONDS: int = int(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "600"))
+
+    # Cache backend for the product, response and recommendation caches: memory, file or redis
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_DIR: str = os.getenv("CACHE_DIR", str(Path(__file__).parent / "data" / "cache"))
+    CACHE_REDIS_URL: str = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+    # Stale-while-revalidate response cache (utils/response_cache.py)
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))  # entries per route
+    RESPONSE_CACHE_STALE_SECONDS: int = int(os.getenv("RESPONSE_CACHE_STALE_SECONDS", "300"))
+    PRODUCTS_RESPONSE_TTL_SECONDS: int = int(os.getenv("PRODUCTS_RESPONSE_TTL_SECONDS", "30"))
+    HOME_RESPONSE_TTL_SECONDS: int = int(os.getenv("HOME_RESPONSE_TTL_SECONDS", "15"))
+    RECOMMENDATIONS_RESPONSE_TTL_SECONDS: int = int(os.getenv("RECOMMENDATIONS_RESPONSE_TTL_SECONDS", "60"))
+
+    # Recommendation engine data older than this is reported as stale by /health/ready
+    ENGINE_MAX_AGE_SECONDS: int = int(os.getenv("ENGINE_MAX_AGE_SECONDS", "3600"))
+    # Refresh scheduler (rec_engine/scheduler.py): periodic interval (0 disables),
+    # minimum spacing between triggered runs, and the delay before retrying a failure
+    ENGINE_REFRESH_SECONDS: int = int(os.getenv("ENGINE_REFRESH_SECONDS", "1800"))
+    ENGINE_REFRESH_MIN_INTERVAL_SECONDS: int = int(os.getenv("ENGINE_REFRESH_MIN_INTERVAL_SECONDS", "60"))
+    ENGINE_RETRY_SECONDS: int = int(os.getenv("ENGINE_RETRY_SECONDS", "30"))
+
+    # LLM rerank results by profile + candidates (rec_engine/rerank_cache.py);
+    # RERANK_CACHE_BACKEND overrides CACHE_BACKEND, e.g. "file" to persist them
+    RERANK_CACHE_SIZE: int = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+    RERANK_CACHE_TTL_SECONDS: int = int(os.getenv("RERANK_CACHE_TTL_SECONDS", "900"))
+    RERANK_CACHE_BACKEND: str = os.getenv("RERANK_CACHE_BACKEND", "")
+    # How long a two-phase rerank ticket (GET .../instant) can be polled or streamed
+    RERANK_TICKET_TTL_SECONDS: int = int(os.getenv("RERANK_TICKET_TTL_SECONDS", "120"))
+
+    # Batch precomputation for active users (rec_engine/precompute.py), run after
+    # each engine refresh; entries must outlive ENGINE_REFRESH_SECONDS to be useful
+    PRECOMPUTE_AFTER_REFRESH: bool = os.getenv("PRECOMPUTE_AFTER_REFRESH", "true").lower() == "true"
+    PRECOMPUTE_ACTIVE_DAYS: float = float(os.getenv("PRECOMPUTE_ACTIVE_DAYS", "30"))
+    # Above 1, CF scoring runs in a spawned process pool of that size
+    PRECOMPUTE_WORKERS: int = int(os.getenv("PRECOMPUTE_WORKERS", "1"))
+    # Also batch-rerank through the LLM; otherwise only CF candidates are stored and
+    # requests rerank them online (through the rerank cache)
+    PRECOMPUTE_RERANK: bool = os.getenv("PRECOMPUTE_RERANK", "false").lower() == "true"
+    PRECOMPUTE_RERANK_USERS_PER_CALL: int = int(os.getenv("PRECOMPUTE_RERANK_USERS_PER_CALL", "5"))
+    PRECOMPUTE_MAX_USERS: int = int(os.getenv("PRECOMPUTE_MAX_USERS", "100000"))
+    PRECOMPUTE_TTL_SECONDS: int = int(os.getenv("PRECOMPUTE_TTL_SECONDS", "7200"))
+    PRECOMPUTE_CACHE_BACKEND: str = os.getenv("PRECOMPUTE_CACHE_BACKEND", "")
+
+    # Dedicated thread pool for the recommendation pipeline (utils/executor.py)
+    RECOMMENDATION_WORKERS: int = int(os.getenv("RECOMMENDATION_WORKERS", "4"))
+    # Calls allowed to wait for a worker; beyond this the route answers 503
+    RECOMMENDATION_QUEUE_LIMIT: int = int(os.getenv("RECOMMENDATION_QUEUE_LIMIT", "32"))
+
+    # In-memory catalog snapshot
+    CATALOG_MAX_ROWS: int = int(os.getenv("CATALOG_MAX_ROWS", "1000000"))
+    # Reload interval for the snapshot and everything derived from it (homepage widgets included); 0 disables
+    CATALOG_REFRESH_SECONDS: int = int(os.getenv("CATALOG_REFRESH_SECONDS", "900"))
+    # Per-section deadline for GET /api/home; late sections come back empty instead of delaying the page
+    HOME_SECTION_TIMEOUT_MS: int = int(os.getenv("HOME_SECTION_TIMEOUT_MS", "1500"))
+    PRICE_HISTOGRAM_BUCKETS: int = int(os.getenv("PRICE_HISTOGRAM_BUCKETS", "20"))
+    PRICE_HISTOGRAM_SCALE: str = os.getenv("PRICE_HISTOGRAM_SCALE", "log")  # 'log' or 'linear'
+
+    # Product embeddings / semantic search
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", "384"))
+    SEMANTIC_BLOCK_ROWS: int = int(os.getenv("SEMANTIC_BLOCK_ROWS", "16384"))
+    SEMANTIC_QUERY_CACHE_SIZE: int = int(os.getenv("SEMANTIC_QUERY_CACHE_SIZE", "5000"))
+    SEMANTIC_BATCH_WINDOW_MS: float = float(os.getenv("SEMANTIC_BATCH_WINDOW_MS", "5"))
+    SEMANTIC_MAX_BATCH: int = int(os.getenv("SEMANTIC_MAX_BATCH", "32"))
+    # Quantised memory-mapped store written by `python -m vectors.quantized export`
+    EMBEDDING_STORE_DIR: str = os.getenv("EMBEDDING_STORE_DIR", str(Path(__file__).parent / "data" / "embeddings"))
+    EMBEDDING_STORE_DTYPE: str = os.getenv("EMBEDDING_STORE_DTYPE", "int8")  # 'int8' or 'float16'
+    EMBEDDING_RESCORE_FACTOR: int = int(os.getenv("EMBEDDING_RESCORE_FACTOR", "4"))
+
+    # Approximate nearest-neighbour index for content-based similar items
+    ANN_INDEX_PATH: str = os.getenv("ANN_INDEX_PATH", str(Path(__file__).parent / "data" / "ann_index.npz"))
+    ANN_NLIST: int = int(os.getenv("ANN_NLIST", "1024"))
+    ANN_NPROBE: int = int(os.getenv("ANN_NPROBE", "16"))
+    ANN_PQ_SUBVECTORS: int = int(os.getenv("ANN_PQ_SUBVECTORS", "48"))
+    CONTENT_BLEND_WEIGHT: float = float(os.getenv("CONTENT_BLEND_WEIGHT", "0.5"))
+
+    # Embedding clusters (`python -m vectors.clustering`)
+    CLUSTER_COUNT: int = int(os.getenv("CLUSTER_COUNT", "200"))
+    CLUSTER_CENTROIDS_PATH: str = os.getenv("CLUSTER_CENTROIDS_PATH", str(Path(__file__).parent / "data" / "cluster_centroids.npy"))
 
 settings = Settings()
@@ -1,8 +1,12 @@
 """
 Database connection and Supabase client
 """
-from supabase import create_client, Client
-from typing import Optional
+import asyncio
+from typing import Any, Optional
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions, Client, acreate_client, create_client
+
 from config import settings
 
 _supabase_client: Optional[Client] = None
@@ -47,3 +51,75 @@ try:
 except Exception as e:
     print(f"[Database] Failed to initialize Supabase client: {str(e)}")
     supabase = None
+
+
+# ---------- async access for request handlers ----------
+#
+# Route handlers run on the event loop, so they use the async client: a
+# query awaits its HTTP round trip instead of blocking every other request
+# in the worker. At most DB_POOL_SIZE queries are in flight per worker
+# (matching the HTTP connection pool) and each is bounded by
+# DB_QUERY_TIMEOUT_SECONDS. The sync client above stays for background jobs
+# and thread-pool code.
+
+_async_client: Optional[AsyncClient] = None
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+_query_slots: Optional[asyncio.Semaphore] = None
+_async_init_failed = False
+
+
+async def get_async_supabase() -> Optional[AsyncClient]:
+    """Async client for the running event loop, or None if credentials are missing"""
+    global _async_client, _async_loop, _query_slots, _async_init_failed
+
+    loop = asyncio.get_running_loop()
+    if _async_client is not None and _async_loop is loop:
+        return _async_client
+    if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
+        if not _async_init_failed:
+            print("[Database] Warning: Supabase credentials not configured. Some features may not work.")
+            _async_init_failed = True
+        return None
+
+    try:
+        limits = httpx.Limits(
+            max_connections=settings.DB_POOL_SIZE,
+            max_keepalive_connections=settings.DB_POOL_SIZE,
+        )
+        http_client = httpx.AsyncClient(limits=limits, timeout=settings.DB_QUERY_TIMEOUT_SECONDS, http2=False)
+        client = await acreate_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_KEY,
+            options=AsyncClientOptions(
+                postgrest_client_timeout=settings.DB_QUERY_TIMEOUT_SECONDS,
+                httpx_client=http_client,
+            ),
+        )
+        if _async_client is not None and _async_loop is loop:
+            # Another request finished creating one while this one was connecting
+            await http_client.aclose()
+            return _async_client
+        # The client, its connection pool and the semaphore all belong to this loop
+        _async_loop = loop
+        _async_client = client
+        _query_slots = asyncio.Semaphore(settings.DB_POOL_SIZE)
+        return _async_client
+    except Exception as e:
+        print(f"[Database] Error creating async Supabase client: {str(e)}")
+        return None
+
+
+async def execute(query: Any, timeout: Optional[float] = None) -> Any:
+    """
+    Await a query builder's execute() within the pool bound and a deadline.
+    Raises asyncio.TimeoutError when the query runs past `timeout` seconds.
+    """
+    if _query_slots is None:
+        await get_async_supabase()
+    slots = _query_slots or asyncio.Semaphore(settings.DB_POOL_SIZE)
+    timeout = timeout or settings.DB_QUERY_TIMEOUT_SECONDS
+    async with slots:
+        try:
+            return await asyncio.wait_for(query.execute(), timeout)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"Query timed out after {timeout}s") from None
@@ -0,0 +1,155 @@
+"""
+Local stand-in for the Mistral chat completions API, for development and tests.
+
+Answers POST /v1/chat/completions after `latency` seconds. The reply is a JSON
+array that scores every candidate product in the user message's candidates
+table, in the order given, as the rerank prompt asks; a batch prompt gets an
+object of such arrays keyed by user id. Set `fail` to answer 500 instead.
+
+    python -m devtools.mistral_stub --port 8089 --latency-ms 300
+    MISTRAL_BASE_URL=http://127.0.0.1:8089 MISTRAL_API_KEY=stub uvicorn main:app
+
+    stub = MistralStub(port=0, latency=0.2).start()   # background thread
+    url = stub.url                                     # http://127.0.0.1:<port>
+    stub.stop()
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+def candidate_ids(content: str) -> List[str]:
+    """Product ids of the candidates in a rerank prompt (see rec_engine.prompt)"""
+    lines = content.splitlines()
+    try:
+        start = lines.index("## candidates")
+        column = lines[start + 1].split("|").index("id")
+    except (ValueError, IndexError):
+        return []
+    ids = []
+    for line in lines[start + 2:]:
+        if line.startswith("## "):
+            break
+        cells = line.split("|")
+        if len(cells) > column and cells[column]:
+            ids.append(cells[column])
+    return ids
+
+
+def user_blocks(content: str) -> Dict[str, str]:
+    """{user_id: block} of a batch rerank prompt; empty for a single-user prompt"""
+    blocks: Dict[str, List[str]] = {}
+    current = None
+    for line in content.splitlines():
+        if line.startswith("# user "):
+            current = blocks.setdefault(line[len("# user "):].strip(), [])
+        elif current is not None:
+            current.append(line)
+    return {user_id: "\n".join(lines) for user_id, lines in blocks.items()}
+
+
+def stub_scores(ids: List[str]) -> List[Dict[str, Any]]:
+    return [
+        {"product_id": pid, "llm_score": round(1.0 - i / max(len(ids), 1), 3), "reason": "Stub ranking"}
+        for i, pid in enumerate(ids)
+    ]
+
+
+class MistralStub:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8089, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.fail = False
+        self.requests = 0
+        self.last_request: Optional[Dict[str, Any]] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def reply(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        messages = request.get("messages", [])
+        user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        blocks = user_blocks(user)
+        if blocks:
+            content = json.dumps({user_id: stub_scores(candidate_ids(block)) for user_id, block in blocks.items()})
+        else:
+            content = json.dumps(stub_scores(candidate_ids(user)))
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"stub-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.requests += 1
+                time.sleep(stub.latency)
+                if stub.fail or self.path.rstrip("/") != "/v1/chat/completions":
+                    status, payload = (500, {"message": "stub failure"}) if stub.fail else (404, {"message": "not found"})
+                else:
+                    stub.last_request = json.loads(body or b"{}")
+                    status, payload = 200, stub.reply(stub.last_request)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "MistralStub":
+        """Serve from a daemon thread; returns once the port is bound"""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in Mistral chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    stub = MistralStub(args.host, args.port, args.latency_ms / 1000)
+    print(f"[MistralStub] Listening on {args.host}:{args.port}")
+    stub.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
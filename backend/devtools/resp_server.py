@@ -0,0 +1,188 @@
+"""
+In-process stand-in for a Redis server, for development and tests.
+
+Speaks enough RESP2 for RedisCacheBackend (PING, AUTH, SELECT, GET, MGET,
+SET with EX/PX/NX, MSET, DEL, EXISTS, PEXPIRE, PTTL, SCAN, DBSIZE,
+FLUSHDB, INFO). Data lives in one dict; expiry is checked lazily on access.
+
+    python -m devtools.resp_server --port 6379
+
+    server = RespServer(port=0).start()   # background thread, ephemeral port
+    url = server.url                      # redis://127.0.0.1:<port>/0
+    server.stop()
+"""
+import argparse
+import asyncio
+import fnmatch
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class RespServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379):
+        self.host = host
+        self.port = port
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.commands = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    # ---------- storage ----------
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self.data[key]
+            return None
+        return value
+
+    def _set(self, key: bytes, value: bytes, ttl_ms: Optional[int] = None):
+        self.data[key] = (value, time.time() + ttl_ms / 1000 if ttl_ms else None)
+
+    # ---------- commands ----------
+
+    def handle(self, args: List[bytes]) -> Any:
+        self.commands += 1
+        name = args[0].upper().decode()
+        rest = args[1:]
+        if name == "PING":
+            return "PONG"
+        if name in ("AUTH", "SELECT"):
+            return "OK"
+        if name == "GET":
+            return self._get(rest[0])
+        if name == "MGET":
+            return [self._get(key) for key in rest]
+        if name == "SET":
+            key, value, options = rest[0], rest[1], [o.upper() for o in rest[2:]]
+            ttl_ms = None
+            if b"PX" in options:
+                ttl_ms = int(rest[2 + options.index(b"PX") + 1])
+            elif b"EX" in options:
+                ttl_ms = int(rest[2 + options.index(b"EX") + 1]) * 1000
+            if b"NX" in options and self._get(key) is not None:
+                return None
+            self._set(key, value, ttl_ms)
+            return "OK"
+        if name == "MSET":
+            for i in range(0, len(rest), 2):
+                self._set(rest[i], rest[i + 1])
+            return "OK"
+        if name == "DEL":
+            return sum(self.data.pop(key, None) is not None for key in rest)
+        if name == "EXISTS":
+            return sum(self._get(key) is not None for key in rest)
+        if name == "PEXPIRE":
+            value = self._get(rest[0])
+            if value is None:
+                return 0
+            self._set(rest[0], value, int(rest[1]))
+            return 1
+        if name == "PTTL":
+            if self._get(rest[0]) is None:
+                return -2
+            expires_at = self.data[rest[0]][1]
+            return -1 if expires_at is None else int((expires_at - time.time()) * 1000)
+        if name == "SCAN":
+            # Single pass: the whole keyspace is returned with cursor 0
+            pattern = "*"
+            if b"MATCH" in [r.upper() for r in rest]:
+                pattern = rest[[r.upper() for r in rest].index(b"MATCH") + 1].decode()
+            keys = [k for k in list(self.data) if self._get(k) is not None and fnmatch.fnmatchcase(k.decode(), pattern)]
+            return [b"0", keys]
+        if name == "DBSIZE":
+            return len(self.data)
+        if name == "FLUSHDB":
+            self.data.clear()
+            return "OK"
+        if name == "INFO":
+            return f"# Stand-in\r\nkeys:{len(self.data)}\r\ncommands:{self.commands}\r\n".encode()
+        raise ValueError(f"ERR unknown command '{name}'")
+
+    # ---------- protocol ----------
+
+    @staticmethod
+    def encode(reply: Any) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, str):
+            return f"+{reply}\r\n".encode()
+        if isinstance(reply, int):
+            return f":{reply}\r\n".encode()
+        if isinstance(reply, bytes):
+            return b"$%d\r\n%s\r\n" % (len(reply), reply)
+        if isinstance(reply, list):
+            return b"*%d\r\n" % len(reply) + b"".join(RespServer.encode(r) for r in reply)
+        raise TypeError(type(reply))
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.startswith(b"*"):
+                    # Inline command, e.g. from `nc`
+                    args = line.strip().split()
+                else:
+                    args = []
+                    for _ in range(int(line[1:-2])):
+                        length = int((await reader.readline())[1:-2])
+                        args.append((await reader.readexactly(length + 2))[:-2])
+                if not args:
+                    continue
+                try:
+                    reply = self.encode(self.handle(args))
+                except Exception as e:
+                    message = str(e) if str(e).startswith("ERR") else f"ERR {e}"
+                    reply = f"-{message}\r\n".encode()
+                writer.write(reply)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self._server = await asyncio.start_server(self._serve_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._loop = asyncio.get_running_loop()
+        self._ready.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self) -> "RespServer":
+        """Serve from a daemon thread; returns once the port is bound"""
+        thread = threading.Thread(target=lambda: asyncio.run(self._run_until_stopped()), daemon=True)
+        thread.start()
+        self._ready.wait(5)
+        return self
+
+    async def _run_until_stopped(self):
+        try:
+            await self.serve()
+        except asyncio.CancelledError:
+            pass
+
+    def stop(self):
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in Redis server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    server = RespServer(args.host, args.port)
+    print(f"[RespServer] Listening on {args.host}:{args.port}")
+    asyncio.run(server.serve())
@@ -1,18 +1,51 @@
+"""
+Generate MiniLM embeddings for every product and store them on `products.embedding`.
+
+Products are streamed in id order with keyset pagination, encoded in large
+batches (optionally across a multi-process pool), and written back in bulk
+through the `bulk_update_embeddings` function (scripts/005-bulk-update-embeddings.sql).
+Fetching, encoding and writing run as a three-stage pipeline, and the last
+written id is checkpointed so an interrupted run resumes where it stopped.
+
+Each embedding is stored with a hash of the text it was built from
+(scripts/006-embedding-hash.sql); products whose hash still matches are
+skipped, so re-runs only encode new or edited products.
+
+    python embedding.py                 # resume from the checkpoint if there is one
+    python embedding.py --restart       # ignore the checkpoint
+    python embedding.py --workers 4     # encode on a 4-process pool
+    python embedding.py --since 24h     # only products created/updated in the last day
+    python embedding.py --since last    # ...since the last completed run started
+    python embedding.py --force         # re-encode even if the hash matches
+"""
+import argparse
+import hashlib
+import json
 import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
 from dotenv import load_dotenv
 from supabase import create_client
 from sentence_transformers import SentenceTransformer
-from tqdm import tqdm
 
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+TEXT_COLUMNS = "id, name, main_category, sub_category, brand, embedding_hash"
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_checkpoint.json")
+# Start time of the last completed run, for `--since last`
+STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_state.json")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Marks the end of the stream between pipeline stages
+_DONE = object()
 
-# Load MiniLM model
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
 
 def build_text(product):
     return (
@@ -22,26 +55,232 @@ def build_text(product):
         f"Brand: {product.get('brand', '')}."
     )
 
-def fetch_products():
-    resp = supabase.table("products").select("*").execute()
-    return resp.data
 
-def update_embedding(product_id, embedding):
-    supabase.table("products") \
-        .update({"embedding": embedding.tolist()}) \
-        .eq("id", product_id) \
-        .execute()
+def text_hash(text):
+    """Stable fingerprint of the embedded text; changes whenever the embedding must"""
+    return hashlib.sha1(f"{MODEL_NAME}\n{text}".encode("utf-8")).hexdigest()
 
-def main():
-    print("Fetching products...")
-    products = fetch_products()
 
-    for p in tqdm(products):
-        text = build_text(p)
-        emb = model.encode(text)  # returns numpy array of size 384
-        update_embedding(p["id"], emb)
+def parse_since(value, state_path):
+    """
+    Resolve --since to an ISO timestamp. Accepts an ISO date/time, a relative
+    window like "90m", "24h" or "7d", or "last" for the previous completed run.
+    """
+    if value is None:
+        return None
+    if value == "last":
+        if not os.path.exists(state_path):
+            print("[Embedding] No previous run recorded; processing the full catalog")
+            return None
+        with open(state_path) as f:
+            return json.load(f)["last_run_started_at"]
+    match = re.fullmatch(r"(\d+)([mhd])", value)
+    if match:
+        amount, unit = int(match.group(1)), match.group(2)
+        delta = {"m": timedelta(minutes=amount), "h": timedelta(hours=amount), "d": timedelta(days=amount)}[unit]
+        return (datetime.now(timezone.utc) - delta).isoformat()
+    return datetime.fromisoformat(value).isoformat()
+
+
+# ---------- checkpointing ----------
+
+def load_checkpoint(path, since_arg):
+    """
+    Checkpoint for a run started with the same --since argument, if any.
+    The resolved window is stored with it so a relative "24h" resumes unchanged.
+    """
+    fresh = {"last_id": None, "processed": 0, "since_arg": since_arg, "since": None}
+    if not os.path.exists(path):
+        return fresh
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("since_arg") != since_arg:
+        print("[Embedding] Checkpoint is from a run with a different --since; starting over")
+        return fresh
+    return checkpoint
+
+
+def _write_json(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def save_checkpoint(path, checkpoint, last_id, processed):
+    _write_json(path, {**checkpoint, "last_id": last_id, "processed": processed, "updated_at": time.time()})
+
+
+# ---------- pipeline stages ----------
+
+def iter_product_pages(supabase, page_size, after_id=None, since=None):
+    """
+    Yield pages of products in id order, starting after `after_id`.
+    With `since`, only products created or updated at/after that time.
+    """
+    while True:
+        query = supabase.table("products").select(TEXT_COLUMNS).order("id").limit(page_size)
+        if since is not None:
+            query = query.or_(f"created_at.gte.{since},updated_at.gte.{since}")
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        page = query.execute().data or []
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        after_id = page[-1]["id"]
+
+
+def write_embeddings(supabase, rows, retries=3):
+    """Bulk-update one batch of {"id", "embedding"} rows, retrying transient failures"""
+    for attempt in range(retries):
+        try:
+            supabase.rpc("bulk_update_embeddings", {"rows": rows}).execute()
+            return
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            wait = 2 ** attempt
+            print(f"[Embedding] Write failed ({e}); retrying in {wait}s")
+            time.sleep(wait)
+
+
+def _producer(supabase, page_size, after_id, since, out_queue, errors):
+    try:
+        for page in iter_product_pages(supabase, page_size, after_id, since):
+            out_queue.put(page)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        out_queue.put(_DONE)
+
+
+def _writer(supabase, in_queue, write_batch, checkpoint_path, checkpoint, stats, errors):
+    processed = checkpoint["processed"]
+    try:
+        while True:
+            item = in_queue.get()
+            if item is _DONE:
+                return
+            page_last_id, rows = item
+            for start in range(0, len(rows), write_batch):
+                write_embeddings(supabase, rows[start:start + write_batch])
+            processed += len(rows)
+            stats["written"] += len(rows)
+            # Pages where every product was unchanged still advance the checkpoint
+            save_checkpoint(checkpoint_path, checkpoint, page_last_id, processed)
+    except Exception as e:
+        errors.append(e)
+        # Drain so the encoder never blocks on a dead writer
+        while in_queue.get() is not _DONE:
+            pass
+
+
+def run(args):
+    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    model = SentenceTransformer(MODEL_NAME)
+    pool = model.start_multi_process_pool(["cpu"] * args.workers) if args.workers > 1 else None
+
+    run_started_at = datetime.now(timezone.utc).isoformat()
+    if args.restart:
+        checkpoint = {"last_id": None, "processed": 0, "since_arg": args.since, "since": None}
+    else:
+        checkpoint = load_checkpoint(args.checkpoint, args.since)
+    if checkpoint["last_id"]:
+        print(f"[Embedding] Resuming after {checkpoint['last_id']} ({checkpoint['processed']} already done)")
+    else:
+        checkpoint["since"] = parse_since(args.since, args.state)
+    since = checkpoint["since"]
+    if since:
+        print(f"[Embedding] Only products created or updated since {since}")
+
+    errors = []
+    stats = {"written": 0, "skipped": 0}
+    # Small bounded queues: enough to overlap the stages without buffering the catalog
+    pages = queue.Queue(maxsize=2)
+    encoded = queue.Queue(maxsize=2)
+    producer = threading.Thread(
+        target=_producer, args=(supabase, args.page_size, checkpoint["last_id"], since, pages, errors), daemon=True
+    )
+    writer = threading.Thread(
+        target=_writer,
+        args=(supabase, encoded, args.write_batch, args.checkpoint, checkpoint, stats, errors),
+        daemon=True,
+    )
+    producer.start()
+    writer.start()
+
+    started = time.time()
+    scanned = 0
+    try:
+        while not errors:
+            page = pages.get()
+            if page is _DONE:
+                break
+            scanned += len(page)
+
+            todo, hashes, texts = [], [], []
+            for product in page:
+                text = build_text(product)
+                digest = text_hash(text)
+                if not args.force and product.get("embedding_hash") == digest:
+                    continue
+                todo.append(product["id"])
+                hashes.append(digest)
+                texts.append(text)
+            stats["skipped"] += len(page) - len(todo)
+
+            rows = []
+            if texts:
+                if pool is not None:
+                    vectors = model.encode_multi_process(texts, pool, batch_size=args.batch_size)
+                else:
+                    vectors = model.encode(texts, batch_size=args.batch_size, convert_to_numpy=True)
+                rows = [
+                    {"id": pid, "embedding": vec, "embedding_hash": digest}
+                    for pid, vec, digest in zip(todo, np.round(vectors, 6).tolist(), hashes)
+                ]
+            encoded.put((page[-1]["id"], rows))
+
+            elapsed = time.time() - started
+            print(f"[Embedding] {scanned} scanned, {stats['skipped']} unchanged, "
+                  f"{stats['written']} written, {scanned / elapsed:.1f} products/sec")
+    finally:
+        encoded.put(_DONE)
+        writer.join()
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+
+    if errors:
+        print(f"[Embedding] ❌ Stopped after {stats['written']} products: {errors[0]}")
+        print("[Embedding] Re-run to resume from the last checkpoint.")
+        return 1
+
+    elapsed = time.time() - started
+    rate = stats["written"] / elapsed if elapsed > 0 else 0.0
+    print(f"✨ Embedded {stats['written']} products ({stats['skipped']} unchanged skipped) "
+          f"in {elapsed:.1f}s ({rate:.1f} products/sec)")
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    _write_json(args.state, {"last_run_started_at": run_started_at})
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate MiniLM product embeddings")
+    parser.add_argument("--page-size", type=int, default=1000, help="products fetched per request")
+    parser.add_argument("--batch-size", type=int, default=256, help="texts per model forward pass")
+    parser.add_argument("--write-batch", type=int, default=250, help="rows per bulk update call")
+    parser.add_argument("--workers", type=int, default=1, help="encoding processes (1 = in-process)")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="ignore any existing checkpoint")
+    parser.add_argument("--since", help='ISO time, relative window ("24h", "7d") or "last"')
+    parser.add_argument("--force", action="store_true", help="re-encode even when the text hash matches")
+    parser.add_argument("--state", default=STATE_PATH)
+    raise SystemExit(run(parser.parse_args()))
 
-    print("✨ All MiniLM embeddings generated & stored successfully!")
 
 if __name__ == "__main__":
     main()
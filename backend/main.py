@@ -2,15 +2,31 @@
 UnthinkaBuy FastAPI Backend
 Main application entry point
 """
-from fastapi import FastAPI
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from routes import auth, cart_favorites, order_events, recommendations
-from rec_engine.engine import refresh_engine_data
+from routes import auth, cart_favorites, order_events, recommendations, search
+from routes.recommendations import format_recommendations, personalised, recommendation_executor, user_version
+from rec_engine.engine import engine_ready, engine_status, recommend_for_user_hybrid
+from rec_engine.precompute import precomputed_recommendations
+from rec_engine.scheduler import refresh_scheduler
+from catalog.snapshot import get_catalog, refresh_catalog
+from catalog.clusters import get_cluster_index, shuffled_page
+from catalog.homepage import get_homepage_aggregates
+from config import settings
+from utils.aggregation import GroupedTopK, TopK, iter_pages
+from utils.parsing import parse_int, parse_rating
+from utils.response_cache import cached_route, response_cache_stats
+from vectors.store import refresh_embeddings
+from vectors.ann import load_or_build_ann_index
 import products
+from models import Product
 from database import get_supabase
 from database import get_supabase
-from typing import Dict, List
+from typing import Dict, List, Optional
+import asyncio
 import os
+import time
 
 app = FastAPI(
     title="UnthinkaBuy API",
@@ -34,28 +50,38 @@ app.include_router(products.router, prefix="/api/products", tags=["Products"])
 app.include_router(cart_favorites.router, prefix="/api", tags=["Cart & Favorites"])
 app.include_router(recommendations.router, prefix="/api", tags=["Recommendations"])
 app.include_router(order_events.router, prefix="/api", tags=["Order Events"])
+app.include_router(search.router, prefix="/api", tags=["Search"])
 
 @app.on_event("startup")
 async def startup_event():
-    # Initialize recommendation engine in background task to avoid blocking startup
     import asyncio
-    from concurrent.futures import ThreadPoolExecutor
     
-    async def init_rec_engine():
+    async def init_catalog():
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, refresh_catalog)
+            except Exception as e:
+                print(f"❌ Failed to load catalog snapshot: {e}")
+            if settings.CATALOG_REFRESH_SECONDS <= 0:
+                return
+            await asyncio.sleep(settings.CATALOG_REFRESH_SECONDS)
+    
+    async def init_embeddings():
         try:
-            print("Initializing Recommendation Engine in background...")
-            # Run in thread pool to avoid blocking the event loop
             loop = asyncio.get_event_loop()
-            with ThreadPoolExecutor() as executor:
-                await loop.run_in_executor(executor, refresh_engine_data)
-            print("✅ Recommendation Engine initialized successfully")
+            await loop.run_in_executor(None, refresh_embeddings)
+            await loop.run_in_executor(None, load_or_build_ann_index)
         except Exception as e:
-            print(f"❌ Failed to init rec engine: {e}")
-            import traceback
-            traceback.print_exc()
+            print(f"❌ Failed to load product embeddings: {e}")
+    
+    # Loads the recommendation engine on its own thread, then keeps it refreshed;
+    # requests get the popularity fallback until the first load succeeds
+    refresh_scheduler.start()
     
     # Start background task - don't await, let it run in background
-    asyncio.create_task(init_rec_engine())
+    asyncio.create_task(init_catalog())
+    asyncio.create_task(init_embeddings())
 
 @app.get("/")
 async def root():
@@ -65,100 +91,86 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/ready")
+async def readiness_check():
+    """
+    Readiness for the load balancer: 200 once the recommendation engine has
+    data (fresh or stale), 503 while it is loading or has never loaded.
+    """
+    catalog = get_catalog()
+    body = {
+        "ready": engine_ready(),
+        "engine": engine_status(),
+        "catalog": {"loaded": catalog is not None, "products": len(catalog) if catalog is not None else 0},
+    }
+    return JSONResponse(status_code=200 if body["ready"] else 503, content=body)
+
+@app.post("/api/catalog/refresh")
+async def refresh_catalog_snapshot(background_tasks: BackgroundTasks):
+    """
+    Reload the catalog snapshot now, rebuilding the homepage widget aggregates
+    and the other catalog indexes, instead of waiting for the next interval.
+    """
+    background_tasks.add_task(refresh_catalog)
+    return {"status": "refresh_started"}
+
+@app.get("/api/cache/stats")
+async def get_response_cache_stats():
+    """Hit, staleness and single-flight counters for every cached route"""
+    return response_cache_stats()
+
+@app.get("/api/homepage/stats")
+async def get_homepage_stats():
+    """Age and build time of the precomputed homepage widgets"""
+    homepage = get_homepage_aggregates()
+    if homepage is None:
+        return {"loaded": False}
+    return {"loaded": True, **homepage.stats()}
+
+def _scan_products(supabase, columns: str, label: str):
+    """Pages of `products` (10k rows each, at most 50) for the fallback scans below"""
+    def fetch_page(offset: int, limit: int):
+        try:
+            return supabase.table("products").select(columns).range(offset, offset + limit - 1).execute().data
+        except Exception as e:
+            print(f"[{label}] Error fetching products at offset {offset}: {str(e)}")
+            return None
+    return iter_pages(fetch_page, page_size=10000, max_pages=50)
+
 @app.get("/api/featured-products")
-async def get_featured_products():
+def get_featured_products():
     """
     Find top 4 sub_categories with the most number of buys (using no_of_ratings as proxy),
     and from each sub_category find top 2 items based on ratings.
     Returns product IDs organized by sub_category.
+    Served from the precomputed homepage aggregates once the catalog has loaded.
     """
+    homepage = get_homepage_aggregates()
+    if homepage is not None:
+        return {"featured_products": homepage.featured}
+
     try:
         supabase = get_supabase()
         if not supabase:
             return {"featured_products": {}}
         
-        # Fetch all products to analyze
-        all_products = []
-        page = 0
-        page_size = 10000
-        has_more = True
-        
-        while has_more:
-            offset = page * page_size
-            try:
-                result = supabase.table("products").select("id, sub_category, no_of_ratings, ratings").range(offset, offset + page_size - 1).execute()
-            except Exception as e:
-                print(f"[Featured Products] Error fetching products at page {page}: {str(e)}")
-                break
-            
-            if not result.data or len(result.data) == 0:
-                has_more = False
-                break
-                
-            all_products.extend(result.data)
-            
-            if len(result.data) < page_size:
-                has_more = False
-            else:
-                page += 1
-            
-            # Safety limit
-            if page >= 50:
-                break
-        
-        # Calculate total buys (no_of_ratings) per sub_category
-        subcategory_buys = {}
-        for product in all_products:
-            sub_cat = product.get("sub_category")
-            if not sub_cat:
-                continue
-                
-            # Parse no_of_ratings to get number of buys
-            ratings_str = product.get("no_of_ratings") or "0"
-            # Extract numeric value from string (e.g., "78,970" -> 78970)
-            try:
-                num_buys = int(''.join(filter(str.isdigit, ratings_str.replace(',', '').replace('₹', ''))))
-            except (ValueError, TypeError):
-                num_buys = 0
-            
-            if sub_cat not in subcategory_buys:
-                subcategory_buys[sub_cat] = 0
-            subcategory_buys[sub_cat] += num_buys
-        
-        # Get top 4 sub_categories by total buys
-        top_subcategories = sorted(
-            subcategory_buys.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:4]
-        
-        # For each top sub_category, find top 5 products by rating
-        result_data: Dict[str, List[str]] = {}
+        # Stream pages: running buys per sub_category plus its top 2 products by rating
+        aggregator = GroupedTopK(2)
+        for page in _scan_products(supabase, "id, sub_category, no_of_ratings, ratings", "Featured Products"):
+            for product in page:
+                sub_cat = product.get("sub_category")
+                if not sub_cat:
+                    continue
+                # no_of_ratings stands in for the number of buys (e.g. "78,970" -> 78970)
+                aggregator.add(sub_cat, parse_int(product.get("no_of_ratings")))
+                if product.get("ratings"):
+                    aggregator.push(sub_cat, parse_rating(product.get("ratings")), product["id"])
         
-        for sub_category, _ in top_subcategories:
-            # Filter products for this sub_category
-            category_products = [
-                p for p in all_products 
-                if p.get("sub_category") == sub_category and p.get("ratings")
-            ]
-            
-            # Sort by rating (descending) and get top 2
-            def get_rating(product):
-                rating_str = product.get("ratings") or "0"
-                try:
-                    return float(rating_str)
-                except (ValueError, TypeError):
-                    return 0.0
-            
-            sorted_products = sorted(
-                category_products,
-                key=get_rating,
-                reverse=True
-            )[:2]
-            
-            # Extract product IDs
-            product_ids = [p["id"] for p in sorted_products]
-            result_data[sub_category] = product_ids
+        # Top 4 sub_categories by total buys, each with its top 2 products by rating
+        result_data: Dict[str, List[str]] = {
+            sub_category: aggregator.items(sub_category)
+            for sub_category in aggregator.top_groups(4)
+        }
         
         return {
             "featured_products": result_data
@@ -171,93 +183,35 @@ async def get_featured_products():
         }
 
 @app.get("/api/discounted-products")
-async def get_discounted_products():
+def get_discounted_products():
     """
     Find products with discount_price below 499 and rating above 4.
     Returns 4 products, one from each main_category.
     Returns product IDs.
+    Served from the precomputed homepage aggregates once the catalog has loaded.
     """
+    homepage = get_homepage_aggregates()
+    if homepage is not None:
+        return {"product_ids": homepage.discounted}
+
     try:
         supabase = get_supabase()
         if not supabase:
             return {"product_ids": []}
         
-        # Fetch all products to analyze
-        all_products = []
-        page = 0
-        page_size = 10000
-        has_more = True
+        # Stream pages, keeping the best-rated product per main_category
+        # among those with discount_price below 499 and rating above 4
+        aggregator = GroupedTopK(1)
+        for page in _scan_products(supabase, "id, main_category, discount_price, ratings", "Discounted Products"):
+            for product in page:
+                main_cat = product.get("main_category")
+                price = parse_int(product.get("discount_price"))
+                rating = parse_rating(product.get("ratings"))
+                if main_cat and 0 < price < 499 and rating > 4.0:
+                    aggregator.push(main_cat, rating, product["id"])
         
-        while has_more:
-            offset = page * page_size
-            try:
-                result = supabase.table("products").select("id, main_category, discount_price, ratings").range(offset, offset + page_size - 1).execute()
-            except Exception as e:
-                print(f"[Discounted Products] Error fetching products at page {page}: {str(e)}")
-                break
-            
-            if not result.data or len(result.data) == 0:
-                has_more = False
-                break
-                
-            all_products.extend(result.data)
-            
-            if len(result.data) < page_size:
-                has_more = False
-            else:
-                page += 1
-            
-            # Safety limit
-            if page >= 50:
-                break
-        
-        # Filter products: discount_price < 499 and rating > 4
-        filtered_products = []
-        for product in all_products:
-            # Parse discount_price
-            price_str = product.get("discount_price") or "0"
-            try:
-                # Extract numeric value from price string (e.g., "₹499" -> 499)
-                price = int(''.join(filter(str.isdigit, price_str.replace(',', '').replace('₹', ''))))
-            except (ValueError, TypeError):
-                price = 0
-            
-            # Parse rating
-            rating_str = product.get("ratings") or "0"
-            try:
-                rating = float(rating_str)
-            except (ValueError, TypeError):
-                rating = 0.0
-            
-            # Check conditions: price < 499 and rating > 4
-            if price > 0 and price < 499 and rating > 4.0:
-                filtered_products.append(product)
-        
-        # Group by main_category and get one product per category
-        category_products: Dict[str, List[Dict]] = {}
-        for product in filtered_products:
-            main_cat = product.get("main_category")
-            if not main_cat:
-                continue
-            
-            if main_cat not in category_products:
-                category_products[main_cat] = []
-            category_products[main_cat].append(product)
-        
-        # Get one product from each category (prefer higher rating)
-        result_products = []
-        for main_category, products in category_products.items():
-            # Sort by rating descending and take the first one
-            sorted_products = sorted(
-                products,
-                key=lambda p: float(p.get("ratings") or "0"),
-                reverse=True
-            )
-            if sorted_products:
-                result_products.append(sorted_products[0]["id"])
-        
-        # Limit to 4 products
-        result_products = result_products[:4]
+        # One product per category, in the order categories were first seen, limited to 4
+        result_products = [aggregator.items(main_cat)[0] for main_cat in aggregator.tops][:4]
         
         return {
             "product_ids": result_products
@@ -270,7 +224,7 @@ async def get_discounted_products():
         }
 
 @app.get("/api/globally-loved-products")
-async def get_globally_loved_products():
+def get_globally_loved_products():
     """
     Find products with highest popularity score.
     Score = (no_of_ratings * 0.6) + (no_of_ratings * 0.4)
@@ -278,71 +232,24 @@ async def get_globally_loved_products():
     Score = no_of_ratings (weighted the same way)
     Actually, let's use no_of_ratings for both metrics since it represents popularity.
     Returns top 20 product IDs.
+    Served from the precomputed homepage aggregates once the catalog has loaded.
     """
+    homepage = get_homepage_aggregates()
+    if homepage is not None:
+        return {"product_ids": homepage.globally_loved}
+
     try:
         supabase = get_supabase()
         if not supabase:
             return {"product_ids": []}
         
-        # Fetch all products to analyze
-        all_products = []
-        page = 0
-        page_size = 10000
-        has_more = True
-        
-        while has_more:
-            offset = page * page_size
-            try:
-                result = supabase.table("products").select("id, no_of_ratings, ratings").range(offset, offset + page_size - 1).execute()
-            except Exception as e:
-                print(f"[Globally Loved Products] Error fetching products at page {page}: {str(e)}")
-                break
-            
-            if not result.data or len(result.data) == 0:
-                has_more = False
-                break
-                
-            all_products.extend(result.data)
-            
-            if len(result.data) < page_size:
-                has_more = False
-            else:
-                page += 1
-            
-            # Safety limit
-            if page >= 50:
-                break
-        
-        # Calculate popularity score for each product
-        # Score = (buys * 0.6) + (no_of_ratings * 0.4)
-        # Using no_of_ratings as proxy for both buys and no_of_ratings
-        scored_products = []
-        for product in all_products:
-            # Parse no_of_ratings (used as proxy for buys)
-            buys_str = product.get("no_of_ratings") or "0"
-            try:
-                buys = int(''.join(filter(str.isdigit, str(buys_str).replace(',', ''))))
-            except (ValueError, TypeError):
-                buys = 0
-            
-            # Parse no_of_ratings
-            ratings_count_str = product.get("no_of_ratings") or "0"
-            try:
-                ratings_count = int(''.join(filter(str.isdigit, str(ratings_count_str).replace(',', ''))))
-            except (ValueError, TypeError):
-                ratings_count = 0
-            
-            # Calculate weighted score: 60% buys, 40% no_of_ratingscd 
-            score = (buys * 0.6) + (ratings_count * 0.4)
-            
-            scored_products.append({
-                "id": product["id"],
-                "score": score
-            })
-        
-        # Sort by score descending and get top 20
-        scored_products.sort(key=lambda x: x["score"], reverse=True)
-        top_20_ids = [p["id"] for p in scored_products[:20]]
+        # Score = (buys * 0.6) + (no_of_ratings * 0.4) with no_of_ratings standing in
+        # for buys, so products rank by no_of_ratings; only the top 20 are kept while streaming
+        top = TopK(20)
+        for page in _scan_products(supabase, "id, no_of_ratings, ratings", "Globally Loved Products"):
+            for product in page:
+                top.push(parse_int(product.get("no_of_ratings")), product["id"])
+        top_20_ids = top.items()
         
         return {
             "product_ids": top_20_ids
@@ -354,93 +261,102 @@ async def get_globally_loved_products():
             "product_ids": []
         }
 
+def _cluster_response(seed: int, page_size: int, clusters: List[Dict]) -> Dict:
+    return {
+        "seed": seed,
+        "page_size": page_size,
+        "cluster_products": {str(c["id"]): c["product_ids"] for c in clusters},
+        "clusters": clusters,
+    }
+
+def _cluster_page(info: Dict, product_ids: List[str], page: int, page_size: int) -> Dict:
+    return {
+        **info,
+        "page": page,
+        "product_ids": product_ids,
+        "has_more": page * page_size < info["total_products"],
+    }
+
+def _fetch_cluster_page(supabase, cluster_id: int, seed: int, page: int, page_size: int):
+    """
+    Cold-cache fallback: ids of one cluster, shuffled by seed exactly as the
+    cluster index does; None if the query fails
+    """
+    def fetch_page(offset: int, limit: int):
+        return (
+            supabase.table("products").select("id").eq("cluster_id", cluster_id)
+            .order("id").range(offset, offset + limit - 1).execute().data
+        )
+    
+    try:
+        product_ids = [p["id"] for rows in iter_pages(fetch_page, page_size=1000) for p in rows]
+    except Exception as e:
+        print(f"[Random Cluster Products] Error fetching products for cluster {cluster_id}: {str(e)}")
+        return None
+    positions = shuffled_page(len(product_ids), cluster_id, seed, page, page_size)
+    return [product_ids[i] for i in positions], len(product_ids)
+
 @app.get("/api/random-cluster-products")
-async def get_random_cluster_products():
+def get_random_cluster_products(
+    seed: Optional[int] = Query(None, ge=0),
+    page_size: int = Query(20, ge=1, le=200),
+    clusters: int = Query(4, ge=1, le=20),
+):
     """
     Get random products from random clusters.
-    Returns ALL products from 4 random clusters (frontend handles pagination for speed).
+    Picks `clusters` random clusters and returns the first page of each, in an
+    order shuffled by `seed`. A fresh seed is drawn when none is given; pass the
+    returned seed to /api/random-cluster-products/{cluster_id} to load more.
+    Served from the in-memory cluster index without any query once the catalog
+    has loaded.
     """
     import random
     
+    if seed is None:
+        seed = random.randrange(2 ** 31)
+    
+    index = get_cluster_index()
+    if index is not None and len(index) > 0:
+        selected = index.sample_clusters(clusters, seed)
+        return _cluster_response(seed, page_size, [
+            _cluster_page(index.info(cid), index.page(cid, seed, 1, page_size), 1, page_size)
+            for cid in selected
+        ])
+    
     try:
         supabase = get_supabase()
         if not supabase:
             print("[Random Cluster Products] Supabase client not available")
             return {"cluster_products": {}, "clusters": [], "debug": "supabase_not_available"}
         
-        # Step 1: Fetch all clusters
         try:
             clusters_result = supabase.table("clusters").select("id, title, description, product_count").execute()
-            print(f"[Random Cluster Products] Fetched clusters: {clusters_result.data}")
         except Exception as e:
             print(f"[Random Cluster Products] Error fetching clusters: {str(e)}")
             return {"cluster_products": {}, "clusters": [], "debug": f"clusters_error: {str(e)}"}
         
-        if not clusters_result.data or len(clusters_result.data) == 0:
+        if not clusters_result.data:
             print("[Random Cluster Products] No clusters found in database")
             return {"cluster_products": {}, "clusters": [], "debug": "no_clusters_found"}
         
-        all_clusters = clusters_result.data
+        all_clusters = sorted(clusters_result.data, key=lambda c: c["id"])
+        selected_clusters = random.Random(seed).sample(all_clusters, min(clusters, len(all_clusters)))
         
-        # Step 2: Randomly select 4 clusters (or all if less than 4)
-        num_clusters_to_select = min(4, len(all_clusters))
-        selected_clusters = random.sample(all_clusters, num_clusters_to_select)
-        
-        # Step 3: For each selected cluster, fetch ALL products (frontend will paginate)
-        cluster_products = {}
         cluster_info = []
-        
-        print(f"[Random Cluster Products] Selected {len(selected_clusters)} clusters: {[c['id'] for c in selected_clusters]}")
-        
         for cluster in selected_clusters:
             cluster_id = cluster["id"]
-            cluster_title = cluster.get("title") or f"Cluster {cluster_id}"
-            cluster_description = cluster.get("description") or ""
-            
-            # Fetch ALL products for this cluster
-            try:
-                products_result = (
-                    supabase.table("products")
-                    .select(
-                        "id, name, image, ratings, discount_price, actual_price, main_category, sub_category, brand"
-                    )
-                    .eq("cluster_id", cluster_id)
-                    .execute()
-                )
-                print(
-                    f"[Random Cluster Products] Cluster {cluster_id}: found {len(products_result.data) if products_result.data else 0} products"
-                )
-            except Exception as e:
-                print(f"[Random Cluster Products] Error fetching products for cluster {cluster_id}: {str(e)}")
+            fetched = _fetch_cluster_page(supabase, cluster_id, seed, 1, page_size)
+            if not fetched or not fetched[1]:
                 continue
-            
-            if not products_result.data or len(products_result.data) == 0:
-                print(f"[Random Cluster Products] Cluster {cluster_id}: no products found, skipping")
-                continue
-            
-            # Get all products in cluster
-            products_in_cluster = products_result.data
-            
-            # Shuffle products for variety (only once, on initial load)
-            random.shuffle(products_in_cluster)
-            
-            # Extract ALL product IDs (frontend will handle pagination)
-            product_ids = [p["id"] for p in products_in_cluster]
-            
-            cluster_products[str(cluster_id)] = product_ids
-            cluster_info.append({
+            product_ids, total = fetched
+            cluster_info.append(_cluster_page({
                 "id": cluster_id,
-                "title": cluster_title,
-                "description": cluster_description,
-                "product_ids": product_ids,  # All product IDs
-                "total_products": len(product_ids),
-                "has_more": len(product_ids) > 5,  # More than initial 5
-            })
+                "title": cluster.get("title") or f"Cluster {cluster_id}",
+                "description": cluster.get("description") or "",
+                "total_products": total,
+            }, product_ids, 1, page_size))
         
-        return {
-            "cluster_products": cluster_products,
-            "clusters": cluster_info
-        }
+        return _cluster_response(seed, page_size, cluster_info)
         
     except Exception as e:
         print(f"Error fetching random cluster products: {str(e)}")
@@ -448,3 +364,137 @@ async def get_random_cluster_products():
             "cluster_products": {},
             "clusters": []
         }
+
+@app.get("/api/random-cluster-products/{cluster_id}")
+def get_cluster_products_page(
+    cluster_id: int,
+    seed: int = Query(..., ge=0),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=200),
+):
+    """
+    One page of a cluster's products in the order fixed by `seed`, for "load more".
+    """
+    index = get_cluster_index()
+    if index is not None and len(index) > 0:
+        if cluster_id not in index.position:
+            raise HTTPException(status_code=404, detail="Cluster not found")
+        return _cluster_page(index.info(cluster_id), index.page(cluster_id, seed, page, page_size), page, page_size)
+    
+    supabase = get_supabase()
+    if not supabase:
+        raise HTTPException(status_code=503, detail="Database not available")
+    fetched = _fetch_cluster_page(supabase, cluster_id, seed, page, page_size)
+    if fetched is None:
+        raise HTTPException(status_code=500, detail="Database error")
+    product_ids, total = fetched
+    if not total:
+        raise HTTPException(status_code=404, detail="Cluster not found")
+    return _cluster_page({
+        "id": cluster_id,
+        "title": f"Cluster {cluster_id}",
+        "description": "",
+        "total_products": total,
+    }, product_ids, page, page_size)
+
+# Cards filled per cluster on /api/home; later pages come from /api/random-cluster-products/{cluster_id}
+HOME_CLUSTER_CARDS = 5
+
+def product_cards(product_ids: List[str]) -> List[Product]:
+    """
+    Product cards in the order given, from the catalog snapshot when loaded,
+    with anything it lacks resolved through the product cache in one query.
+    """
+    snapshot = get_catalog()
+    cards: Dict[str, Product] = {}
+    missing = []
+    for pid in product_ids:
+        ordinal = snapshot.id_to_ordinal.get(str(pid)) if snapshot is not None else None
+        if ordinal is None:
+            missing.append(pid)
+        else:
+            cards[pid] = products.to_product(snapshot.rows[ordinal])
+    if missing:
+        try:
+            cards.update(products.get_cached_products(missing))
+        except Exception as e:
+            print(f"[Home] Could not resolve {len(missing)} products: {e}")
+    return [cards[pid] for pid in product_ids if pid in cards]
+
+def _home_featured():
+    featured = get_featured_products()["featured_products"]
+    return {sub_category: product_cards(ids) for sub_category, ids in featured.items()}
+
+def _home_discounted():
+    return product_cards(get_discounted_products()["product_ids"])
+
+def _home_globally_loved():
+    return product_cards(get_globally_loved_products()["product_ids"])
+
+def _home_clusters():
+    response = get_random_cluster_products(seed=None, page_size=HOME_CLUSTER_CARDS, clusters=4)
+    for cluster in response["clusters"]:
+        cluster["products"] = product_cards(cluster["product_ids"])
+        cluster["seed"] = response["seed"]
+    return response["clusters"]
+
+def _home_recommendations(user_id: str, limit: int):
+    recs, candidates = precomputed_recommendations(user_id, limit)
+    if recs is None:
+        recs = recommend_for_user_hybrid(user_id, top_k=limit, candidates=candidates)
+    return format_recommendations(recs)
+
+@app.get("/api/home")
+# Pages with a late or failed section, or stand-in recommendations, are not
+# cached, so the next request retries them
+@cached_route(
+    "home",
+    ttl=settings.HOME_RESPONSE_TTL_SECONDS,
+    should_cache=lambda response: (
+        not response["timed_out"]
+        and not response["failed"]
+        and ("recommendations" not in response or personalised(response["recommendations"]))
+    ),
+    # A user's new cart or favorites activity retires their cached page
+    vary=user_version,
+)
+async def get_home(user_id: Optional[str] = None, limit: int = 10):
+    """
+    Every homepage widget in one response, with product cards filled in.
+    Sections are computed concurrently; a section that misses the
+    HOME_SECTION_TIMEOUT_MS deadline or fails comes back as null and is
+    listed under `timed_out` / `failed` so the client can fall back to the
+    per-widget endpoint.
+    """
+    started = time.time()
+    loop = asyncio.get_event_loop()
+    timeout = settings.HOME_SECTION_TIMEOUT_MS / 1000
+
+    sections = {
+        "featured": loop.run_in_executor(None, _home_featured),
+        "discounted": loop.run_in_executor(None, _home_discounted),
+        "globally_loved": loop.run_in_executor(None, _home_globally_loved),
+        "clusters": loop.run_in_executor(None, _home_clusters),
+    }
+    if user_id:
+        # On the recommendation pool, so a burst of homepages cannot starve the widgets' threads
+        sections["recommendations"] = recommendation_executor.run(_home_recommendations, user_id, limit)
+
+    names = list(sections)
+    results = await asyncio.gather(
+        *(asyncio.wait_for(sections[name], timeout) for name in names),
+        return_exceptions=True,
+    )
+
+    response = {"timed_out": [], "failed": []}
+    for name, result in zip(names, results):
+        if isinstance(result, asyncio.TimeoutError):
+            response["timed_out"].append(name)
+            result = None
+        elif isinstance(result, Exception):
+            print(f"[Home] Section {name} failed: {result}")
+            response["failed"].append(name)
+            result = None
+        response[name] = result
+    response["took_ms"] = round((time.time() - started) * 1000, 2)
+    return response
@@ -50,3 +50,20 @@ class ProductsResponse(BaseModel):
     total: int
     page: int
     limit: int
+
+class SearchResponse(BaseModel):
+    query: str
+    products: List[Product]
+    total: int
+    page: int
+    limit: int
+    took_ms: float
+
+class SemanticSearchHit(BaseModel):
+    product: Product
+    score: float
+
+class SemanticSearchResponse(BaseModel):
+    query: str
+    results: List[SemanticSearchHit]
+    took_ms: float
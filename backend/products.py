@@ -1,15 +1,111 @@
 """
 Product routes for fetching products
 """
-from fastapi import APIRouter, Query
-from typing import Optional
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, List, Optional
 
 from models import Product, ProductsResponse
-from database import get_supabase
+from database import execute, get_async_supabase, get_supabase
+from config import settings
+from utils.cache_backends import create_cache
+from utils.response_cache import cached_route
+from utils.parsing import parse_price
+from catalog.facets import get_facet_index
+from catalog.prices import get_price_index
 
 router = APIRouter()
 
+# Upper bound on IDs accepted by /by-ids
+MAX_BATCH_IDS = 500
+
+# IDs per `in_` query; the filter travels in the request URL, and 100 UUIDs
+# (about 3.7 KB) stays well inside proxy and PostgREST URL limits
+IN_QUERY_CHUNK = 100
+
+# Shared by /{product_id} and /by-ids so detail views and batch lookups warm each other
+product_cache = create_cache(
+    "products",
+    maxsize=settings.PRODUCT_CACHE_SIZE,
+    ttl=settings.PRODUCT_CACHE_TTL_SECONDS,
+)
+
+def to_product(item: Dict) -> Product:
+    """Build a Product model from a raw `products` row"""
+    return Product(
+        id=item["id"],
+        name=item["name"],
+        main_category=item["main_category"],
+        sub_category=item["sub_category"],
+        image=item["image"],
+        link=item.get("link"),
+        ratings=item.get("ratings"),
+        no_of_ratings=item.get("no_of_ratings"),
+        discount_price=item.get("discount_price"),
+        actual_price=item.get("actual_price"),
+        brand=item.get("brand")
+    )
+
+def _to_products(rows: List[Dict]) -> Dict[str, Product]:
+    return {item["id"]: to_product(item) for item in rows}
+
+def _chunks(ids: List[str]) -> List[List[str]]:
+    return [ids[i:i + IN_QUERY_CHUNK] for i in range(0, len(ids), IN_QUERY_CHUNK)]
+
+def get_cached_products(product_ids: List[str]) -> Dict[str, Product]:
+    """
+    Resolve product IDs through the LRU cache, fetching misses with `in_`
+    queries of at most IN_QUERY_CHUNK IDs.
+    Returns a mapping of id -> Product for the IDs that exist.
+    Blocking; for background jobs and thread-pool code (see get_cached_products_async).
+    """
+    found, missing = product_cache.get_many(product_ids)
+    if not missing:
+        return found
+    
+    supabase = get_supabase()
+    if not supabase:
+        raise HTTPException(status_code=503, detail="Database not available")
+    
+    rows = []
+    try:
+        for chunk in _chunks(missing):
+            result = supabase.table("products").select("*").in_("id", chunk).execute()
+            rows.extend(result.data or [])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    
+    fetched = _to_products(rows)
+    product_cache.set_many(fetched)
+    found.update(fetched)
+    return found
+
+async def get_cached_products_async(product_ids: List[str]) -> Dict[str, Product]:
+    """get_cached_products for route handlers: neither the cache nor the miss query blocks the event loop"""
+    found, missing = await product_cache.get_many_async(product_ids)
+    if not missing:
+        return found
+    
+    supabase = await get_async_supabase()
+    if not supabase:
+        raise HTTPException(status_code=503, detail="Database not available")
+    
+    try:
+        results = await asyncio.gather(*(
+            execute(supabase.table("products").select("*").in_("id", chunk))
+            for chunk in _chunks(missing)
+        ))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    
+    fetched = _to_products([row for result in results for row in result.data or []])
+    await product_cache.set_many_async(fetched)
+    found.update(fetched)
+    return found
+
 @router.get("/", response_model=ProductsResponse)
+@cached_route("products.list", ttl=settings.PRODUCTS_RESPONSE_TTL_SECONDS)
 async def get_products(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
@@ -25,7 +121,7 @@ async def get_products(
     Sort options: 'price_low', 'price_high', or None for default
     """
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             return ProductsResponse(products=[], total=0, page=page, limit=limit)
         
@@ -49,7 +145,7 @@ async def get_products(
         
         # Execute query to get all matching products
         try:
-            result = query.order("created_at", desc=False).execute()
+            result = await execute(query.order("created_at", desc=False))
         except Exception as e:
             print(f"[Products] Error executing query: {str(e)}")
             return ProductsResponse(products=[], total=0, page=page, limit=limit)
@@ -62,47 +158,24 @@ async def get_products(
             
             filtered_products = []
             for item in products_data:
-                price_str = item.get("discount_price") or item.get("actual_price") or "0"
                 # Extract numeric value from price string (e.g., "₹1,299" -> 1299)
-                try:
-                    price = float(''.join(filter(str.isdigit, price_str.replace(',', ''))))
-                    if min_p <= price <= max_p:
-                        filtered_products.append(item)
-                except (ValueError, TypeError):
-                    continue
+                price = parse_price(item)
+                if price is not None and min_p <= price <= max_p:
+                    filtered_products.append(item)
             
             products_data = filtered_products
         
         # Sort by price if requested
         if sort == "price_low" or sort == "price_high":
-            def get_price(item):
-                price_str = item.get("discount_price") or item.get("actual_price") or "0"
-                try:
-                    return float(''.join(filter(str.isdigit, price_str.replace(',', ''))))
-                except (ValueError, TypeError):
-                    return 0.0
-            
-            products_data.sort(key=get_price, reverse=(sort == "price_high"))
+            products_data.sort(key=lambda item: parse_price(item) or 0.0, reverse=(sort == "price_high"))
         
         # Apply pagination after filtering and sorting
         total_count = len(products_data)
         paginated_data = products_data[offset:offset + limit]
         
-        products = []
-        for item in paginated_data:
-            products.append(Product(
-                id=item["id"],
-                name=item["name"],
-                main_category=item["main_category"],
-                sub_category=item["sub_category"],
-                image=item["image"],
-                link=item.get("link"),
-                ratings=item.get("ratings"),
-                no_of_ratings=item.get("no_of_ratings"),
-                discount_price=item.get("discount_price"),
-                actual_price=item.get("actual_price"),
-                brand=item.get("brand")
-            ))
+        products = [to_product(item) for item in paginated_data]
+        # Listing pages are the usual path to a detail view, so warm the cache
+        await product_cache.set_many_async({p.id: p for p in products})
         
         return ProductsResponse(
             products=products,
@@ -117,37 +190,97 @@ async def get_products(
         return ProductsResponse(products=[], total=0, page=page, limit=limit)
 
 
+@router.get("/by-ids", response_model=List[Product])
+async def get_products_by_ids(
+    ids: str = Query(..., description="Comma-separated product IDs"),
+):
+    """
+    Get many products by ID in one call, preserving the requested order.
+    Cached products are served from the cache; the rest are fetched in chunked `in_` queries.
+    """
+    product_ids = list(dict.fromkeys(pid.strip() for pid in ids.split(",") if pid.strip()))
+    if not product_ids:
+        return []
+    if len(product_ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many product IDs (max {MAX_BATCH_IDS})"
+        )
+    
+    try:
+        products_by_id = await get_cached_products_async(product_ids)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return [products_by_id[pid] for pid in product_ids if pid in products_by_id]
+
+
+@router.get("/facets")
+async def get_product_facets(
+    category: Optional[str] = None,
+    sub_category: Optional[str] = None,
+    brand: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """
+    Category, sub-category and brand lists with product counts for the active filters.
+    Each facet is counted under the other facets' filters so alternatives stay visible.
+    """
+    index = get_facet_index()
+    if index is None:
+        return {"total": 0, "categories": [], "sub_categories": [], "brands": [], "ready": False}
+    
+    filters = {"category": category, "sub_category": sub_category, "brand": brand}
+    return {
+        "total": index.total(filters),
+        "categories": index.counts("category", filters, limit),
+        "sub_categories": index.counts("sub_category", filters, limit),
+        "brands": index.counts("brand", filters, limit),
+        "ready": True,
+    }
+
+
+@router.get("/price-distribution")
+async def get_price_distribution(
+    category: Optional[str] = None,
+    sub_category: Optional[str] = None,
+    brand: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    buckets: Optional[int] = Query(None, ge=1, le=200),
+):
+    """
+    Price histogram and the number of products inside [min_price, max_price]
+    under the active filters, for the price slider.
+    """
+    index = get_price_index()
+    if index is None:
+        return {"total": 0, "count": 0, "min": None, "max": None, "buckets": [], "ready": False}
+    
+    filters = {"category": category, "sub_category": sub_category, "brand": brand}
+    result = index.distribution(filters, min_price, max_price, buckets)
+    result["ready"] = True
+    return result
+
+
+@router.get("/cache/stats")
+async def get_product_cache_stats():
+    """Hit rate and occupancy of the product lookup cache"""
+    return product_cache.stats()
+
+
 @router.get("/{product_id}", response_model=Product)
 async def get_product(product_id: str):
     """Get a single product by ID"""
-    from fastapi import HTTPException
-    
     try:
-        supabase = get_supabase()
-        if not supabase:
-            raise HTTPException(status_code=503, detail="Database not available")
+        products_by_id = await get_cached_products_async([product_id])
         
-        try:
-            result = supabase.table("products").select("*").eq("id", product_id).execute()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-        
-        if not result.data:
+        if product_id not in products_by_id:
             raise HTTPException(status_code=404, detail="Product not found")
         
-        item = result.data[0]
-        return Product(
-            id=item["id"],
-            name=item["name"],
-            main_category=item["main_category"],
-            sub_category=item["sub_category"],
-            image=item["image"],
-            link=item.get("link"),
-            ratings=item.get("ratings"),
-            no_of_ratings=item.get("no_of_ratings"),
-            discount_price=item.get("discount_price"),
-            actual_price=item.get("actual_price")
-        )
+        return products_by_id[product_id]
         
     except HTTPException:
         raise
@@ -0,0 +1,78 @@
+"""
+Sparse batch scoring kernel for rec_engine.precompute.
+
+Kept apart from the engine so process-pool workers (spawned, see
+precompute.batch_cf_candidates) import only numpy and scipy.
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+_worker_args: Optional[Tuple[csr_matrix, np.ndarray, np.ndarray, csr_matrix]] = None
+
+
+def prune_rows(matrix: csr_matrix, keep: int) -> csr_matrix:
+    """`matrix` with only the `keep` largest entries of each row"""
+    matrix = matrix.tocsr()
+    lengths = np.diff(matrix.indptr)
+    if lengths.max(initial=0) <= keep:
+        return matrix
+    rows, cols, data = [], [], []
+    for r in np.flatnonzero(lengths):
+        start, stop = matrix.indptr[r], matrix.indptr[r + 1]
+        values = matrix.data[start:stop]
+        top = np.argpartition(-values, keep - 1)[:keep] if len(values) > keep else np.arange(len(values))
+        rows.append(np.full(len(top), r, dtype=np.int32))
+        cols.append(matrix.indices[start:stop][top])
+        data.append(values[top])
+    return csr_matrix(
+        (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))), shape=matrix.shape
+    )
+
+
+def score_users(
+    weights: csr_matrix,
+    interactions: csr_matrix,
+    similarity: csr_matrix,
+    popularity: np.ndarray,
+    item_cluster: np.ndarray,
+    cluster_onehot: csr_matrix,
+    top_k: int
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Top `top_k` (item indices, scores) of each user row, scored as
+    recommend_for_user_item_cf does
+    """
+    scores = (weights @ similarity).tocsr()
+    scores.sum_duplicates()
+    rows = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+    cols = scores.indices
+    # Cluster boost: 1 + 0.2 * how many of the user's items share the candidate's cluster
+    cluster_counts = (interactions.astype(bool).astype(np.float32) @ cluster_onehot).toarray()
+    boost = np.ones(len(cols))
+    clustered = item_cluster[cols] >= 0
+    boost[clustered] += 0.2 * cluster_counts[rows[clustered], item_cluster[cols[clustered]]]
+    scores.data = scores.data * (1.0 + 0.1 * popularity[cols]) * boost
+    # Never recommend the items the weights came from
+    scores = (scores - scores.multiply(weights.astype(bool))).tocsr()
+    scores.eliminate_zeros()
+
+    results = []
+    for r in range(scores.shape[0]):
+        start, stop = scores.indptr[r], scores.indptr[r + 1]
+        values = scores.data[start:stop]
+        order = np.argsort(-values, kind="stable")[:top_k]
+        results.append((scores.indices[start:stop][order], values[order].astype(np.float32)))
+    return results
+
+
+def init_worker(similarity, popularity, item_cluster, cluster_onehot):
+    global _worker_args
+    _worker_args = (similarity, popularity, item_cluster, cluster_onehot)
+
+
+def score_chunk(args: Tuple[int, csr_matrix, csr_matrix, int]) -> Tuple[int, List[Tuple[np.ndarray, np.ndarray]]]:
+    start, weights, interactions, top_k = args
+    similarity, popularity, item_cluster, cluster_onehot = _worker_args
+    return start, score_users(weights, interactions, similarity, popularity, item_cluster, cluster_onehot, top_k)
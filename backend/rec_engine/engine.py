@@ -1,16 +1,22 @@
 
 import os
-import json
+import threading
+import time
 import uuid
 import psycopg2
 import pandas as pd
 import numpy as np
 from scipy.sparse import csr_matrix
 from sklearn.metrics.pairwise import cosine_similarity
-from mistralai import Mistral
 from dataclasses import dataclass
 from typing import List, Dict, Any, Optional, Tuple
+from catalog.homepage import get_homepage_aggregates
+from catalog.snapshot import get_catalog
 from config import settings
+from rec_engine.rerank_cache import get_rerank, rerank_key
+from rec_engine.reranker import reranker
+from vectors.ann import get_ann_index
+from vectors.store import get_embedding_matrix
 
 # ============================================
 # 1. DB CONFIG & GLOBALS
@@ -28,7 +34,26 @@ product_id_to_idx = {}
 idx_to_product_id = {}
 product_meta = {}
 cluster_meta = {}
-MISTRAL_MODEL = "mistral-small-latest"
+# Epoch seconds of each user's latest cart/favorites activity
+user_last_active = {}
+
+# Engine readiness. Data is only ever loaded by refresh_engine_data, never
+# inline in a request: until the first refresh succeeds ("loading", or
+# "failed" if it did not) recommendations come from the popularity fallback.
+# "stale" means data is being served but the last refresh failed or it is
+# older than ENGINE_MAX_AGE_SECONDS.
+ENGINE_LOADING = "loading"
+ENGINE_READY = "ready"
+ENGINE_STALE = "stale"
+ENGINE_FAILED = "failed"
+
+_engine_state = ENGINE_LOADING
+_engine_loaded_at: Optional[float] = None
+_engine_last_error: Optional[str] = None
+_engine_refresh_ms: Optional[float] = None
+_refresh_lock = threading.Lock()
+
+POPULARITY_FALLBACK_REASON = "Popular right now"
 
 # We will use the existing Supabase client from database.py
 from database import get_supabase
@@ -53,8 +78,9 @@ def fetch_data_via_client(table: str, columns: str = "*"):
             # Range is inclusive
             response = supabase.table(table).select(columns).range(offset, offset + page_size - 1).execute()
         except Exception as e:
+            # A partial table would be loaded as if it were complete, so fail the whole load
             print(f"[RecEngine] Error fetching {table} at offset {offset}: {e}")
-            break
+            raise
             
         data = response.data
         if not data:
@@ -148,29 +174,96 @@ SELECT
 FROM public.clusters;
 """
 
-def refresh_engine_data():
+class RefreshProgress:
+    """Per-step wall time (ms) and row counts of one refresh, filled in as it runs"""
+
+    def __init__(self):
+        self.steps: Dict[str, float] = {}
+        self.rows: Dict[str, int] = {}
+        self._mark = time.perf_counter()
+
+    def lap(self, step: str, rows: Optional[int] = None):
+        now = time.perf_counter()
+        self.steps[step] = round((now - self._mark) * 1000, 1)
+        self._mark = now
+        if rows is not None:
+            self.rows[step] = int(rows)
+
+def refresh_engine_data(progress: Optional[RefreshProgress] = None) -> bool:
+    """
+    Reload engine data and update the readiness state; True on success.
+    Single-flight: concurrent callers wait for the in-flight refresh and
+    share its outcome instead of starting another one. Scheduled and
+    API-triggered refreshes go through rec_engine.scheduler.
+    """
+    global _engine_state, _engine_loaded_at, _engine_last_error, _engine_refresh_ms
+
+    if not _refresh_lock.acquire(blocking=False):
+        with _refresh_lock:
+            return _engine_last_error is None and _engine_loaded_at is not None
+
+    started = time.time()
+    try:
+        _load_engine_data(progress or RefreshProgress())
+    except Exception as e:
+        _engine_last_error = str(e)
+        _engine_state = ENGINE_STALE if _engine_loaded_at is not None else ENGINE_FAILED
+        print(f"[RecEngine] Refresh failed ({_engine_state}): {e}")
+        return False
+    else:
+        _engine_loaded_at = time.time()
+        _engine_last_error = None
+        _engine_state = ENGINE_READY
+        return True
+    finally:
+        _engine_refresh_ms = (time.time() - started) * 1000
+        _refresh_lock.release()
+
+def engine_state() -> str:
+    if _engine_state == ENGINE_READY and time.time() - _engine_loaded_at > settings.ENGINE_MAX_AGE_SECONDS:
+        return ENGINE_STALE
+    return _engine_state
+
+def engine_ready() -> bool:
+    """Whether personalised recommendations can be served (fresh or stale data)"""
+    return engine_state() in (ENGINE_READY, ENGINE_STALE)
+
+def engine_status() -> Dict[str, Any]:
+    return {
+        "state": engine_state(),
+        "refreshing": _refresh_lock.locked(),
+        "loaded_at": _engine_loaded_at,
+        "age_seconds": round(time.time() - _engine_loaded_at, 1) if _engine_loaded_at else None,
+        "last_refresh_ms": round(_engine_refresh_ms, 1) if _engine_refresh_ms is not None else None,
+        "last_error": _engine_last_error,
+    }
+
+def _load_engine_data(progress: RefreshProgress):
     """
     Loads data from DB, builds matrices, and updates global state.
-    Call this on startup and periodically (e.g. background task).
+    Raises if the data cannot be loaded; use refresh_engine_data().
     """
     global interactions_df, products_df, clusters_df
     global user_item_matrix, item_sim_matrix
     global user_id_to_idx, idx_to_user_id, product_id_to_idx, idx_to_product_id
-    global product_meta, cluster_meta
+    global product_meta, cluster_meta, user_last_active
 
     print("[RecEngine] Loading interaction data via Supabase Client...")
     try:
         # 1. Fetch Cart Logs
         print("[RecEngine] Step 1/4: Fetching cart activity logs...")
-        cart_df = fetch_data_via_client("cart_activity_log", "user_id, product_id, action")
+        cart_df = fetch_data_via_client("cart_activity_log", "user_id, product_id, action, timestamp")
+        progress.lap("cart_activity_log", len(cart_df))
         
         # 2. Fetch Favorite Logs
         print("[RecEngine] Step 2/4: Fetching favorites activity logs...")
-        fav_df = fetch_data_via_client("favorites_activity_log", "user_id, product_id, action")
+        fav_df = fetch_data_via_client("favorites_activity_log", "user_id, product_id, action, timestamp")
+        progress.lap("favorites_activity_log", len(fav_df))
         
         # 3. Fetch Products
         print("[RecEngine] Step 3/4: Fetching products...")
         products_df = fetch_data_via_client("products", "id, name, main_category, sub_category, image, link, ratings, no_of_ratings, discount_price, actual_price, brand, cluster_id, add_to_cart, buys")
+        progress.lap("products", len(products_df))
         # Rename id to product_id for consistency
         if not products_df.empty:
             products_df = products_df.rename(columns={"id": "product_id"})
@@ -178,6 +271,7 @@ def refresh_engine_data():
         # 4. Fetch Clusters
         print("[RecEngine] Step 4/4: Fetching clusters...")
         clusters_df = fetch_data_via_client("clusters", "id, title, description, product_count")
+        progress.lap("clusters", len(clusters_df))
         # Rename id to cluster_id
         if not clusters_df.empty:
             clusters_df = clusters_df.rename(columns={"id": "cluster_id"})
@@ -227,9 +321,17 @@ def refresh_engine_data():
         else:
             interactions_df = pd.DataFrame(columns=["user_id", "product_id", "interaction_score"])
 
+        # Latest activity per user, for picking who batch precomputation covers
+        stamps = [df[["user_id", "timestamp"]] for df in (cart_df, fav_df) if "timestamp" in df.columns]
+        last_active = {}
+        if stamps:
+            stamps = pd.concat(stamps)
+            latest = pd.to_datetime(stamps["timestamp"], utc=True, errors="coerce").groupby(stamps["user_id"].astype(str)).max()
+            last_active = {u: ts.timestamp() for u, ts in latest.dropna().items()}
+
     except Exception as e:
         print(f"[RecEngine] Error loading/processing data: {e}")
-        return
+        raise
 
     # Build Mappings
     user_ids = interactions_df["user_id"].unique()
@@ -243,6 +345,7 @@ def refresh_engine_data():
 
     # Filter interactions
     interactions_df = interactions_df[interactions_df["product_id"].isin(product_id_to_idx.keys())]
+    progress.lap("interactions", len(interactions_df))
 
     # Build Matrix
     if len(interactions_df) > 0:
@@ -263,6 +366,7 @@ def refresh_engine_data():
         print("[RecEngine] No interactions found. Skipping matrix build.")
         user_item_matrix = None
         item_sim_matrix = None
+    progress.lap("similarity", item_sim_matrix.nnz if item_sim_matrix is not None else 0)
 
     # Build Metadata Caches
     product_meta = {}
@@ -290,6 +394,8 @@ def refresh_engine_data():
             "description": row["description"],
             "product_count": row["product_count"],
         }
+    user_last_active = last_active
+    progress.lap("metadata", len(product_meta))
     
     print("[RecEngine] Refresh complete.")
 
@@ -297,13 +403,30 @@ def refresh_engine_data():
 # 3. CORE LOGIC
 # ============================================
 
+def get_content_similar_items(
+    product_id: str,
+    top_k: int = 20
+) -> List[Tuple[str, float]]:
+    """
+    Nearest neighbours by product embedding (ANN index). Covers products
+    that have no cart/favorite interactions and so no row in item_sim_matrix.
+    """
+    index = get_ann_index()
+    if index is None:
+        return []
+    try:
+        return index.similar_to(product_id, top_k, exact=get_embedding_matrix())
+    except Exception as e:
+        print(f"[RecEngine] Content similarity error for {product_id}: {e}")
+        return []
+
 def get_similar_items(
     product_id: str,
     top_k: int = 20,
     min_score: float = 0.0
 ) -> List[Tuple[str, float]]:
     if item_sim_matrix is None or product_id not in product_id_to_idx:
-        return []
+        return get_content_similar_items(product_id, top_k)
     
     item_idx = product_id_to_idx[product_id]
     sim_row = item_sim_matrix[item_idx].toarray().ravel()
@@ -319,8 +442,16 @@ def get_similar_items(
         results.append((idx_to_product_id[idx], float(score)))
         if len(results) >= top_k:
             break
+    if not results:
+        return get_content_similar_items(product_id, top_k)
     return results
 
+def active_user_ids(since: float) -> List[str]:
+    """Users with interactions and activity at or after `since` (all of them if timestamps are unavailable)"""
+    if not user_last_active:
+        return list(user_id_to_idx)
+    return [u for u in user_id_to_idx if user_last_active.get(u, 0.0) >= since]
+
 def get_user_profile(user_id: str) -> Dict[str, Any]:
     if interactions_df is None or user_id not in user_id_to_idx:
         return {
@@ -494,6 +625,50 @@ def recommend_for_user_item_cf(
     sorted_candidates = sorted(candidate_scores.items(), key=lambda x: x[1], reverse=True)
     return sorted_candidates[:top_k]
 
+def recommend_for_user_content(
+    user_id: str,
+    top_k: int = 50,
+    max_seed_items: int = 10,
+    neighbours_per_item: int = 20
+) -> List[Tuple[str, float]]:
+    """
+    Content-based candidates: embedding neighbours of the user's strongest
+    interactions, weighted the same way CF weights interaction strength.
+    """
+    if interactions_df is None or user_id not in user_id_to_idx or get_ann_index() is None:
+        return []
+    
+    user_interactions = interactions_df[interactions_df["user_id"] == user_id]
+    if user_interactions.empty:
+        return []
+    
+    interacted = set(user_interactions["product_id"])
+    seeds = user_interactions.sort_values("interaction_score", ascending=False).head(max_seed_items)
+    
+    candidate_scores = {}
+    for pid, ui_score in zip(seeds["product_id"], seeds["interaction_score"]):
+        for neighbour_id, sim in get_content_similar_items(pid, neighbours_per_item):
+            if neighbour_id in interacted or sim <= 0:
+                continue
+            candidate_scores[neighbour_id] = candidate_scores.get(neighbour_id, 0.0) + sim * (1.0 + 0.5 * float(ui_score))
+    
+    sorted_candidates = sorted(candidate_scores.items(), key=lambda x: x[1], reverse=True)
+    return sorted_candidates[:top_k]
+
+def blend_candidates(
+    cf_candidates: List[Tuple[str, float]],
+    content_candidates: List[Tuple[str, float]],
+    top_k: int = 50,
+    content_weight: Optional[float] = None
+) -> List[Tuple[str, float]]:
+    """Merge CF and content-based candidate scores into one ranking"""
+    if content_weight is None:
+        content_weight = settings.CONTENT_BLEND_WEIGHT
+    blended = dict(cf_candidates)
+    for pid, score in content_candidates:
+        blended[pid] = blended.get(pid, 0.0) + content_weight * score
+    return sorted(blended.items(), key=lambda x: x[1], reverse=True)[:top_k]
+
 # ============================================
 # 4. LLM RERANKING
 # ============================================
@@ -506,13 +681,8 @@ class RankedProduct:
     final_score: Optional[float] = None
     reason: Optional[str] = None
     meta: Optional[Dict[str, Any]] = None
-
-def get_mistral_client() -> Optional[Mistral]:
-    if not settings.MISTRAL_API_KEY:
-        print("⚠️ [RecEngine] MISTRAL_API_KEY is missing or empty.")
-        return None
-    # print(f"[RecEngine] Mistral Key Loaded: {settings.MISTRAL_API_KEY[:4]}...****") 
-    return Mistral(api_key=settings.MISTRAL_API_KEY)
+    # CF-only stand-in because the LLM missed its deadline
+    provisional: bool = False
 
 def build_candidate_payload(
     candidates: List[Tuple[str, float]],
@@ -535,80 +705,24 @@ def build_candidate_payload(
         })
     return payload
 
-def mistral_rerank(
-    user_profile: Dict[str, Any],
+def cf_ranking(candidates: List[Tuple[str, float]], provisional: bool = False) -> List[RankedProduct]:
+    """Candidates in CF order, without LLM scores"""
+    return [
+        RankedProduct(
+            product_id=pid,
+            score=cf_score,
+            final_score=cf_score,
+            meta=product_meta.get(pid, {}),
+            provisional=provisional
+        )
+        for pid, cf_score in candidates
+    ]
+
+def rank_with_llm_scores(
     candidates: List[Tuple[str, float]],
-    max_candidates_for_llm: int = 20
+    llm_map: Dict[str, Dict[str, Any]]
 ) -> List[RankedProduct]:
-    client = get_mistral_client()
-    # Optimize: If client is None OR user history empty, skip? No, keep going.
-    
-    if client is None:
-        return [
-            RankedProduct(
-                product_id=pid,
-                score=cf_score,
-                final_score=cf_score,
-                meta=product_meta.get(pid, {})
-            )
-            for pid, cf_score in candidates
-        ]
-    
-    llm_input_candidates = build_candidate_payload(candidates, max_candidates_for_llm)
-    
-    system_prompt = """
-You are a recommendation ranking engine for an e-commerce website.
-Your job is to:
-1) Re-rank candidate products for a user based on their history and preferences.
-2) Output a JSON array only, no extra text.
-Each element must be:
-{
-  "product_id": "...",
-  "llm_score": float (0.0 - 1.0),
-  "reason": "short natural language explanation"
-}
-Higher llm_score means more relevant.
-    """.strip()
-    
-    # Strip heavy history to save tokens if needed
-    
-    user_prompt = {
-        "user_profile": user_profile,
-        "candidates": llm_input_candidates
-    }
-    
-    try:
-        response = client.chat.complete(
-            model=MISTRAL_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt,
-                },
-                {
-                    "role": "user",
-                    "content": json.dumps(user_prompt, default=str),
-                },
-            ],
-        )
-        content = response.choices[0].message.content
-        llm_results = json.loads(content)
-    except Exception as e:
-        import traceback
-        print(f"[RecEngine] ❌ LLM Request Failed: {e}")
-        # traceback.print_exc()
-        llm_results = []
-    
-    llm_map = {}
-    if isinstance(llm_results, list):
-        for item in llm_results:
-            pid = item.get("product_id")
-            if not pid: continue
-            llm_map[pid] = {
-                "llm_score": float(item.get("llm_score", 0.0)),
-                "reason": item.get("reason")
-            }
-            
+    """Blend CF and LLM scores; candidates the LLM skipped get a metadata-based reason"""
     ranked: List[RankedProduct] = []
     for pid, cf_score in candidates:
         meta = product_meta.get(pid, {})
@@ -641,50 +755,106 @@ Higher llm_score means more relevant.
     ranked.sort(key=lambda x: x.final_score if x.final_score is not None else x.score, reverse=True)
     return ranked
 
+def mistral_rerank(
+    user_profile: Dict[str, Any],
+    candidates: List[Tuple[str, float]],
+    max_candidates_for_llm: int = 20
+) -> List[RankedProduct]:
+    if not reranker.enabled:
+        return cf_ranking(candidates)
+    
+    started = time.time()
+    llm_input_candidates = build_candidate_payload(candidates, max_candidates_for_llm)
+    
+    # Same profile and candidates as a recent call: reuse its scores and reasons
+    cache_key = rerank_key(user_profile, [c["product_id"] for c in llm_input_candidates])
+    llm_map = get_rerank(cache_key)
+    source = "cache"
+    if llm_map is None:
+        llm_map = reranker.scores(cache_key, user_profile, llm_input_candidates)
+        source = "llm" if llm_map is not None else "deadline"
+    
+    elapsed_ms = (time.time() - started) * 1000
+    reranker.record_end_to_end(elapsed_ms)
+    print(f"[RecEngine] Rerank for {user_profile.get('user_id')} via {source} in {elapsed_ms:.0f}ms")
+    if llm_map is None:
+        # Past the deadline: answer with CF order now; the late result fills the cache
+        return cf_ranking(candidates, provisional=True)
+            
+    return rank_with_llm_scores(candidates, llm_map)
+
 # ============================================
 # 5. API FACADE
 # ============================================
 
-def recommend_for_user_hybrid(
-    user_id: str,
-    top_k: int = 10
-) -> List[Dict[str, Any]]:
-    # Auto-init if needed?
-    if interactions_df is None:
-        print("[RecEngine] Data not loaded, initializing...")
-        refresh_engine_data()
-        
+def popularity_fallback(top_k: int = 10) -> List[Dict[str, Any]]:
+    """
+    Most-rated products from the precomputed homepage aggregates, shaped like
+    recommend_for_user_hybrid output. Used while the engine has no data.
+    """
+    homepage = get_homepage_aggregates()
+    snapshot = get_catalog()
+    if homepage is None or snapshot is None:
+        return []
+    
+    final = []
+    for pid in homepage.globally_loved[:top_k]:
+        ordinal = snapshot.id_to_ordinal.get(pid)
+        meta = snapshot.rows[ordinal] if ordinal is not None else {}
+        final.append({
+            "product_id": pid,
+            "name": meta.get("name"),
+            "brand": meta.get("brand"),
+            "main_category": meta.get("main_category"),
+            "sub_category": meta.get("sub_category"),
+            "image": meta.get("image"),
+            "link": meta.get("link"),
+            "cluster_id": meta.get("cluster_id"),
+            "discount_price": meta.get("discount_price"),
+            "actual_price": meta.get("actual_price"),
+            "ratings": meta.get("ratings"),
+            "cf_score": 0.1,
+            "llm_score": None,
+            "final_score": 0.1,
+            "reason": POPULARITY_FALLBACK_REASON,
+        })
+    return final
+
+def candidates_for_user(user_id: str) -> Tuple[List[Tuple[str, float]], bool]:
+    """CF candidates blended with content-similar items, or best sellers (is_fallback=True)"""
     cf_candidates = recommend_for_user_item_cf(user_id, top_k=50)
+    content_candidates = recommend_for_user_content(user_id, top_k=50)
+    if content_candidates:
+        cf_candidates = blend_candidates(cf_candidates, content_candidates, top_k=50)
     
     is_fallback = False
     if not cf_candidates:
         print(f"[RecEngine] User {user_id} has no CF candidates (sparse/new user). using fallback.")
         cf_candidates = get_global_best_sellers(top_k=50)
         is_fallback = True
-        
-    if not cf_candidates:
-        return []
-    
+    return cf_candidates, is_fallback
+
+def rerank_profile(user_id: str, is_fallback: bool) -> Dict[str, Any]:
     profile = get_user_profile(user_id)
     
     # If fallback, tell LLM it's popularity based
     if is_fallback:
         profile["persona_hint"] += " (Using Popular Products Fallback)"
-    
-    ranked = mistral_rerank(profile, cf_candidates, max_candidates_for_llm=20)
-    
-    # If LLM failed, we still have candidates
-    if not ranked and cf_candidates:
-         ranked = [
-            RankedProduct(
-                product_id=pid,
-                score=score,
-                final_score=score,
-                meta=product_meta.get(pid, {})
-            )
-            for pid, score in cf_candidates
-        ]
-    
+    return profile
+
+def prepare_rerank(
+    user_id: str,
+    candidates: List[Tuple[str, float]],
+    is_fallback: bool,
+    max_candidates_for_llm: int = 20
+) -> Tuple[str, Dict[str, Any], List[Dict[str, Any]]]:
+    """(cache key, profile, LLM payload) for reranking candidates outside mistral_rerank"""
+    profile = rerank_profile(user_id, is_fallback)
+    llm_input_candidates = build_candidate_payload(candidates, max_candidates_for_llm)
+    return rerank_key(profile, [c["product_id"] for c in llm_input_candidates]), profile, llm_input_candidates
+
+def final_recommendations(ranked: List[RankedProduct], top_k: int) -> List[Dict[str, Any]]:
+    """Deduplicated top_k of a ranking, as API-facing dicts"""
     # Deduplicate by product_id, keeping the first (highest scored) occurrence
     seen_ids = set()
     unique_ranked = []
@@ -712,5 +882,46 @@ def recommend_for_user_hybrid(
             "llm_score": rp.llm_score,
             "final_score": rp.final_score,
             "reason": rp.reason,
+            "provisional": rp.provisional,
         })
     return final
+
+def recommend_for_user_hybrid(
+    user_id: str,
+    top_k: int = 10,
+    candidates: Optional[List[Tuple[str, float]]] = None
+) -> List[Dict[str, Any]]:
+    """`candidates`, when given (e.g. precomputed), replace candidates_for_user"""
+    if not engine_ready():
+        # Loading is left to the background refresh; never pay for it in a request
+        return popularity_fallback(top_k)
+        
+    cf_candidates, is_fallback = (candidates, False) if candidates else candidates_for_user(user_id)
+    if not cf_candidates:
+        return []
+    
+    profile = rerank_profile(user_id, is_fallback)
+    ranked = mistral_rerank(profile, cf_candidates, max_candidates_for_llm=20)
+    
+    # If LLM failed, we still have candidates
+    if not ranked and cf_candidates:
+        ranked = cf_ranking(cf_candidates)
+    
+    return final_recommendations(ranked, top_k)
+
+def recommend_for_user_cf(
+    user_id: str,
+    top_k: int = 10,
+    candidates: Optional[List[Tuple[str, float]]] = None
+) -> Tuple[List[Dict[str, Any]], List[Tuple[str, float]], bool]:
+    """
+    First phase of two-phase recommendations: CF order only, no profile or
+    LLM work. Returns (recommendations, candidates, is_fallback); the
+    candidates are what the second phase reranks (none while loading).
+    `candidates`, when given, replace candidates_for_user.
+    """
+    if not engine_ready():
+        return popularity_fallback(top_k), [], False
+    
+    cf_candidates, is_fallback = (candidates, False) if candidates else candidates_for_user(user_id)
+    return final_recommendations(cf_ranking(cf_candidates), top_k), cf_candidates, is_fallback
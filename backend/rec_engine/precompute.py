@@ -0,0 +1,342 @@
+"""
+Offline batch precomputation of recommendations for active users.
+
+Online, `recommend_for_user_item_cf` walks each interacted item's
+similarity row in Python. For a batch the same score is one sparse
+product: with W the users' interaction weights (1 + 0.5 * score, on their
+first 50 interactions, as online) and P the item similarity matrix cut to
+each row's strongest 200 neighbours (the slice online looks at), W @ P sums
+the similarity contributions for every user at once. That product is then
+scaled by each item's popularity and the user's cluster boost, and the
+items W came from are masked out (rec_engine.batch_cf). With
+PRECOMPUTE_WORKERS above 1, user chunks are spread over a spawned process
+pool; by default they are scored in-process. Blending in content
+candidates, the optional LLM rerank (several users per call, see
+AsyncReranker.submit_batch) and the final ordering reuse the online
+functions.
+
+Each user's candidates (ids and CF scores, exactly what the online
+pipeline would rerank) are stored compactly in `precomputed_recs`, with
+the LLM scores and reasons when a rerank result is at hand, and the user's
+rerank epoch as of the start of the run. With those scores, or with the
+reranker disabled, a request is answered from the entry alone; otherwise
+the online pipeline reranks the stored candidates, skipping the CF and
+content work. New cart or favorites activity bumps the epoch and deletes
+the entry (see rerank_cache.on_invalidate); an entry is only used while
+the epoch it was built under is current, so activity during a run is not
+masked by its result.
+
+The batch LLM rerank is opt-in (PRECOMPUTE_RERANK): its results only pay
+off for users who come back before the entry expires. Users whose rerank
+key (profile plus candidates) is unchanged since the previous run keep
+that run's scores instead of being sent to the model again.
+
+Runs after each successful engine refresh (PRECOMPUTE_AFTER_REFRESH), or by
+hand; a separate process only reaches the server through a shared
+PRECOMPUTE_CACHE_BACKEND (file or redis):
+
+    python -m rec_engine.precompute                 # load engine data, precompute, store
+    python -m rec_engine.precompute --rerank        # also batch-rerank through the LLM
+    python -m rec_engine.precompute --days 7 --workers 4
+"""
+import argparse
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from config import settings
+from rec_engine import engine
+from rec_engine.batch_cf import init_worker, prune_rows, score_chunk
+from rec_engine.rerank_cache import get_rerank, on_invalidate, user_epoch, user_epochs
+from rec_engine.reranker import reranker
+from utils.cache_backends import create_cache
+
+CHUNK_USERS = 1024
+# Interactions per user and similarity neighbours per item that online CF looks at
+MAX_INTERACTIONS = 50
+NEIGHBOURS_PER_ITEM = 200
+CANDIDATES_PER_USER = 50
+MAX_CANDIDATES_FOR_LLM = 20
+
+precomputed_recs = create_cache(
+    "precomputed-recs",
+    maxsize=settings.PRECOMPUTE_MAX_USERS,
+    ttl=settings.PRECOMPUTE_TTL_SECONDS,
+    backend=settings.PRECOMPUTE_CACHE_BACKEND or None,
+)
+
+_lock = threading.Lock()
+_served = 0
+_partial = 0
+_missed = 0
+_last_run: Optional[Dict[str, Any]] = None
+
+@on_invalidate
+def _drop_precomputed(user_id: str):
+    precomputed_recs.delete(user_id)
+
+
+def _item_features(num_items: int) -> Tuple[np.ndarray, np.ndarray, csr_matrix]:
+    """(popularity, cluster index or -1, item x cluster one-hot) from product_meta, as online CF reads them"""
+    popularity = np.zeros(num_items)
+    item_cluster = np.full(num_items, -1, dtype=np.int64)
+    cluster_index: Dict[Any, int] = {}
+    for idx, pid in engine.idx_to_product_id.items():
+        meta = engine.product_meta.get(pid, {})
+        buys = meta.get("buys") or 0
+        if isinstance(buys, str): buys = 0
+        add_to_cart = meta.get("add_to_cart") or 0
+        if isinstance(add_to_cart, str): add_to_cart = 0
+        popularity[idx] = np.log1p(float(buys) + 0.5 * float(add_to_cart))
+        cid = meta.get("cluster_id")
+        if cid is not None and cid == cid:
+            item_cluster[idx] = cluster_index.setdefault(cid, len(cluster_index))
+    clustered = np.flatnonzero(item_cluster >= 0)
+    onehot = csr_matrix(
+        (np.ones(len(clustered), dtype=np.float32), (clustered, item_cluster[clustered])),
+        shape=(num_items, max(len(cluster_index), 1)),
+    )
+    return np.nan_to_num(popularity), item_cluster, onehot
+
+
+def batch_cf_candidates(
+    user_ids: List[str],
+    top_k: int = CANDIDATES_PER_USER,
+    workers: int = 1
+) -> Dict[str, List[Tuple[str, float]]]:
+    """CF candidates for many users at once; users with none are left out"""
+    matrix, similarity = engine.user_item_matrix, engine.item_sim_matrix
+    if matrix is None or similarity is None or not user_ids:
+        return {}
+    num_items = matrix.shape[1]
+    index = {u: i for i, u in enumerate(user_ids)}
+
+    frame = engine.interactions_df[engine.interactions_df["user_id"].isin(index)]
+    rows = frame["user_id"].map(index).values
+    cols = frame["product_id"].map(engine.product_id_to_idx).values
+    interactions = csr_matrix(
+        (np.ones(len(frame), dtype=np.float32), (rows, cols)), shape=(len(user_ids), num_items)
+    )
+    first = frame.groupby("user_id", sort=False).head(MAX_INTERACTIONS)
+    weights = csr_matrix(
+        (
+            1.0 + 0.5 * first["interaction_score"].astype(float).values,
+            (first["user_id"].map(index).values, first["product_id"].map(engine.product_id_to_idx).values),
+        ),
+        shape=(len(user_ids), num_items),
+    )
+
+    pruned = prune_rows(similarity, NEIGHBOURS_PER_ITEM)
+    popularity, item_cluster, onehot = _item_features(num_items)
+    tasks = [
+        (start, weights[start:start + CHUNK_USERS], interactions[start:start + CHUNK_USERS], top_k)
+        for start in range(0, len(user_ids), CHUNK_USERS)
+    ]
+    if workers <= 1:
+        init_worker(pruned, popularity, item_cluster, onehot)
+        chunks = list(map(score_chunk, tasks))
+    else:
+        # Spawned, not forked: this runs on a thread of the API server, and
+        # the workers only import the numpy/scipy kernel in rec_engine.batch_cf
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(pruned, popularity, item_cluster, onehot),
+        ) as pool:
+            chunks = list(pool.map(score_chunk, tasks))
+
+    candidates = {}
+    for start, scored in chunks:
+        for offset, (items, scores) in enumerate(scored):
+            if len(items):
+                candidates[user_ids[start + offset]] = [
+                    (engine.idx_to_product_id[int(i)], float(s)) for i, s in zip(items, scores)
+                ]
+    return candidates
+
+
+def _store(
+    user_id: str,
+    candidates: List[Tuple[str, float]],
+    llm_map: Optional[Dict[str, Dict[str, Any]]],
+    rerank_key: Optional[str],
+    epoch: int
+):
+    precomputed_recs.set(user_id, {
+        "ids": [pid for pid, _ in candidates],
+        "cf": [score for _, score in candidates],
+        "llm": llm_map,
+        "rerank_key": rerank_key,
+        "epoch": epoch,
+        "at": time.time(),
+    })
+
+
+def precompute_recommendations(
+    since_days: Optional[float] = None,
+    workers: Optional[int] = None,
+    rerank: Optional[bool] = None,
+    progress: Optional[engine.RefreshProgress] = None
+) -> Dict[str, Any]:
+    """Precompute and store recommendations for users active in the last `since_days`; returns run stats"""
+    global _last_run
+    since_days = settings.PRECOMPUTE_ACTIVE_DAYS if since_days is None else since_days
+    workers = settings.PRECOMPUTE_WORKERS if workers is None else workers
+    rerank = settings.PRECOMPUTE_RERANK if rerank is None else rerank
+    rerank = rerank and reranker.enabled
+    progress = progress or engine.RefreshProgress()
+    started = time.time()
+
+    users = engine.active_user_ids(time.time() - since_days * 86400)
+    # Taken before any scoring, so activity during the run invalidates its result
+    epochs = user_epochs(users)
+    cf = batch_cf_candidates(users, CANDIDATES_PER_USER, workers)
+    progress.lap("precompute_cf", len(cf))
+
+    candidates: Dict[str, List[Tuple[str, float]]] = {}
+    for user_id, cf_candidates in cf.items():
+        content_candidates = engine.recommend_for_user_content(user_id, top_k=CANDIDATES_PER_USER)
+        if content_candidates:
+            cf_candidates = engine.blend_candidates(cf_candidates, content_candidates, top_k=CANDIDATES_PER_USER)
+        candidates[user_id] = cf_candidates
+    progress.lap("precompute_content", len(candidates))
+
+    llm_maps: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    rerank_keys: Dict[str, str] = {}
+    llm_calls = 0
+    reused = 0
+    if rerank:
+        previous, _ = precomputed_recs.get_many(list(candidates))
+        pending = []
+        for user_id, user_candidates in candidates.items():
+            cache_key, profile, payload = engine.prepare_rerank(
+                user_id, user_candidates, False, MAX_CANDIDATES_FOR_LLM
+            )
+            rerank_keys[user_id] = cache_key
+            entry = previous.get(user_id)
+            if entry and entry["llm"] and entry["rerank_key"] == cache_key:
+                # Same profile and candidates as last run: its scores still apply
+                llm_maps[user_id] = entry["llm"]
+                reused += 1
+                continue
+            cached = get_rerank(cache_key)
+            if cached is not None:
+                llm_maps[user_id] = cached
+            else:
+                pending.append((user_id, cache_key, profile, payload))
+        per_call = max(1, settings.PRECOMPUTE_RERANK_USERS_PER_CALL)
+        batches = [pending[start:start + per_call] for start in range(0, len(pending), per_call)]
+        # As many calls in flight as the client has connections
+        for wave in range(0, len(batches), settings.MISTRAL_POOL_SIZE):
+            calls = [
+                (batch, reranker.submit_batch([(key, profile, payload) for _, key, profile, payload in batch]))
+                for batch in batches[wave:wave + settings.MISTRAL_POOL_SIZE]
+            ]
+            for batch, future in calls:
+                try:
+                    results = future.result(timeout=settings.MISTRAL_TIMEOUT_SECONDS + 5)
+                except Exception as e:
+                    print(f"[RecEngine] Batch rerank of {len(batch)} users failed: {e}")
+                    results = {}
+                llm_calls += 1
+                for user_id, key, _, _ in batch:
+                    if key in results:
+                        llm_maps[user_id] = results[key]
+        progress.lap("precompute_rerank", len(llm_maps))
+
+    stored = 0
+    for user_id, user_candidates in candidates.items():
+        # Users without scores keep their candidates; the online path reranks them
+        _store(user_id, user_candidates, llm_maps.get(user_id), rerank_keys.get(user_id), epochs[user_id])
+        stored += 1
+    progress.lap("precompute_store", stored)
+
+    run = {
+        "finished_at": time.time(),
+        "duration_ms": round((time.time() - started) * 1000, 1),
+        "active_users": len(users),
+        "with_candidates": len(candidates),
+        "reranked": len(llm_maps),
+        "reused_rerank": reused,
+        "llm_calls": llm_calls,
+        "stored": stored,
+        "workers": workers,
+        "rerank": rerank,
+    }
+    with _lock:
+        _last_run = run
+    print(
+        f"[RecEngine] Precomputed recommendations for {stored}/{len(users)} active users "
+        f"in {run['duration_ms']:.0f}ms ({llm_calls} LLM calls)"
+    )
+    return run
+
+
+def precomputed_recommendations(
+    user_id: str,
+    top_k: int = 10
+) -> Tuple[Optional[List[Dict[str, Any]]], Optional[List[Tuple[str, float]]]]:
+    """
+    (recommendations, candidates) from the user's entry. Recommendations,
+    shaped like recommend_for_user_hybrid output, when the entry answers
+    the request by itself: a cache lookup and a sort of the candidates.
+    Otherwise None, with the stored candidates for the online rerank, or
+    None for both if the user is not covered or has had activity since.
+    """
+    global _served, _partial, _missed
+    entry = precomputed_recs.get(user_id)
+    if entry is None or entry["epoch"] != user_epoch(user_id):
+        with _lock:
+            _missed += 1
+        return None, None
+    candidates = list(zip(entry["ids"], entry["cf"]))
+    if entry["llm"]:
+        ranked = engine.rank_with_llm_scores(candidates, entry["llm"])
+    elif not reranker.enabled:
+        ranked = engine.cf_ranking(candidates)
+    else:
+        with _lock:
+            _partial += 1
+        return None, candidates
+    with _lock:
+        _served += 1
+    return engine.final_recommendations(ranked, top_k), candidates
+
+
+def precompute_stats() -> Dict[str, Any]:
+    with _lock:
+        lookups = _served + _partial + _missed
+        return {
+            **precomputed_recs.stats(),
+            "served": _served,
+            # Stored candidates handed to the online rerank
+            "candidates_only": _partial,
+            "missed": _missed,
+            "hit_rate": round(_served / lookups, 4) if lookups else 0.0,
+            "last_run": _last_run,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute recommendations for active users")
+    parser.add_argument("--days", type=float, default=settings.PRECOMPUTE_ACTIVE_DAYS,
+                        help="cover users active in this many days")
+    parser.add_argument("--workers", type=int, default=settings.PRECOMPUTE_WORKERS)
+    parser.add_argument("--rerank", action=argparse.BooleanOptionalAction, default=settings.PRECOMPUTE_RERANK,
+                        help="also batch-rerank through the LLM")
+    args = parser.parse_args()
+    if not engine.refresh_engine_data():
+        print(f"[RecEngine] Engine data failed to load: {engine.engine_status()['last_error']}")
+        return 1
+    run = precompute_recommendations(args.days, args.workers, rerank=args.rerank)
+    return 0 if run["stored"] or not run["active_users"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
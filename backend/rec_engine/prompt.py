@@ -0,0 +1,354 @@
+"""
+Compact rerank prompts and validation of the LLM's answer.
+
+The profile and candidates are sent as pipe-separated tables, one section
+per kind of row, with the column names given once in each section's first
+line:
+
+    ## user
+    id|persona
+    u1|User likes products in clusters: 3 (Running shoes)
+    ## clusters
+    id|title|count|description
+    ## history
+    id|score|category|brand|name
+    ## candidates
+    id|cf|category|brand|cluster|price|name
+
+Token counts are estimated at about four characters per token (there is no
+Mistral tokenizer here; the API's usage figures are the exact ones). When
+the estimate exceeds the budget, the least useful fields are dropped first,
+in REDUCTIONS order, until it fits. Candidates are never dropped, since
+each one needs a score; a prompt that still does not fit is sent as it is
+and flagged `over_budget`.
+
+Batch prompts (offline precomputation) put several users in one call, each
+block headed "# user <id>" and sized like a single-user prompt; the answer
+is a JSON object of arrays keyed by user id.
+"""
+import json
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple
+
+RERANK_SYSTEM_PROMPT = """
+You are a recommendation ranking engine for an e-commerce website.
+Your job is to:
+1) Re-rank candidate products for a user based on their history and preferences.
+2) Output a JSON array only, no extra text.
+The user message is a set of "## section" tables, columns separated by "|"
+and named in each section's first line. "history" lists the products the
+user engaged with most, "candidates" the products to rank.
+Each element of your answer must be:
+{
+  "product_id": "<id from the candidates table>",
+  "llm_score": float (0.0 - 1.0),
+  "reason": "short natural language explanation"
+}
+Higher llm_score means more relevant.
+""".strip()
+
+BATCH_RERANK_SYSTEM_PROMPT = """
+You are a recommendation ranking engine for an e-commerce website.
+Your job is to:
+1) Re-rank candidate products for each of several users, based on that user's history and preferences.
+2) Output a JSON object only, no extra text.
+The user message holds one block per user, starting with a "# user <id>"
+line, followed by that user's "## section" tables: columns separated by "|"
+and named in each section's first line. "history" lists the products the
+user engaged with most, "candidates" the products to rank.
+Map every user id to an array whose elements are:
+{
+  "product_id": "<id from that user's candidates table>",
+  "llm_score": float (0.0 - 1.0),
+  "reason": "short natural language explanation"
+}
+Higher llm_score means more relevant.
+""".strip()
+
+# Reasons longer than this are cut before they reach the product cards
+MAX_REASON_CHARS = 200
+
+
+class InvalidRerankResponse(ValueError):
+    """The LLM answer is not a JSON array with at least one usable score"""
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+
+def _cell(value: Any, max_chars: int = 0) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    text = " ".join(str(value).replace("|", "/").split())
+    if text == "None":
+        return ""
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars - 1].rstrip() + "…"
+    return text
+
+
+def _category(row: Dict[str, Any], with_sub: bool) -> str:
+    main = _cell(row.get("main_category"))
+    sub = _cell(row.get("sub_category")) if with_sub else ""
+    return f"{main}/{sub}" if main and sub else main or sub
+
+
+def _table(title: str, columns: List[str], rows: List[List[str]]) -> List[str]:
+    return [f"## {title}", "|".join(columns)] + ["|".join(row) for row in rows]
+
+
+@dataclass
+class PromptShape:
+    """What goes into the prompt; REDUCTIONS shrink it step by step"""
+    history_rows: int = 20
+    cluster_descriptions: bool = True
+    candidate_prices: bool = True
+    history_brands: bool = True
+    candidate_brands: bool = True
+    sub_categories: bool = True
+    name_chars: int = 80
+    dropped: List[str] = field(default_factory=list)
+
+
+def _set(**changes) -> Callable[[PromptShape], None]:
+    def apply(shape: PromptShape):
+        for name, value in changes.items():
+            setattr(shape, name, value)
+    return apply
+
+
+# Lowest value first: applied in order until the prompt fits the budget
+REDUCTIONS: List[Tuple[str, Callable[[PromptShape], None]]] = [
+    ("cluster_descriptions", _set(cluster_descriptions=False)),
+    ("candidate_prices", _set(candidate_prices=False)),
+    ("history_brands", _set(history_brands=False)),
+    ("history_rows>10", _set(history_rows=10)),
+    ("names>40", _set(name_chars=40)),
+    ("sub_categories", _set(sub_categories=False)),
+    ("history_rows>5", _set(history_rows=5)),
+    ("candidate_brands", _set(candidate_brands=False)),
+    ("names>20", _set(name_chars=20)),
+]
+
+
+@dataclass
+class RerankPrompt:
+    system: str
+    user: str
+    estimated_tokens: int
+    budget: int
+    dropped: List[str]
+    over_budget: bool
+
+    @property
+    def chars(self) -> int:
+        return len(self.system) + len(self.user)
+
+    def messages(self) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user},
+        ]
+
+
+def render_user_prompt(
+    user_profile: Dict[str, Any],
+    llm_input_candidates: List[Dict[str, Any]],
+    shape: PromptShape
+) -> str:
+    lines = _table("user", ["id", "persona"], [
+        [_cell(user_profile.get("user_id")), _cell(user_profile.get("persona_hint"))],
+    ])
+
+    clusters = user_profile.get("top_clusters", [])
+    if clusters:
+        columns = ["id", "title", "count"] + (["description"] if shape.cluster_descriptions else [])
+        rows = []
+        for c in clusters:
+            row = [_cell(c.get("cluster_id")), _cell(c.get("title")), _cell(c.get("count"))]
+            if shape.cluster_descriptions:
+                row.append(_cell(c.get("description"), 160))
+            rows.append(row)
+        lines += _table("clusters", columns, rows)
+
+    history = user_profile.get("history", [])[:shape.history_rows]
+    if history:
+        columns = ["id", "score", "category"] + (["brand"] if shape.history_brands else []) + ["name"]
+        rows = []
+        for h in history:
+            row = [_cell(h.get("product_id")), f"{float(h.get('score') or 0):.2f}", _category(h, shape.sub_categories)]
+            if shape.history_brands:
+                row.append(_cell(h.get("brand")))
+            row.append(_cell(h.get("name"), shape.name_chars))
+            rows.append(row)
+        lines += _table("history", columns, rows)
+
+    columns = ["id", "cf", "category"] + (["brand"] if shape.candidate_brands else []) + ["cluster"]
+    columns += (["price"] if shape.candidate_prices else []) + ["name"]
+    rows = []
+    for c in llm_input_candidates:
+        row = [_cell(c.get("product_id")), f"{float(c.get('cf_score') or 0):.3f}", _category(c, shape.sub_categories)]
+        if shape.candidate_brands:
+            row.append(_cell(c.get("brand")))
+        row.append(_cell((c.get("cluster") or {}).get("title") or c.get("cluster_id"), 40))
+        if shape.candidate_prices:
+            row.append(_cell(c.get("discount_price") or c.get("actual_price")))
+        row.append(_cell(c.get("name"), shape.name_chars))
+        rows.append(row)
+    lines += _table("candidates", columns, rows)
+    return "\n".join(lines)
+
+
+def _fit_user_prompt(
+    user_profile: Dict[str, Any],
+    llm_input_candidates: List[Dict[str, Any]],
+    budget: int
+) -> Tuple[str, int, List[str]]:
+    """(user prompt, estimated tokens, fields dropped) shrunk to fit `budget` tokens if possible"""
+    shape = PromptShape()
+    reductions = iter(REDUCTIONS)
+    while True:
+        user = render_user_prompt(user_profile, llm_input_candidates, shape)
+        tokens = estimate_tokens(user)
+        if tokens <= budget:
+            break
+        step = next(reductions, None)
+        if step is None:
+            break
+        name, apply = step
+        apply(shape)
+        shape.dropped.append(name)
+    return user, tokens, shape.dropped
+
+
+def build_rerank_prompt(
+    user_profile: Dict[str, Any],
+    llm_input_candidates: List[Dict[str, Any]],
+    budget: int
+) -> RerankPrompt:
+    """The smallest-loss prompt whose estimated size fits `budget` tokens"""
+    system_tokens = estimate_tokens(RERANK_SYSTEM_PROMPT)
+    user, tokens, dropped = _fit_user_prompt(user_profile, llm_input_candidates, budget - system_tokens)
+    tokens += system_tokens
+    return RerankPrompt(
+        system=RERANK_SYSTEM_PROMPT,
+        user=user,
+        estimated_tokens=tokens,
+        budget=budget,
+        dropped=dropped,
+        over_budget=tokens > budget,
+    )
+
+
+def build_batch_rerank_prompt(
+    entries: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]],
+    budget_per_user: int
+) -> RerankPrompt:
+    """
+    One prompt reranking several users' candidates, each user's block held
+    to what a single-user prompt of `budget_per_user` tokens would get
+    """
+    system_tokens = estimate_tokens(BATCH_RERANK_SYSTEM_PROMPT)
+    user_budget = budget_per_user - estimate_tokens(RERANK_SYSTEM_PROMPT)
+    blocks = []
+    dropped: List[str] = []
+    for user_profile, llm_input_candidates in entries:
+        user, _, user_dropped = _fit_user_prompt(user_profile, llm_input_candidates, user_budget)
+        blocks.append(f"# user {_cell(user_profile.get('user_id'))}\n{user}")
+        dropped += [name for name in user_dropped if name not in dropped]
+    user = "\n".join(blocks)
+    tokens = system_tokens + estimate_tokens(user)
+    budget = system_tokens + user_budget * len(entries)
+    return RerankPrompt(
+        system=BATCH_RERANK_SYSTEM_PROMPT,
+        user=user,
+        estimated_tokens=tokens,
+        budget=budget,
+        dropped=dropped,
+        over_budget=tokens > budget,
+    )
+
+
+def _json_value(content: str, opening: str, closing: str) -> Any:
+    """The JSON array or object in an answer, tolerating code fences or text around it"""
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", content.strip())
+    try:
+        return json.loads(text)
+    except ValueError:
+        start, end = text.find(opening), text.rfind(closing)
+        if start == -1 or end <= start:
+            raise InvalidRerankResponse(f"no JSON {'array' if opening == '[' else 'object'} in the response")
+        try:
+            return json.loads(text[start:end + 1])
+        except ValueError as e:
+            raise InvalidRerankResponse(f"malformed JSON: {e}")
+
+
+def _validated_scores(items: List[Any], candidate_ids: List[str]) -> Tuple[Dict[str, Dict[str, Any]], int]:
+    allowed = set(candidate_ids)
+    llm_map: Dict[str, Dict[str, Any]] = {}
+    rejected = 0
+    for item in items:
+        pid = str(item.get("product_id", "")) if isinstance(item, dict) else ""
+        if pid not in allowed or pid in llm_map:
+            rejected += 1
+            continue
+        try:
+            score = float(item.get("llm_score"))
+        except (TypeError, ValueError):
+            rejected += 1
+            continue
+        if math.isnan(score):
+            rejected += 1
+            continue
+        reason = item.get("reason")
+        llm_map[pid] = {
+            "llm_score": min(max(score, 0.0), 1.0),
+            "reason": (_cell(reason, MAX_REASON_CHARS) or None) if isinstance(reason, str) else None,
+        }
+    return llm_map, rejected
+
+
+def parse_scores(content: str, candidate_ids: List[str]) -> Tuple[Dict[str, Dict[str, Any]], int]:
+    """
+    ({product_id: {"llm_score", "reason"}}, rejected item count) from the
+    model's answer. Items for unknown or repeated products, or without a
+    numeric score, are rejected; scores are clamped to 0..1.
+    """
+    llm_results = _json_value(content, "[", "]")
+    if not isinstance(llm_results, list):
+        raise InvalidRerankResponse(f"expected a JSON array, got {type(llm_results).__name__}")
+    llm_map, rejected = _validated_scores(llm_results, candidate_ids)
+    if not llm_map:
+        raise InvalidRerankResponse(f"no usable scores ({rejected} items rejected)")
+    return llm_map, rejected
+
+
+def parse_batch_scores(
+    content: str,
+    candidate_ids: Dict[str, List[str]]
+) -> Tuple[Dict[str, Dict[str, Dict[str, Any]]], int]:
+    """
+    ({user_id: llm_map}, rejected item count) from the answer to a batch
+    prompt, validated per user as in parse_scores. Users missing from the
+    answer or without usable scores are left out.
+    """
+    llm_results = _json_value(content, "{", "}")
+    if not isinstance(llm_results, dict):
+        raise InvalidRerankResponse(f"expected a JSON object, got {type(llm_results).__name__}")
+    maps: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    rejected = 0
+    for user_id, ids in candidate_ids.items():
+        items = llm_results.get(user_id)
+        if not isinstance(items, list):
+            continue
+        llm_map, user_rejected = _validated_scores(items, ids)
+        rejected += user_rejected
+        if llm_map:
+            maps[user_id] = llm_map
+    if not maps:
+        raise InvalidRerankResponse(f"no usable scores for any user ({rejected} items rejected)")
+    return maps, rejected
@@ -0,0 +1,144 @@
+"""
+Cache of LLM rerank results.
+
+A rerank depends only on the user's profile and the ordered candidates sent
+to the model, so its result (llm_score and reason per product) is stored
+under a hash of the compact profile plus the candidate ids, and reused
+until RERANK_CACHE_TTL_SECONDS pass or the user's epoch changes.
+`invalidate_user` bumps the epoch when the user has new cart or favorites
+activity, which orphans every entry built for the old one, and runs the
+hooks other per-user caches register with `on_invalidate`.
+
+The entries use RERANK_CACHE_BACKEND when set (e.g. "file" to keep them
+across restarts), otherwise CACHE_BACKEND.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from config import settings
+from utils.cache_backends import create_cache
+
+rerank_cache = create_cache(
+    "rerank",
+    maxsize=settings.RERANK_CACHE_SIZE,
+    ttl=settings.RERANK_CACHE_TTL_SECONDS,
+    backend=settings.RERANK_CACHE_BACKEND or None,
+)
+# Per-user epochs; they live as long as the longest-lived entries they
+# invalidate, so an expired epoch never makes an older entry current again
+rerank_epochs = create_cache(
+    "rerank-epoch",
+    maxsize=settings.RERANK_CACHE_SIZE,
+    ttl=max(settings.RERANK_CACHE_TTL_SECONDS, settings.PRECOMPUTE_TTL_SECONDS),
+    backend=settings.RERANK_CACHE_BACKEND or None,
+)
+
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+_invalidations = 0
+_llm_calls = 0
+_llm_ms_total = 0.0
+_saved_ms = 0.0
+_invalidation_hooks: List[Callable[[str], None]] = []
+
+
+def compact_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of a profile the rerank depends on, in a stable form"""
+    return {
+        "user_id": profile.get("user_id"),
+        "history": [(str(h.get("product_id")), round(float(h.get("score") or 0), 3)) for h in profile.get("history", [])],
+        "clusters": [(c.get("cluster_id"), c.get("count")) for c in profile.get("top_clusters", [])],
+        "hint": profile.get("persona_hint"),
+    }
+
+
+def user_epoch(user_id: str) -> int:
+    """Changes whenever invalidate_user is called for the user"""
+    return rerank_epochs.get(user_id, 0)
+
+
+async def user_epoch_async(user_id: str) -> int:
+    return await rerank_epochs.get_async(user_id, 0)
+
+
+def user_epochs(user_ids: Iterable[str]) -> Dict[str, int]:
+    """user_epoch for many users in one cache round trip"""
+    user_ids = list(user_ids)
+    found, _ = rerank_epochs.get_many(user_ids)
+    return {user_id: found.get(user_id, 0) for user_id in user_ids}
+
+
+def rerank_key(profile: Dict[str, Any], candidate_ids: List[str]) -> str:
+    digest = hashlib.sha1(
+        json.dumps([compact_profile(profile), candidate_ids], default=str, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+    epoch = user_epoch(profile.get("user_id"))
+    return f"{profile.get('user_id')}:{epoch}:{digest}"
+
+
+def get_rerank(key: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Cached {product_id: {"llm_score", "reason"}} for a key, or None"""
+    global _hits, _misses, _saved_ms
+    result = rerank_cache.get(key)
+    with _lock:
+        if result is None:
+            _misses += 1
+        else:
+            _hits += 1
+            if _llm_calls:
+                _saved_ms += _llm_ms_total / _llm_calls
+    return result
+
+
+def store_rerank(key: str, llm_map: Dict[str, Dict[str, Any]], llm_ms: float):
+    """Record an LLM call's latency and cache its result (empty results are not cached)"""
+    global _llm_calls, _llm_ms_total
+    with _lock:
+        _llm_calls += 1
+        _llm_ms_total += llm_ms
+    if llm_map:
+        rerank_cache.set(key, llm_map)
+
+
+def on_invalidate(hook: Callable[[str], None]) -> Callable[[str], None]:
+    """Register hook(user_id) to run whenever invalidate_user is called"""
+    _invalidation_hooks.append(hook)
+    return hook
+
+
+def invalidate_user(user_id: str):
+    """Drop the user's cached reranks; call when they have new interactions"""
+    global _invalidations
+    rerank_epochs.set(user_id, time.time_ns())
+    for hook in _invalidation_hooks:
+        try:
+            hook(user_id)
+        except Exception as e:
+            print(f"[RecEngine] Invalidation hook {getattr(hook, '__name__', hook)} failed for {user_id}: {e}")
+    with _lock:
+        _invalidations += 1
+
+
+async def invalidate_user_async(user_id: str):
+    """invalidate_user for route handlers: a shared backend's writes do not block the event loop"""
+    await asyncio.to_thread(invalidate_user, user_id)
+
+
+def rerank_cache_stats() -> Dict[str, Any]:
+    with _lock:
+        lookups = _hits + _misses
+        return {
+            **rerank_cache.stats(),
+            "hits": _hits,
+            "misses": _misses,
+            "hit_rate": round(_hits / lookups, 4) if lookups else 0.0,
+            "invalidations": _invalidations,
+            "llm_calls": _llm_calls,
+            "avg_llm_ms": round(_llm_ms_total / _llm_calls, 1) if _llm_calls else None,
+            "saved_llm_ms": round(_saved_ms, 1),
+        }
@@ -0,0 +1,293 @@
+"""
+Pooled, deadline-bounded LLM reranking.
+
+The recommendation pipeline runs on worker threads, so the Mistral calls are
+made from one long-lived event loop on a background thread. It holds a
+single Mistral client over a keep-alive httpx pool, MISTRAL_POOL_SIZE
+connections wide. `scores` waits at most RERANK_DEADLINE_MS for a
+completion. If that passes it returns None and the caller serves the
+CF-only ranking, but the call is not cancelled: it keeps running (up to
+MISTRAL_TIMEOUT_SECONDS) and stores its result in the rerank cache for the
+next request. Requests for a key that is still in flight join that call.
+`submit` starts (or joins) a call without waiting, for callers that deliver
+the result later, like the two-phase recommendation tickets.
+
+Prompts are built by rec_engine.prompt within RERANK_PROMPT_TOKEN_BUDGET
+and answers are validated there. `submit_batch` reranks several users in
+one call for the offline precomputation (rec_engine.precompute). Every
+call logs its prompt size, token usage and latency, and the most recent
+ones are kept for `stats`.
+
+MISTRAL_BASE_URL points the client at a different server, e.g.
+devtools.mistral_stub.
+"""
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from mistralai import Mistral
+
+from config import settings
+from rec_engine.prompt import (
+    InvalidRerankResponse,
+    RerankPrompt,
+    build_batch_rerank_prompt,
+    build_rerank_prompt,
+    parse_batch_scores,
+    parse_scores,
+)
+from rec_engine.rerank_cache import store_rerank
+
+MISTRAL_MODEL = "mistral-small-latest"
+
+# Per-call metrics kept for the stats endpoint
+RECENT_CALLS = 50
+
+class AsyncReranker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[Mistral] = None
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self.calls = 0
+        self.joined = 0
+        self.deadline_misses = 0
+        self.completed_late = 0
+        self.failures = 0
+        self.invalid_responses = 0
+        self.llm_ms_total = 0.0
+        self.prompt_tokens_total = 0
+        self.completion_tokens_total = 0
+        self.end_to_end_count = 0
+        self.end_to_end_ms_total = 0.0
+        self._recent: deque = deque(maxlen=RECENT_CALLS)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.MISTRAL_API_KEY)
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        # Caller holds self._lock
+        if self._loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-rerank", daemon=True).start()
+            self._client = Mistral(
+                api_key=settings.MISTRAL_API_KEY,
+                server_url=settings.MISTRAL_BASE_URL or None,
+                async_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=settings.MISTRAL_POOL_SIZE,
+                        max_keepalive_connections=settings.MISTRAL_POOL_SIZE,
+                    ),
+                    timeout=settings.MISTRAL_TIMEOUT_SECONDS,
+                ),
+                timeout_ms=int(settings.MISTRAL_TIMEOUT_SECONDS * 1000),
+            )
+            self._loop = loop
+        return self._loop
+
+    def scores(
+        self,
+        cache_key: str,
+        user_profile: Dict[str, Any],
+        llm_input_candidates: List[Dict[str, Any]],
+        deadline: Optional[float] = None,
+    ) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        LLM scores for the candidates, {} if the call failed, or None if it
+        did not finish within `deadline` seconds (default RERANK_DEADLINE_MS)
+        """
+        deadline = settings.RERANK_DEADLINE_MS / 1000 if deadline is None else deadline
+        future = self.submit(cache_key, user_profile, llm_input_candidates)
+        try:
+            return future.result(timeout=deadline)
+        except concurrent.futures.TimeoutError:
+            with self._lock:
+                self.deadline_misses += 1
+            return None
+
+    def submit(
+        self,
+        cache_key: str,
+        user_profile: Dict[str, Any],
+        llm_input_candidates: List[Dict[str, Any]],
+    ) -> concurrent.futures.Future:
+        """Start the call (or join the one in flight for this key) without waiting"""
+        with self._lock:
+            future = self._inflight.get(cache_key)
+            if future is not None:
+                self.joined += 1
+                return future
+            loop = self._start()
+            future = asyncio.run_coroutine_threadsafe(
+                self._complete(cache_key, user_profile, llm_input_candidates), loop
+            )
+            self._inflight[cache_key] = future
+        # Outside the lock: a future that is already done runs the callback on this thread
+        future.add_done_callback(lambda done: self._forget(cache_key, done))
+        return future
+
+    def _forget(self, cache_key: str, future: concurrent.futures.Future):
+        with self._lock:
+            if self._inflight.get(cache_key) is future:
+                del self._inflight[cache_key]
+
+    async def _complete(
+        self,
+        cache_key: str,
+        user_profile: Dict[str, Any],
+        llm_input_candidates: List[Dict[str, Any]],
+    ) -> Dict[str, Dict[str, Any]]:
+        try:
+            prompt = build_rerank_prompt(user_profile, llm_input_candidates, settings.RERANK_PROMPT_TOKEN_BUDGET)
+            candidate_ids = [str(c["product_id"]) for c in llm_input_candidates]
+        except Exception as e:
+            print(f"[RecEngine] ❌ Could not build the rerank prompt: {e}")
+            with self._lock:
+                self.failures += 1
+            return {}
+        llm_map, elapsed_ms = await self._call(
+            prompt, lambda content: parse_scores(content, candidate_ids),
+            user_profile.get("user_id"), len(candidate_ids),
+        )
+        store_rerank(cache_key, llm_map or {}, elapsed_ms)
+        return llm_map or {}
+
+    def submit_batch(
+        self,
+        entries: List[Tuple[str, Dict[str, Any], List[Dict[str, Any]]]],
+    ) -> concurrent.futures.Future:
+        """
+        Rerank several users in one LLM call, for offline precomputation.
+        `entries` are (cache_key, profile, payload) as for `scores`; the
+        future resolves to {cache_key: llm_map} for the users the model
+        answered usably, which are also stored in the rerank cache.
+        """
+        with self._lock:
+            loop = self._start()
+        return asyncio.run_coroutine_threadsafe(self._complete_batch(entries), loop)
+
+    async def _complete_batch(
+        self,
+        entries: List[Tuple[str, Dict[str, Any], List[Dict[str, Any]]]],
+    ) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        prompt = build_batch_rerank_prompt(
+            [(profile, payload) for _, profile, payload in entries], settings.RERANK_PROMPT_TOKEN_BUDGET
+        )
+        candidate_ids = {
+            str(profile.get("user_id")): [str(c["product_id"]) for c in payload] for _, profile, payload in entries
+        }
+        maps, elapsed_ms = await self._call(
+            prompt, lambda content: parse_batch_scores(content, candidate_ids),
+            f"{len(entries)} users", sum(len(ids) for ids in candidate_ids.values()),
+            count=lambda maps: sum(len(m) for m in maps.values()),
+        )
+        results = {}
+        for cache_key, profile, _ in entries:
+            llm_map = (maps or {}).get(str(profile.get("user_id")), {})
+            # Each user is charged an equal share of the call
+            store_rerank(cache_key, llm_map, elapsed_ms / len(entries))
+            if llm_map:
+                results[cache_key] = llm_map
+        return results
+
+    async def _call(
+        self,
+        prompt: RerankPrompt,
+        parse: Callable[[str], Tuple[Any, int]],
+        label: Any,
+        candidates: int,
+        count: Callable[[Any], int] = len,
+    ) -> Tuple[Any, float]:
+        """One completion: (parsed answer or None on failure, LLM ms); logs and records its metrics"""
+        usage = None
+        rejected = 0
+        error = None
+        parsed = None
+        started = time.time()
+        try:
+            response = await self._client.chat.complete_async(
+                model=MISTRAL_MODEL,
+                messages=prompt.messages(),
+            )
+            usage = response.usage
+            parsed, rejected = parse(response.choices[0].message.content)
+        except InvalidRerankResponse as e:
+            print(f"[RecEngine] ❌ LLM returned an invalid ranking: {e}")
+            error = f"invalid response: {e}"
+        except Exception as e:
+            print(f"[RecEngine] ❌ LLM Request Failed: {e}")
+            error = str(e)
+        elapsed_ms = (time.time() - started) * 1000
+        metrics = {
+            "user_id": label,
+            "at": started,
+            "candidates": candidates,
+            "prompt_chars": prompt.chars,
+            "estimated_prompt_tokens": prompt.estimated_tokens,
+            "token_budget": prompt.budget,
+            "over_budget": prompt.over_budget,
+            "dropped": prompt.dropped,
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+            "llm_ms": round(elapsed_ms, 1),
+            "scores": count(parsed) if parsed is not None else 0,
+            "rejected_items": rejected,
+            "error": error,
+        }
+        with self._lock:
+            self.calls += 1
+            self.llm_ms_total += elapsed_ms
+            if error is not None:
+                self.failures += 1
+                if error.startswith("invalid response"):
+                    self.invalid_responses += 1
+            self.prompt_tokens_total += metrics["prompt_tokens"] or 0
+            self.completion_tokens_total += metrics["completion_tokens"] or 0
+            if elapsed_ms > settings.RERANK_DEADLINE_MS:
+                self.completed_late += 1
+            self._recent.append(metrics)
+        print(
+            f"[RecEngine] Rerank for {label}: {prompt.chars} chars, "
+            f"~{prompt.estimated_tokens}/{prompt.budget} tokens"
+            + (f" (dropped {', '.join(prompt.dropped)})" if prompt.dropped else "")
+            + f", usage {metrics['prompt_tokens']}+{metrics['completion_tokens']} tokens, "
+            f"{elapsed_ms:.0f}ms, {metrics['scores']} scores"
+        )
+        return parsed, elapsed_ms
+
+    def record_end_to_end(self, elapsed_ms: float):
+        """Time a caller spent getting a rerank: cache lookup, prompt, wait for the LLM"""
+        with self._lock:
+            self.end_to_end_count += 1
+            self.end_to_end_ms_total += elapsed_ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "deadline_ms": settings.RERANK_DEADLINE_MS,
+                "pool_size": settings.MISTRAL_POOL_SIZE,
+                "in_flight": len(self._inflight),
+                "calls": self.calls,
+                "joined": self.joined,
+                "deadline_misses": self.deadline_misses,
+                "completed_late": self.completed_late,
+                "failures": self.failures,
+                "invalid_responses": self.invalid_responses,
+                "avg_llm_ms": round(self.llm_ms_total / self.calls, 1) if self.calls else None,
+                "token_budget": settings.RERANK_PROMPT_TOKEN_BUDGET,
+                "avg_prompt_tokens": round(self.prompt_tokens_total / self.calls, 1) if self.calls else None,
+                "avg_completion_tokens": round(self.completion_tokens_total / self.calls, 1) if self.calls else None,
+                "avg_end_to_end_ms": (
+                    round(self.end_to_end_ms_total / self.end_to_end_count, 1) if self.end_to_end_count else None
+                ),
+                "recent": list(self._recent),
+            }
+
+
+reranker = AsyncReranker()
@@ -0,0 +1,187 @@
+"""
+Recommendation engine refresh scheduler.
+
+All refreshes (startup, periodic, `POST /api/recommendations/refresh`) are
+jobs run one at a time on a single background thread:
+
+- At most one job is queued behind the running one. A trigger that arrives
+  while a job is queued joins that job instead of adding another run.
+- A queued job is not started sooner than ENGINE_REFRESH_MIN_INTERVAL_SECONDS
+  after the previous run started (the startup job excepted).
+- Once idle, a periodic job is queued ENGINE_REFRESH_SECONDS after the last
+  run (0 disables it), or a retry ENGINE_RETRY_SECONDS after a failed one.
+
+After a successful refresh the job also runs the batch precomputation
+(rec_engine/precompute.py) unless PRECOMPUTE_AFTER_REFRESH is off; its
+steps are timed with the refresh's.
+
+Each job records its triggers, timings, per-step durations and row counts;
+recent jobs are kept for the status endpoint.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from rec_engine.engine import RefreshProgress, engine_status, refresh_engine_data
+from rec_engine.precompute import precompute_recommendations
+
+# Finished jobs kept for lookup by id
+JOB_HISTORY = 50
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class RefreshJob:
+    def __init__(self, trigger: str, due_at: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.status = QUEUED
+        self.triggers: Dict[str, int] = {trigger: 1}
+        self.requested_at = time.time()
+        self.due_at = due_at
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.progress = RefreshProgress()
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        duration = None
+        if self.started_at is not None:
+            duration = round(((self.finished_at or time.time()) - self.started_at) * 1000, 1)
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "triggers": dict(self.triggers),
+            "requested_at": self.requested_at,
+            "scheduled_for": self.due_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_ms": duration,
+            "steps_ms": dict(self.progress.steps),
+            "rows": dict(self.progress.rows),
+            "error": self.error,
+        }
+
+
+class RefreshScheduler:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending: Optional[RefreshJob] = None
+        self._running: Optional[RefreshJob] = None
+        self._last: Optional[RefreshJob] = None
+        self._jobs: "OrderedDict[str, RefreshJob]" = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def start(self):
+        """Start the worker thread and queue the initial load"""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._queue("startup", time.time())
+            self._thread = threading.Thread(target=self._run, name="rec-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def trigger(self, source: str = "api") -> RefreshJob:
+        """Request a refresh; returns the (possibly shared) job that will serve it"""
+        with self._cond:
+            earliest = time.time()
+            if self._last is not None or self._running is not None:
+                last_start = (self._running or self._last).started_at
+                earliest = max(earliest, last_start + settings.ENGINE_REFRESH_MIN_INTERVAL_SECONDS)
+            job = self._queue(source, earliest)
+            self._cond.notify_all()
+            return job
+
+    def _queue(self, source: str, due_at: float) -> RefreshJob:
+        job = self._pending
+        if job is None:
+            job = self._pending = RefreshJob(source, due_at)
+            self._remember(job)
+        else:
+            job.triggers[source] = job.triggers.get(source, 0) + 1
+            job.due_at = min(job.due_at, due_at)
+        return job
+
+    def _remember(self, job: RefreshJob):
+        self._jobs[job.id] = job
+        while len(self._jobs) > JOB_HISTORY:
+            self._jobs.popitem(last=False)
+
+    def _next_job(self) -> Optional[RefreshJob]:
+        """Wait until the queued job is due, queueing the periodic one when idle"""
+        with self._cond:
+            while not self._stopped:
+                if self._pending is None and self._last is not None:
+                    if self._last.status == FAILED:
+                        self._queue("retry", self._last.finished_at + settings.ENGINE_RETRY_SECONDS)
+                    elif settings.ENGINE_REFRESH_SECONDS > 0:
+                        self._queue("schedule", self._last.finished_at + settings.ENGINE_REFRESH_SECONDS)
+                job = self._pending
+                wait = None if job is None else job.due_at - time.time()
+                if wait is not None and wait <= 0:
+                    self._pending = None
+                    self._running = job
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                    job.progress = RefreshProgress()
+                    return job
+                self._cond.wait(wait)
+            return None
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                ok = refresh_engine_data(job.progress)
+                job.status = SUCCEEDED if ok else FAILED
+                if not ok:
+                    job.error = engine_status()["last_error"]
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+            if job.status == SUCCEEDED and settings.PRECOMPUTE_AFTER_REFRESH:
+                try:
+                    precompute_recommendations(progress=job.progress)
+                except Exception as e:
+                    # The refresh itself succeeded; requests fall back to online computation
+                    print(f"[RecEngine] Precompute after refresh job {job.id} failed: {e}")
+            job.finished_at = time.time()
+            print(f"[RecEngine] Refresh job {job.id} {job.status} in {job.to_dict()['duration_ms']}ms")
+            with self._cond:
+                self._running = None
+                self._last = job
+
+    def get_job(self, job_id: str) -> Optional[RefreshJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "running": self._running.to_dict() if self._running else None,
+                "queued": self._pending.to_dict() if self._pending else None,
+                "last": self._last.to_dict() if self._last else None,
+                "refresh_seconds": settings.ENGINE_REFRESH_SECONDS,
+                "min_interval_seconds": settings.ENGINE_REFRESH_MIN_INTERVAL_SECONDS,
+            }
+
+    def recent_jobs(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [job.to_dict() for job in reversed(self._jobs.values())]
+
+
+refresh_scheduler = RefreshScheduler()
@@ -6,7 +6,7 @@ from typing import Optional
 from datetime import datetime, timedelta
 
 from models import UserSignup, UserLogin, AuthResponse, UserResponse
-from database import get_supabase
+from database import execute, get_async_supabase
 from utils.security import hash_password, verify_password, create_access_token, generate_session_token
 
 router = APIRouter()
@@ -15,13 +15,13 @@ router = APIRouter()
 async def signup(user_data: UserSignup):
     """Register a new user"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database not available")
         
         # Check if user already exists
         try:
-            existing = supabase.table("users").select("id").eq("email", user_data.email).execute()
+            existing = await execute(supabase.table("users").select("id").eq("email", user_data.email))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
         
@@ -33,11 +33,11 @@ async def signup(user_data: UserSignup):
         
         # Create user in database
         try:
-            result = supabase.table("users").insert({
+            result = await execute(supabase.table("users").insert({
                 "email": user_data.email,
                 "password_hash": password_hash,
                 "name": user_data.name
-            }).execute()
+            }))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
         
@@ -53,11 +53,11 @@ async def signup(user_data: UserSignup):
         # Store session in database
         expires_at = datetime.utcnow() + timedelta(days=7)
         try:
-            supabase.table("sessions").insert({
+            await execute(supabase.table("sessions").insert({
                 "user_id": user["id"],
                 "token": session_token,
                 "expires_at": expires_at.isoformat()
-            }).execute()
+            }))
         except Exception as e:
             print(f"[Auth] Warning: Failed to create session: {str(e)}")
         
@@ -80,13 +80,13 @@ async def signup(user_data: UserSignup):
 async def login(credentials: UserLogin):
     """Login with email and password"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database not available")
         
         # Find user by email
         try:
-            result = supabase.table("users").select("*").eq("email", credentials.email).execute()
+            result = await execute(supabase.table("users").select("*").eq("email", credentials.email))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
         
@@ -106,11 +106,11 @@ async def login(credentials: UserLogin):
         # Store session
         expires_at = datetime.utcnow() + timedelta(days=7)
         try:
-            supabase.table("sessions").insert({
+            await execute(supabase.table("sessions").insert({
                 "user_id": user["id"],
                 "token": session_token,
                 "expires_at": expires_at.isoformat()
-            }).execute()
+            }))
         except Exception as e:
             print(f"[Auth] Warning: Failed to create session: {str(e)}")
         
@@ -132,12 +132,12 @@ async def login(credentials: UserLogin):
 @router.post("/logout")
 async def logout(authorization: Optional[str] = Header(None)):
     """Logout and invalidate session"""
-    supabase = get_supabase()
+    supabase = await get_async_supabase()
     if supabase and authorization and authorization.startswith("Bearer "):
         token = authorization.split(" ")[1]
         try:
             # Delete session from database
-            supabase.table("sessions").delete().eq("token", token).execute()
+            await execute(supabase.table("sessions").delete().eq("token", token))
         except Exception as e:
             print(f"[Auth] Warning: Failed to delete session: {str(e)}")
     
@@ -157,13 +157,13 @@ async def get_current_user(authorization: Optional[str] = Header(None)):
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     
-    supabase = get_supabase()
+    supabase = await get_async_supabase()
     if not supabase:
         raise HTTPException(status_code=503, detail="Database not available")
     
     # Get user from database
     try:
-        result = supabase.table("users").select("id, email, name").eq("id", payload["sub"]).execute()
+        result = await execute(supabase.table("users").select("id, email, name").eq("id", payload["sub"]))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     
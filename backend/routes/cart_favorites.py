@@ -6,7 +6,8 @@ from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
-from database import get_supabase
+from database import execute, get_async_supabase
+from rec_engine.rerank_cache import invalidate_user_async
 from utils.security import get_current_user
 from models import User
 
@@ -47,14 +48,14 @@ class ActivityLogResponse(BaseModel):
 async def get_cart(current_user: User = Depends(get_current_user)):
     """Get all items in user's cart with product details"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
         # Fetch cart items with product details
-        result = supabase.table("cart_items").select(
+        result = await execute(supabase.table("cart_items").select(
             "*, products(*)"
-        ).eq("user_id", current_user.id).execute()
+        ).eq("user_id", current_user.id))
         
         return {"cart_items": result.data or [], "total_items": len(result.data or [])}
     
@@ -70,21 +71,21 @@ async def add_to_cart(
 ):
     """Add item to cart or update quantity if already exists"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
         # Check if item already exists in cart
-        existing = supabase.table("cart_items").select("*").eq(
+        existing = await execute(supabase.table("cart_items").select("*").eq(
             "user_id", current_user.id
-        ).eq("product_id", request.product_id).execute()
+        ).eq("product_id", request.product_id))
         
         if existing.data:
             # Update existing item
             new_quantity = existing.data[0]["quantity"] + request.quantity
-            result = supabase.table("cart_items").update({
+            result = await execute(supabase.table("cart_items").update({
                 "quantity": new_quantity
-            }).eq("id", existing.data[0]["id"]).execute()
+            }).eq("id", existing.data[0]["id"]))
             
             # Log activity in background (non-blocking)
             background_tasks.add_task(
@@ -98,11 +99,11 @@ async def add_to_cart(
             return {"message": "Cart updated", "item": result.data[0]}
         else:
             # Insert new item
-            result = supabase.table("cart_items").insert({
+            result = await execute(supabase.table("cart_items").insert({
                 "user_id": current_user.id,
                 "product_id": request.product_id,
                 "quantity": request.quantity
-            }).execute()
+            }))
             
             # Log activity in background (non-blocking)
             background_tasks.add_task(
@@ -121,30 +122,32 @@ async def add_to_cart(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to add to cart: {str(e)}")
 
-def _log_cart_activity(user_id: str, product_id: str, action: str, quantity: int):
+async def _log_cart_activity(user_id: str, product_id: str, action: str, quantity: int):
     """Helper function to log cart activity in background"""
+    await invalidate_user_async(user_id)
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if supabase:
-            supabase.table("cart_activity_log").insert({
+            await execute(supabase.table("cart_activity_log").insert({
                 "user_id": user_id,
                 "product_id": product_id,
                 "action": action,
                 "quantity": quantity
-            }).execute()
+            }))
     except Exception as e:
         print(f"[Cart] Failed to log activity: {str(e)}")
 
-def _log_favorite_activity(user_id: str, product_id: str, action: str):
+async def _log_favorite_activity(user_id: str, product_id: str, action: str):
     """Helper function to log favorite activity in background"""
+    await invalidate_user_async(user_id)
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if supabase:
-            supabase.table("favorites_activity_log").insert({
+            await execute(supabase.table("favorites_activity_log").insert({
                 "user_id": user_id,
                 "product_id": product_id,
                 "action": action
-            }).execute()
+            }))
     except Exception as e:
         print(f"[Favorites] Failed to log activity: {str(e)}")
 
@@ -156,7 +159,7 @@ async def update_cart_quantity(
 ):
     """Update quantity of a cart item"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
@@ -164,20 +167,21 @@ async def update_cart_quantity(
             raise HTTPException(status_code=400, detail="Quantity must be positive")
         
         # Update cart item
-        result = supabase.table("cart_items").update({
+        result = await execute(supabase.table("cart_items").update({
             "quantity": request.quantity
-        }).eq("user_id", current_user.id).eq("product_id", product_id).execute()
+        }).eq("user_id", current_user.id).eq("product_id", product_id))
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Cart item not found")
         
         # Log activity
-        supabase.table("cart_activity_log").insert({
+        await invalidate_user_async(current_user.id)
+        await execute(supabase.table("cart_activity_log").insert({
             "user_id": current_user.id,
             "product_id": product_id,
             "action": "quantity_updated",
             "quantity": request.quantity
-        }).execute()
+        }))
         
         return {"message": "Quantity updated", "item": result.data[0]}
     
@@ -194,24 +198,25 @@ async def remove_from_cart(
 ):
     """Remove item from cart"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
         # Delete cart item
-        result = supabase.table("cart_items").delete().eq(
+        result = await execute(supabase.table("cart_items").delete().eq(
             "user_id", current_user.id
-        ).eq("product_id", product_id).execute()
+        ).eq("product_id", product_id))
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Cart item not found")
         
         # Log activity
-        supabase.table("cart_activity_log").insert({
+        await invalidate_user_async(current_user.id)
+        await execute(supabase.table("cart_activity_log").insert({
             "user_id": current_user.id,
             "product_id": product_id,
             "action": "removed"
-        }).execute()
+        }))
         
         return {"message": "Item removed from cart"}
     
@@ -225,12 +230,12 @@ async def remove_from_cart(
 async def clear_cart(current_user: User = Depends(get_current_user)):
     """Clear all items from cart"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
         # Delete all cart items for user
-        result = supabase.table("cart_items").delete().eq("user_id", current_user.id).execute()
+        result = await execute(supabase.table("cart_items").delete().eq("user_id", current_user.id))
         
         return {"message": "Cart cleared", "items_removed": len(result.data or [])}
     
@@ -242,13 +247,13 @@ async def clear_cart(current_user: User = Depends(get_current_user)):
 async def get_cart_activity(current_user: User = Depends(get_current_user)):
     """Get cart activity history for user"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
-        result = supabase.table("cart_activity_log").select(
+        result = await execute(supabase.table("cart_activity_log").select(
             "*, products(name, image)"
-        ).eq("user_id", current_user.id).order("timestamp", desc=True).limit(50).execute()
+        ).eq("user_id", current_user.id).order("timestamp", desc=True).limit(50))
         
         return {"activity": result.data or []}
     
@@ -262,14 +267,14 @@ async def get_cart_activity(current_user: User = Depends(get_current_user)):
 async def get_favorites(current_user: User = Depends(get_current_user)):
     """Get all favorite items with product details"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
         # Fetch favorites with product details
-        result = supabase.table("favorites").select(
+        result = await execute(supabase.table("favorites").select(
             "*, products(*)"
-        ).eq("user_id", current_user.id).order("added_at", desc=True).execute()
+        ).eq("user_id", current_user.id).order("added_at", desc=True))
         
         return {"favorites": result.data or [], "total": len(result.data or [])}
     
@@ -285,23 +290,23 @@ async def add_to_favorites(
 ):
     """Add item to favorites"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
         # Check if already favorited
-        existing = supabase.table("favorites").select("*").eq(
+        existing = await execute(supabase.table("favorites").select("*").eq(
             "user_id", current_user.id
-        ).eq("product_id", product_id).execute()
+        ).eq("product_id", product_id))
         
         if existing.data:
             return {"message": "Item already in favorites", "favorite": existing.data[0]}
         
         # Insert new favorite
-        result = supabase.table("favorites").insert({
+        result = await execute(supabase.table("favorites").insert({
             "user_id": current_user.id,
             "product_id": product_id
-        }).execute()
+        }))
         
         # Log activity in background (non-blocking)
         background_tasks.add_task(
@@ -327,14 +332,14 @@ async def remove_from_favorites(
 ):
     """Remove item from favorites"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
         # Delete favorite
-        result = supabase.table("favorites").delete().eq(
+        result = await execute(supabase.table("favorites").delete().eq(
             "user_id", current_user.id
-        ).eq("product_id", product_id).execute()
+        ).eq("product_id", product_id))
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Favorite not found")
@@ -361,13 +366,13 @@ async def remove_from_favorites(
 async def get_favorites_activity(current_user: User = Depends(get_current_user)):
     """Get favorites activity history for user"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
-        result = supabase.table("favorites_activity_log").select(
+        result = await execute(supabase.table("favorites_activity_log").select(
             "*, products(name, image)"
-        ).eq("user_id", current_user.id).order("timestamp", desc=True).limit(50).execute()
+        ).eq("user_id", current_user.id).order("timestamp", desc=True).limit(50))
         
         return {"activity": result.data or []}
     
@@ -382,13 +387,13 @@ async def check_if_favorited(
 ):
     """Check if a product is in user's favorites"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
-        result = supabase.table("favorites").select("id").eq(
+        result = await execute(supabase.table("favorites").select("id").eq(
             "user_id", current_user.id
-        ).eq("product_id", product_id).execute()
+        ).eq("product_id", product_id))
         
         return {"is_favorited": len(result.data or []) > 0}
     
@@ -6,7 +6,7 @@ from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 
-from database import get_supabase
+from database import execute, get_async_supabase
 from utils.security import verify_token
 
 
@@ -46,7 +46,7 @@ async def log_order_event(
     - 'order_placed' when the user places an order
     """
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
         if not supabase:
             raise HTTPException(status_code=503, detail="Database not available")
 
@@ -76,7 +76,7 @@ async def log_order_event(
             data["order_id"] = event.order_id
 
         try:
-            result = supabase.table("order_events").insert(data).execute()
+            result = await execute(supabase.table("order_events").insert(data))
         except Exception as e:
             print(f"[OrderEvents] Error inserting order event: {str(e)}")
             raise HTTPException(status_code=500, detail="Failed to log order event")
@@ -1,11 +1,61 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional, Set
 from pydantic import BaseModel
+import asyncio
+import json
+import time
+import uuid
 
-from rec_engine.engine import recommend_for_user_hybrid, refresh_engine_data
+from config import settings
+from rec_engine.engine import (
+    POPULARITY_FALLBACK_REASON,
+    final_recommendations,
+    prepare_rerank,
+    rank_with_llm_scores,
+    recommend_for_user_cf,
+    recommend_for_user_hybrid,
+)
+from rec_engine.precompute import precompute_stats, precomputed_recommendations
+from rec_engine.rerank_cache import get_rerank, rerank_cache, rerank_cache_stats, user_epoch_async
+from rec_engine.reranker import reranker
+from rec_engine.scheduler import refresh_scheduler
+from utils.cache_backends import create_cache
+from utils.executor import BoundedExecutor, ExecutorSaturated
+from utils.response_cache import cached_route
 
 router = APIRouter()
 
+# The engine blocks (pandas, CF scoring, the Mistral call), so it runs on its
+# own threads, sized apart from the pool the rest of the app shares
+recommendation_executor = BoundedExecutor(
+    "recommendations",
+    workers=settings.RECOMMENDATION_WORKERS,
+    queue_limit=settings.RECOMMENDATION_QUEUE_LIMIT,
+)
+
+# Two-phase recommendations: GET .../instant answers in CF order and hands out
+# a ticket; the LLM rerank for it runs in the background and is collected from
+# GET /recommendations/tickets/{ticket} or its /events stream
+RERANK_PENDING = "pending"
+RERANK_READY = "ready"
+RERANK_FAILED = "failed"
+# Interval at which the event stream checks its ticket, and sends a keep-alive comment
+TICKET_POLL_SECONDS = 0.2
+TICKET_KEEPALIVE_SECONDS = 15
+# The event stream gives up this long after MISTRAL_TIMEOUT_SECONDS, counted
+# from the ticket's creation: room for the executor queue and prepare_rerank
+TICKET_TIMEOUT_MARGIN_SECONDS = 10
+
+rerank_tickets = create_cache(
+    "rerank-ticket",
+    maxsize=settings.RERANK_CACHE_SIZE,
+    ttl=settings.RERANK_TICKET_TTL_SECONDS,
+)
+# Strong references, so pending reranks are not garbage collected mid-flight
+_rerank_tasks: Set[asyncio.Task] = set()
+
 class RecommendationResponse(BaseModel):
     id: str
     name: Optional[str] = None
@@ -19,51 +69,144 @@ class RecommendationResponse(BaseModel):
     ratings: Optional[str] = None
     reason: Optional[str] = None
     match_score: float
+    # Ranked without the LLM because it missed its deadline; a later request may rank better
+    provisional: bool = False
+
+def format_recommendations(recs: List[dict]) -> List[RecommendationResponse]:
+    """Deduplicate engine output and shape it into response cards"""
+    # Deduplicate by product_id as a safety measure
+    seen_ids = set()
+    unique_recs = []
+    for r in recs:
+        product_id = str(r.get("product_id", ""))
+        if product_id and product_id not in seen_ids:
+            seen_ids.add(product_id)
+            unique_recs.append(r)
+    
+    print(f"[API] Deduplicated to {len(unique_recs)} unique recommendations")
+    
+    results = []
+    for r in unique_recs:
+        try:
+            results.append(RecommendationResponse(
+                id=str(r.get("product_id", "")),
+                name=r.get("name") or "",
+                brand=r.get("brand"),
+                main_category=r.get("main_category"),
+                sub_category=r.get("sub_category"),
+                image=r.get("image") or "",
+                discount_price=r.get("discount_price"),
+                actual_price=r.get("actual_price"),
+                ratings=r.get("ratings"),
+                reason=r.get("reason"),
+                match_score=float(r.get("final_score", 0.0)),
+                provisional=bool(r.get("provisional", False))
+            ))
+        except Exception as item_error:
+            print(f"[API] Error formatting recommendation item: {item_error}")
+            print(f"[API] Item data: {r}")
+            continue  # Skip this item and continue with others
+    
+    return results
+
+def personalised(results: List[RecommendationResponse]) -> bool:
+    """
+    Whether results are worth caching: empty lists are the error fallback,
+    popularity picks only stand in while the engine loads, and provisional
+    results are replaced once the late LLM rerank is cached
+    """
+    return bool(results) and results[0].reason != POPULARITY_FALLBACK_REASON and not results[0].provisional
+
+async def user_version(arguments: Dict[str, Any]) -> int:
+    """Response-cache key part for per-user routes: changes when invalidate_user is called for the user"""
+    user_id = arguments.get("user_id")
+    return await user_epoch_async(user_id) if user_id else 0
+
+class InstantRecommendationResponse(BaseModel):
+    user_id: str
+    recommendations: List[RecommendationResponse]
+    # "pending" while a rerank for `ticket` runs; "final" when none will follow
+    status: str
+    ticket: Optional[str] = None
+    took_ms: float
+
+class RerankTicketResponse(BaseModel):
+    ticket: str
+    status: str  # pending, ready or failed
+    recommendations: List[RecommendationResponse] = []
+    # Time the second phase took, once settled
+    rerank_ms: Optional[float] = None
+
+async def _update_ticket(ticket: str, **changes):
+    state = await rerank_tickets.get_async(ticket)
+    if state is not None:
+        await rerank_tickets.set_async(ticket, {**state, **changes})
+
+async def _rerank_ticket(ticket: str, user_id: str, candidates: list, is_fallback: bool):
+    """Second phase: build the profile and run (or reuse) the LLM rerank for a ticket"""
+    started = time.time()
+    changes: Dict[str, Any] = {"status": RERANK_FAILED}
+    try:
+        cache_key, profile, payload = await recommendation_executor.run(
+            prepare_rerank, user_id, candidates, is_fallback
+        )
+        llm_map = await asyncio.to_thread(get_rerank, cache_key)
+        if llm_map is None:
+            llm_map = await asyncio.wrap_future(reranker.submit(cache_key, profile, payload))
+        changes = {"cache_key": cache_key, "status": RERANK_READY if llm_map else RERANK_FAILED}
+    except Exception as e:
+        print(f"[API] Rerank for ticket {ticket} failed: {e}")
+    elapsed_ms = (time.time() - started) * 1000
+    reranker.record_end_to_end(elapsed_ms)
+    await _update_ticket(ticket, rerank_ms=round(elapsed_ms, 1), **changes)
+    print(f"[API] Rerank for ticket {ticket} {changes['status']} in {elapsed_ms:.0f}ms")
+
+async def _ticket_response(ticket: str, state: Dict[str, Any]) -> RerankTicketResponse:
+    status = state["status"]
+    if status == RERANK_PENDING:
+        return RerankTicketResponse(ticket=ticket, status=status)
+    llm_map = await rerank_cache.get_async(state["cache_key"]) if status == RERANK_READY else None
+    if not llm_map:
+        # Failed, or the scores expired from the rerank cache: CF order with metadata reasons
+        status, llm_map = RERANK_FAILED, {}
+    recs = final_recommendations(rank_with_llm_scores(state["candidates"], llm_map), state["limit"])
+    return RerankTicketResponse(
+        ticket=ticket,
+        status=status,
+        recommendations=format_recommendations(recs),
+        rerank_ms=state.get("rerank_ms"),
+    )
 
 @router.get("/recommendations/user/{user_id}", response_model=List[RecommendationResponse])
+@cached_route(
+    "recommendations.user",
+    ttl=settings.RECOMMENDATIONS_RESPONSE_TTL_SECONDS,
+    should_cache=personalised,
+    vary=user_version,
+)
 async def get_user_recommendations(user_id: str, limit: int = 10):
     """
-    Get hybrid recommendations for a user.
+    Get hybrid recommendations for a user: the precomputed list when the
+    batch job covered them, otherwise computed now (from the precomputed
+    candidates, if any).
     """
     try:
         print(f"[API] Getting recommendations for user: {user_id}, limit: {limit}")
-        recs = recommend_for_user_hybrid(user_id, top_k=limit)
-        print(f"[API] Engine returned {len(recs)} recommendations")
-        
-        # Deduplicate by product_id as a safety measure
-        seen_ids = set()
-        unique_recs = []
-        for r in recs:
-            product_id = str(r.get("product_id", ""))
-            if product_id and product_id not in seen_ids:
-                seen_ids.add(product_id)
-                unique_recs.append(r)
-        
-        print(f"[API] Deduplicated to {len(unique_recs)} unique recommendations")
+        recs, candidates = await asyncio.to_thread(precomputed_recommendations, user_id, limit)
+        if recs is None:
+            recs = await recommendation_executor.run(
+                recommend_for_user_hybrid, user_id, top_k=limit, candidates=candidates
+            )
+            print(f"[API] Engine returned {len(recs)} recommendations")
+        else:
+            print(f"[API] Serving {len(recs)} precomputed recommendations")
         
-        results = []
-        for r in unique_recs:
-            try:
-                results.append(RecommendationResponse(
-                    id=str(r.get("product_id", "")),
-                    name=r.get("name") or "",
-                    brand=r.get("brand"),
-                    main_category=r.get("main_category"),
-                    sub_category=r.get("sub_category"),
-                    image=r.get("image") or "",
-                    discount_price=r.get("discount_price"),
-                    actual_price=r.get("actual_price"),
-                    ratings=r.get("ratings"),
-                    reason=r.get("reason"),
-                    match_score=float(r.get("final_score", 0.0))
-                ))
-            except Exception as item_error:
-                print(f"[API] Error formatting recommendation item: {item_error}")
-                print(f"[API] Item data: {r}")
-                continue  # Skip this item and continue with others
+        results = format_recommendations(recs)
         
         print(f"[API] Returning {len(results)} formatted recommendations")
         return results
+    except ExecutorSaturated:
+        raise HTTPException(status_code=503, detail="Recommendation service busy", headers={"Retry-After": "1"})
     except Exception as e:
         import traceback
         print(f"[API] Rec Error: {e}")
@@ -71,10 +214,133 @@ async def get_user_recommendations(user_id: str, limit: int = 10):
         # Return empty list on error to not break frontend
         return []
 
-@router.post("/recommendations/refresh")
-async def refresh_recommendations(background_tasks: BackgroundTasks):
+@router.get("/recommendations/user/{user_id}/instant", response_model=InstantRecommendationResponse)
+async def get_instant_recommendations(user_id: str, limit: int = 10):
     """
-    Trigger a refresh of the recommendation engine data.
+    First phase of two-phase recommendations: CF-ranked products straight
+    away, plus a ticket for the LLM-reranked order and reasons when a rerank
+    will follow. Collect it from /recommendations/tickets/{ticket} (poll) or
+    /recommendations/tickets/{ticket}/events (Server-Sent Events).
     """
-    background_tasks.add_task(refresh_engine_data)
-    return {"status": "refresh_started"}
+    started = time.time()
+    precomputed, candidates = await asyncio.to_thread(precomputed_recommendations, user_id, limit)
+    if precomputed is not None:
+        return InstantRecommendationResponse(
+            user_id=user_id,
+            recommendations=format_recommendations(precomputed),
+            status="final",
+            took_ms=round((time.time() - started) * 1000, 1),
+        )
+    try:
+        recs, candidates, is_fallback = await recommendation_executor.run(
+            recommend_for_user_cf, user_id, top_k=limit, candidates=candidates
+        )
+    except ExecutorSaturated:
+        raise HTTPException(status_code=503, detail="Recommendation service busy", headers={"Retry-After": "1"})
+
+    ticket = None
+    if reranker.enabled and candidates:
+        ticket = uuid.uuid4().hex
+        await rerank_tickets.set_async(ticket, {
+            "user_id": user_id,
+            "limit": limit,
+            "candidates": candidates,
+            "cache_key": None,
+            "status": RERANK_PENDING,
+            "created_at": time.time(),
+        })
+        task = asyncio.create_task(_rerank_ticket(ticket, user_id, candidates, is_fallback))
+        _rerank_tasks.add(task)
+        task.add_done_callback(_rerank_tasks.discard)
+
+    return InstantRecommendationResponse(
+        user_id=user_id,
+        recommendations=format_recommendations(recs),
+        status=RERANK_PENDING if ticket else "final",
+        ticket=ticket,
+        took_ms=round((time.time() - started) * 1000, 1),
+    )
+
+@router.get("/recommendations/tickets/{ticket}", response_model=RerankTicketResponse)
+async def get_rerank_ticket(ticket: str):
+    """Second phase, by polling: pending, or the reranked recommendations for a ticket"""
+    state = await rerank_tickets.get_async(ticket)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Rerank ticket not found or expired")
+    return await _ticket_response(ticket, state)
+
+@router.get("/recommendations/tickets/{ticket}/events")
+async def stream_rerank_ticket(ticket: str):
+    """
+    Second phase, as Server-Sent Events: a single `ready` or `failed` event
+    carrying the ticket response once the rerank settles, or `timeout` once
+    the rerank has had MISTRAL_TIMEOUT_SECONDS plus TICKET_TIMEOUT_MARGIN_SECONDS
+    since the ticket was issued. Comments keep the connection alive meanwhile.
+    """
+    state = await rerank_tickets.get_async(ticket)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Rerank ticket not found or expired")
+    deadline = state["created_at"] + settings.MISTRAL_TIMEOUT_SECONDS + TICKET_TIMEOUT_MARGIN_SECONDS
+
+    async def events():
+        keepalive = time.time() + TICKET_KEEPALIVE_SECONDS
+        while True:
+            state = await rerank_tickets.get_async(ticket)
+            if state is None:
+                yield "event: failed\ndata: {\"detail\": \"Rerank ticket expired\"}\n\n"
+                return
+            if state["status"] != RERANK_PENDING:
+                response = await _ticket_response(ticket, state)
+                data = json.dumps(jsonable_encoder(response))
+                yield f"event: {response.status}\ndata: {data}\n\n"
+                return
+            if time.time() >= deadline:
+                yield f"event: timeout\ndata: {json.dumps({'ticket': ticket})}\n\n"
+                return
+            if time.time() >= keepalive:
+                keepalive = time.time() + TICKET_KEEPALIVE_SECONDS
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(TICKET_POLL_SECONDS)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/recommendations/stats")
+async def get_recommendation_executor_stats():
+    """Queue depth, rejections and wait/run time percentiles of the recommendation pool"""
+    return recommendation_executor.stats()
+
+@router.get("/recommendations/rerank/stats")
+async def get_rerank_cache_stats():
+    """Hit rate of the LLM rerank cache and the LLM time it saved, and deadline misses of the LLM calls"""
+    return {**rerank_cache_stats(), "llm": reranker.stats()}
+
+@router.get("/recommendations/precompute/stats")
+async def get_precompute_stats():
+    """Users covered by the batch precomputation, how often requests were served from it, and its last run"""
+    return precompute_stats()
+
+@router.post("/recommendations/refresh", status_code=202)
+async def refresh_recommendations():
+    """
+    Request a refresh of the recommendation engine data. Requests that overlap
+    a queued refresh share it, and runs are spaced by the scheduler's minimum
+    interval; poll the returned job id for progress.
+    """
+    return refresh_scheduler.trigger("api").to_dict()
+
+@router.get("/recommendations/refresh")
+async def get_refresh_status():
+    """Running, queued and last refresh jobs, and recent job history"""
+    return {**refresh_scheduler.status(), "jobs": refresh_scheduler.recent_jobs()}
+
+@router.get("/recommendations/refresh/{job_id}")
+async def get_refresh_job(job_id: str):
+    """Status, duration, per-step timings and row counts of one refresh job"""
+    job = refresh_scheduler.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Refresh job not found")
+    return job.to_dict()
@@ -0,0 +1,112 @@
+"""
+Product search routes backed by the in-memory catalog indexes
+"""
+import time
+from fastapi import APIRouter, Query
+from typing import Optional
+
+from models import SearchResponse, SemanticSearchHit, SemanticSearchResponse
+from products import to_product
+from catalog.snapshot import get_catalog
+from catalog.search import get_search_index
+from vectors.store import get_embedding_matrix
+from vectors.semantic import batcher
+
+router = APIRouter()
+
+
+@router.get("/search", response_model=SearchResponse)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    category: Optional[str] = None,
+    sub_category: Optional[str] = None,
+    brand: Optional[str] = None,
+):
+    """
+    Keyword search over product name, brand and categories, ranked with BM25.
+    Accepts the same category/sub_category/brand filters as the product listing.
+    """
+    started = time.perf_counter()
+    index = get_search_index()
+    if index is None:
+        return SearchResponse(query=q, products=[], total=0, page=page, limit=limit, took_ms=0.0)
+
+    mask = index.facets.mask({"category": category, "sub_category": sub_category, "brand": brand})
+    hits, total = index.search(q, mask=mask, offset=(page - 1) * limit, limit=limit)
+    rows = index.snapshot.rows
+
+    return SearchResponse(
+        query=q,
+        products=[to_product(rows[ordinal]) for ordinal, _ in hits],
+        total=total,
+        page=page,
+        limit=limit,
+        took_ms=round((time.perf_counter() - started) * 1000, 3),
+    )
+
+
+@router.get("/search/semantic", response_model=SemanticSearchResponse)
+async def semantic_search(
+    q: str = Query(..., min_length=1, max_length=200),
+    k: int = Query(20, ge=1, le=100),
+    category: Optional[str] = None,
+    sub_category: Optional[str] = None,
+    brand: Optional[str] = None,
+):
+    """
+    Top-k products by cosine similarity between the query and product embeddings.
+    Accepts the same category/sub_category/brand filters as keyword search.
+    """
+    started = time.perf_counter()
+    matrix = get_embedding_matrix()
+    snapshot = get_catalog()
+    facets = snapshot.indexes.get("facets") if snapshot else None
+    if matrix is None or facets is None:
+        return SemanticSearchResponse(query=q, results=[], took_ms=0.0)
+
+    catalog_mask = facets.mask({"category": category, "sub_category": sub_category, "brand": brand})
+    rows_mask = matrix.rows_mask(snapshot, catalog_mask)
+    hits = await batcher.search(matrix, q, k, rows_mask)
+
+    results = []
+    for product_id, score in hits:
+        ordinal = snapshot.id_to_ordinal.get(product_id)
+        if ordinal is None:
+            continue
+        results.append(SemanticSearchHit(product=to_product(snapshot.rows[ordinal]), score=round(score, 5)))
+
+    return SemanticSearchResponse(
+        query=q,
+        results=results,
+        took_ms=round((time.perf_counter() - started) * 1000, 3),
+    )
+
+
+@router.get("/search/autocomplete")
+async def autocomplete(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20),
+):
+    """Query completions for the search box, tolerant of a single typo in the last word"""
+    index = get_search_index()
+    if index is None:
+        return {"query": q, "suggestions": []}
+    return {"query": q, "suggestions": index.autocomplete(q, limit)}
+
+
+@router.get("/search/stats")
+async def search_index_stats():
+    """Size and build time of the search indexes, and semantic batching metrics"""
+    index = get_search_index()
+    matrix = get_embedding_matrix()
+    return {
+        "keyword": {"ready": True, **index.stats()} if index else {"ready": False},
+        "semantic": {
+            "ready": matrix is not None,
+            "embeddings": len(matrix) if matrix else 0,
+            "matrix_bytes": matrix.nbytes if matrix else 0,
+            **batcher.stats(),
+        },
+    }
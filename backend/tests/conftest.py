@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENGINE_GLOBALS = (
+    "interactions_df", "products_df", "product_meta", "user_item_matrix", "item_sim_matrix",
+    "user_id_to_idx", "idx_to_user_id", "product_id_to_idx", "idx_to_product_id",
+    "user_last_active", "_engine_state", "_engine_loaded_at",
+)
+
+
+@pytest.fixture
+def loaded_engine():
+    """rec_engine.engine loaded with a small synthetic catalog and interaction log"""
+    from rec_engine import engine
+
+    saved = {name: getattr(engine, name) for name in ENGINE_GLOBALS}
+    rng = np.random.default_rng(0)
+    users = [f"u{i}" for i in range(200)]
+    items = [f"p{i}" for i in range(150)]
+    df = pd.DataFrame({
+        "user_id": rng.choice(users, 3000),
+        "product_id": [items[int(x) % len(items)] for x in rng.zipf(1.3, 3000)],
+        "interaction_score": rng.choice([1.0, 2.0, 3.0], 3000),
+    })
+    df = df.groupby(["user_id", "product_id"], as_index=False)["interaction_score"].sum()
+
+    engine.interactions_df = df
+    engine.user_id_to_idx = {u: i for i, u in enumerate(df["user_id"].unique())}
+    engine.idx_to_user_id = {i: u for u, i in engine.user_id_to_idx.items()}
+    engine.product_id_to_idx = {p: i for i, p in enumerate(items)}
+    engine.idx_to_product_id = {i: p for p, i in engine.product_id_to_idx.items()}
+    engine.user_item_matrix = csr_matrix(
+        (
+            df["interaction_score"].values,
+            (df["user_id"].map(engine.user_id_to_idx).values, df["product_id"].map(engine.product_id_to_idx).values),
+        ),
+        shape=(len(engine.user_id_to_idx), len(items)),
+    )
+    engine.item_sim_matrix = cosine_similarity(engine.user_item_matrix.T, dense_output=False)
+    engine.product_meta = {
+        p: {
+            "name": p, "main_category": "cat", "buys": int(rng.integers(0, 500)),
+            "add_to_cart": int(rng.integers(0, 50)), "cluster_id": None if i % 5 == 0 else i % 7,
+        }
+        for i, p in enumerate(items)
+    }
+    engine.products_df = pd.DataFrame([
+        {"product_id": p, **meta, "sub_category": "s", "brand": "b"} for p, meta in engine.product_meta.items()
+    ])
+    engine.user_last_active = {u: time.time() for u in engine.user_id_to_idx}
+    engine._engine_state = engine.ENGINE_READY
+    engine._engine_loaded_at = time.time()
+    yield engine
+    for name, value in saved.items():
+        setattr(engine, name, value)
+
+
+@pytest.fixture(scope="session")
+def mistral_stub_server():
+    from devtools.mistral_stub import MistralStub
+
+    stub = MistralStub(port=0).start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def mistral_stub(mistral_stub_server, monkeypatch):
+    """The reranker enabled against devtools.mistral_stub (one server per session, as the client is pooled)"""
+    from config import settings
+
+    mistral_stub_server.latency = 0.0
+    mistral_stub_server.fail = False
+    monkeypatch.setattr(settings, "MISTRAL_API_KEY", "stub")
+    monkeypatch.setattr(settings, "MISTRAL_BASE_URL", mistral_stub_server.url)
+    return mistral_stub_server
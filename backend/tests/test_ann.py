@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from vectors import ann
+from vectors.ann import IVFPQIndex
+from vectors.store import EmbeddingMatrix
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(0)
+    ids = [f"p{i}" for i in range(2000)]
+    return EmbeddingMatrix(ids, rng.normal(size=(len(ids), 32)).astype(np.float32))
+
+
+def test_similar_to_uses_exact_vector_for_unindexed_product(embeddings):
+    index = IVFPQIndex.build(embeddings.ids[:1900], embeddings.matrix[:1900], nlist=16, m=8)
+    assert index.similar_to("p1950", 5) == []
+    hits = index.similar_to("p1950", 5, exact=embeddings)
+    assert len(hits) == 5 and all(pid != "p1950" for pid, _ in hits)
+
+
+def test_added_products_are_searchable(embeddings):
+    index = IVFPQIndex.build(embeddings.ids[:1900], embeddings.matrix[:1900], nlist=16, m=8)
+    grown = index.add(embeddings.ids[1900:], embeddings.matrix[1900:])
+    assert len(grown.ids) == 2000 and len(index.ids) == 1900
+    # Existing rows keep their codes
+    assert np.allclose(grown.reconstruct(7), index.reconstruct(7))
+    hits = grown.search(embeddings.matrix[1950], 1, nprobe=16, exact=embeddings)
+    assert hits[0][0] == "p1950"
+
+
+@pytest.fixture
+def index_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "ann.npz")
+    monkeypatch.setattr(ann.settings, "ANN_INDEX_PATH", path)
+    # Recorded before the load replaces it, so the loaded index does not leak into later tests
+    monkeypatch.setattr(ann, "_index", None)
+    return path
+
+
+def test_load_appends_new_products(embeddings, index_path, monkeypatch):
+    path = index_path
+    IVFPQIndex.build(embeddings.ids[:1950], embeddings.matrix[:1950], nlist=16, m=8).save(path)
+    monkeypatch.setattr(ann, "get_embedding_matrix", lambda: embeddings)
+
+    index = ann.load_or_build_ann_index()
+    assert len(index.ids) == 2000
+    # Persisted, so other workers load the appended index
+    assert len(IVFPQIndex.load(path).ids) == 2000
+    # Appended, not retrained: the centroids are the saved ones
+    assert index.build_seconds == IVFPQIndex.load(path).build_seconds
+
+
+def test_load_reencodes_changed_and_drops_removed_products(embeddings, index_path, monkeypatch):
+    IVFPQIndex.build(embeddings.ids, embeddings.matrix, nlist=16, m=8).save(index_path)
+    vectors = np.array(embeddings.matrix)
+    vectors[5] = vectors[1500]
+    current = EmbeddingMatrix(embeddings.ids[:1990], vectors[:1990])
+    monkeypatch.setattr(ann, "get_embedding_matrix", lambda: current)
+
+    index = ann.load_or_build_ann_index()
+    assert len(index.ids) == 1990 and "p1995" not in index.id_to_row
+    assert np.allclose(index.reconstruct(index.id_to_row["p5"]), index.reconstruct(index.id_to_row["p1500"]))
+    # Up to date now, so the next load changes nothing
+    assert IVFPQIndex.load(index_path).changes(current) == ([], [])
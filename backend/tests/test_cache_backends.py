@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import pytest
+
+from devtools.resp_server import RespServer
+from utils.cache import LRUCache
+from utils.cache_backends import FileCacheBackend, RedisCacheBackend, SharedCacheBackend
+
+
+@pytest.fixture(scope="module")
+def resp_server():
+    server = RespServer(port=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(params=["memory", "file", "redis"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        backend = LRUCache(maxsize=100, ttl=60)
+    elif request.param == "file":
+        backend = FileCacheBackend("test", str(tmp_path), maxsize=100, ttl=60)
+    else:
+        backend = RedisCacheBackend("test", request.getfixturevalue("resp_server").url, ttl=60)
+    yield backend
+    backend.clear()
+
+
+def test_get_set_delete(cache):
+    assert cache.get("a") is None
+    assert cache.get("a", "default") == "default"
+    cache.set("a", {"ids": ["p1", "p2"], "scores": [0.5, 0.25]})
+    assert cache.get("a") == {"ids": ["p1", "p2"], "scores": [0.5, 0.25]}
+    cache.delete("a")
+    assert cache.get("a") is None
+
+
+def test_batch_operations(cache):
+    cache.set_many({"a": 1, ("route", ("limit", 10)): [2] * 1000})
+    found, missing = cache.get_many(["a", ("route", ("limit", 10)), "b"])
+    assert found == {"a": 1, ("route", ("limit", 10)): [2] * 1000}
+    assert missing == ["b"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+def test_per_call_ttl(cache):
+    cache.set("short", 1, ttl=0.05)
+    cache.set("long", 2)
+    time.sleep(0.1)
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+
+
+def test_clear(cache):
+    cache.set_many({f"k{i}": i for i in range(10)})
+    cache.clear()
+    found, missing = cache.get_many([f"k{i}" for i in range(10)])
+    assert not found and len(missing) == 10
+
+
+def test_redis_namespaces_do_not_collide(resp_server):
+    first = RedisCacheBackend("one", resp_server.url)
+    second = RedisCacheBackend("two", resp_server.url)
+    first.set("k", 1)
+    second.set("k", 2)
+    second.clear()
+    assert (first.get("k"), second.get("k")) == (1, None)
+    first.clear()
+
+
+def test_unreachable_redis_is_a_miss():
+    backend = RedisCacheBackend("test", "redis://127.0.0.1:1/0", timeout=0.1)
+    backend.set("k", 1)
+    assert backend.get("k") is None
+    assert backend.errors == 2
+
+
+def test_shared_backend_requires_batch_operations():
+    class Incomplete(SharedCacheBackend):
+        def get_many(self, keys):
+            return {}, list(keys)
+
+    with pytest.raises(TypeError):
+        Incomplete("test")
+
+
+def test_async_methods(cache):
+    async def roundtrip():
+        await cache.set_async("a", 1)
+        await cache.set_many_async({"b": 2, "c": 3})
+        found, missing = await cache.get_many_async(["a", "b", "x"])
+        value = await cache.get_async("c")
+        await cache.delete_async("c")
+        return found, missing, value, await cache.get_async("c", "gone")
+
+    assert asyncio.run(roundtrip()) == ({"a": 1, "b": 2}, ["x"], 3, "gone")
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "background maintenance did not finish"
+        time.sleep(0.01)
+
+
+def test_file_eviction_runs_in_background(tmp_path):
+    backend = FileCacheBackend("test", str(tmp_path), maxsize=20, ttl=60)
+    backend.set_many({f"k{i}": i for i in range(50)})
+    wait_for(lambda: not backend._maintaining)
+    assert len(backend._files()) == 20
+    assert backend.size() == 20
+
+
+@pytest.mark.parametrize("kind", ["file", "redis"])
+def test_size_is_counted_in_background(kind, tmp_path, request):
+    if kind == "file":
+        backend = FileCacheBackend("test", str(tmp_path), maxsize=100, ttl=60)
+    else:
+        backend = RedisCacheBackend("test", request.getfixturevalue("resp_server").url, ttl=60)
+    backend.set_many({f"k{i}": i for i in range(5)})
+    # The first call only schedules the count
+    assert backend.size() is None
+    wait_for(lambda: backend.size() == 5)
+    backend.clear()
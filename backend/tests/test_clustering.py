@@ -0,0 +1,67 @@
+import numpy as np
+
+import database
+from vectors import clustering
+from vectors.quantized import write_store
+
+SOURCE = {"count": 2, "latest_update": "2026-10-01T12:00:00+00:00"}
+
+
+class Client:
+    """Records the cluster id rows written; `clustered` are the products that have a cluster_id"""
+
+    def __init__(self, clustered):
+        self.clustered = clustered
+        self.written = []
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        return self
+
+    @property
+    def not_(self):
+        return self
+
+    def is_(self, column, value):
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, stop):
+        self.page = self.clustered[start:stop + 1]
+        return self
+
+    def rpc(self, name, params):
+        if name == "bulk_update_cluster_ids":
+            self.written.extend(params["rows"])
+        self.page = len(params.get("rows", []))
+        return self
+
+    def execute(self):
+        rows = self.page if isinstance(self.page, int) else [{"id": pid} for pid in self.page]
+        return type("Response", (), {"data": rows})()
+
+
+def test_assignments_start_at_one_and_clear_products_not_in_store(monkeypatch):
+    client = Client(["a", "gone"])
+    monkeypatch.setattr(database, "get_supabase", lambda: client)
+    clustering.write_assignments(["a", "b"], np.array([0, 4]))
+    assert {row["id"]: row["cluster_id"] for row in client.written} == {"a": 1, "b": 5, "gone": None}
+
+
+def test_stale_store_is_reexported(tmp_path, monkeypatch):
+    directory = str(tmp_path / "store")
+    write_store(directory, iter([(["a", "b"], np.eye(2, 8, dtype=np.float32))]), "int8", SOURCE)
+    exports = []
+    monkeypatch.setattr(clustering, "export", lambda d, dtype: exports.append(d))
+
+    monkeypatch.setattr(clustering, "source_state", lambda: dict(SOURCE))
+    clustering.ensure_current_store(directory)
+    assert exports == []
+
+    monkeypatch.setattr(clustering, "source_state", lambda: {**SOURCE, "count": 3})
+    clustering.ensure_current_store(directory)
+    assert exports == [directory]
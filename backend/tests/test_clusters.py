@@ -0,0 +1,40 @@
+import main
+from catalog.clusters import ClusterIndex
+from catalog.snapshot import CatalogSnapshot
+
+ROWS = [{"id": f"p{i:04d}", "cluster_id": i % 3 + 1} for i in range(2500)]
+
+
+class Client:
+    """Serves `products` filtered by cluster_id, in id order, capped at 1000 rows per request like PostgREST"""
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.rows = [{"id": row["id"]} for row in ROWS if row["cluster_id"] == value]
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, stop):
+        self.page = self.rows[start:min(stop + 1, start + 1000)]
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": self.page})()
+
+
+def test_cold_fallback_pages_in_the_index_order():
+    index = ClusterIndex(CatalogSnapshot(ROWS), meta={})
+    seen = []
+    for page in range(1, 10):
+        ids, total = main._fetch_cluster_page(Client(), 2, 42, page, 100)
+        assert total == index.size(2) == 833
+        assert ids == index.page(2, 42, page, 100)
+        seen.extend(ids)
+    assert len(set(seen)) == total
@@ -0,0 +1,31 @@
+import pytest
+
+from rec_engine import engine
+
+
+class FailingTable:
+    """Serves one full page, then fails"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def select(self, columns):
+        return self
+
+    def range(self, start, stop):
+        self.page = stop - start + 1
+        return self
+
+    def execute(self):
+        self.calls += 1
+        if self.calls > 1:
+            raise Exception("connection reset")
+        return type("Response", (), {"data": [{"id": i} for i in range(self.page)]})()
+
+
+def test_fetch_raises_on_page_error(monkeypatch):
+    table = FailingTable()
+    monkeypatch.setattr(engine, "get_supabase", lambda: type("Client", (), {"table": lambda self, name: table})())
+    with pytest.raises(Exception, match="connection reset"):
+        engine.fetch_data_via_client("products")
+    assert table.calls == 2
@@ -0,0 +1,93 @@
+import pytest
+
+from rec_engine import precompute
+from rec_engine.rerank_cache import invalidate_user, rerank_cache, rerank_epochs
+
+
+@pytest.fixture
+def clean_state(loaded_engine):
+    """Empty precomputed entries and epochs, cleared again even when the test fails"""
+    precompute.precomputed_recs.clear()
+    rerank_epochs.clear()
+    yield
+    precompute.precomputed_recs.clear()
+    rerank_epochs.clear()
+
+
+@pytest.fixture
+def precomputed(clean_state):
+    return precompute.precompute_recommendations(since_days=30, workers=1, rerank=False)
+
+
+def test_batch_matches_online_cf(loaded_engine):
+    users = list(loaded_engine.user_id_to_idx)[:50]
+    batch = precompute.batch_cf_candidates(users, top_k=precompute.CANDIDATES_PER_USER)
+    for user_id in users:
+        online = loaded_engine.recommend_for_user_item_cf(user_id, precompute.CANDIDATES_PER_USER)
+        # Same scores in the same order; near-ties may swap ids between float32 and float64
+        assert [s for _, s in batch.get(user_id, [])] == pytest.approx([s for _, s in online], rel=1e-5)
+        expected = dict(online)
+        for pid, score in batch.get(user_id, []):
+            if pid in expected:
+                assert score == pytest.approx(expected[pid], rel=1e-5)
+
+
+def test_process_pool_matches_in_process(loaded_engine):
+    users = list(loaded_engine.user_id_to_idx)
+    assert precompute.batch_cf_candidates(users, workers=2) == precompute.batch_cf_candidates(users, workers=1)
+
+
+def test_serves_precomputed_list(precomputed, loaded_engine):
+    assert precomputed["stored"] > 0
+    user_id = next(u for u in loaded_engine.user_id_to_idx if precompute.precomputed_recs.get(u))
+    for limit in (5, 50):
+        recs, _ = precompute.precomputed_recommendations(user_id, limit)
+        online = loaded_engine.recommend_for_user_hybrid(user_id, limit)
+        assert [r["product_id"] for r in recs] == [r["product_id"] for r in online]
+
+
+def test_activity_drops_entry_for_good(precomputed, loaded_engine):
+    user_id = next(u for u in loaded_engine.user_id_to_idx if precompute.precomputed_recs.get(u))
+    invalidate_user(user_id)
+    assert precompute.precomputed_recs.get(user_id) is None
+    # Even once the epoch itself is gone, nothing stale is left to serve
+    rerank_epochs.clear()
+    assert precompute.precomputed_recommendations(user_id, 5) == (None, None)
+
+
+def test_activity_during_run_invalidates_its_result(clean_state, loaded_engine, monkeypatch):
+    user_id = next(iter(loaded_engine.user_id_to_idx))
+    scored = precompute.batch_cf_candidates
+
+    def activity_while_scoring(*args, **kwargs):
+        result = scored(*args, **kwargs)
+        invalidate_user(user_id)
+        return result
+
+    monkeypatch.setattr(precompute, "batch_cf_candidates", activity_while_scoring)
+    precompute.precompute_recommendations(since_days=30, workers=1, rerank=False)
+    assert precompute.precomputed_recommendations(user_id, 5) == (None, None)
+
+
+def test_unreranked_entry_hands_candidates_to_online_rerank(precomputed, loaded_engine, mistral_stub):
+    user_id = next(u for u in loaded_engine.user_id_to_idx if precompute.precomputed_recs.get(u))
+    recs, candidates = precompute.precomputed_recommendations(user_id, 5)
+    assert recs is None
+    online, _ = loaded_engine.candidates_for_user(user_id)
+    assert [pid for pid, _ in candidates] == [pid for pid, _ in online]
+
+
+def test_rerank_runs_once_per_unchanged_key(clean_state, loaded_engine, mistral_stub):
+    first = precompute.precompute_recommendations(since_days=30, workers=1, rerank=True)
+    assert first["reranked"] == first["stored"] and first["llm_calls"] > 0
+    user_id = next(u for u in loaded_engine.user_id_to_idx if precompute.precomputed_recs.get(u))
+    recs, _ = precompute.precomputed_recommendations(user_id, 5)
+    assert all(r["llm_score"] is not None for r in recs)
+
+    rerank_cache.clear()
+    invalidate_user(user_id)
+    requests = mistral_stub.requests
+    second = precompute.precompute_recommendations(since_days=30, workers=1, rerank=True)
+    # Only the user with new activity goes back to the model
+    assert second["reused_rerank"] == second["stored"] - 1
+    assert mistral_stub.requests == requests + 1
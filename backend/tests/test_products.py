@@ -0,0 +1,36 @@
+import uuid
+
+import products
+from utils.cache_backends import create_cache
+
+
+class Table:
+    def __init__(self):
+        self.chunks = []
+
+    def select(self, columns):
+        return self
+
+    def in_(self, column, ids):
+        self.chunks.append(list(ids))
+        self.ids = ids
+        return self
+
+    def execute(self):
+        rows = [{"id": pid, "name": pid, "main_category": "c", "sub_category": "s", "image": ""} for pid in self.ids]
+        return type("Response", (), {"data": rows})()
+
+
+def test_misses_are_fetched_in_chunks(monkeypatch):
+    table = Table()
+    monkeypatch.setattr(products, "get_supabase", lambda: type("Client", (), {"table": lambda self, name: table})())
+    monkeypatch.setattr(products, "product_cache", create_cache("products-test", maxsize=1000, ttl=60, backend="memory"))
+    ids = [str(uuid.uuid4()) for _ in range(250)]
+
+    found = products.get_cached_products(ids)
+    assert set(found) == set(ids)
+    assert [len(chunk) for chunk in table.chunks] == [100, 100, 50]
+
+    # All cached now, so nothing else is queried
+    products.get_cached_products(ids)
+    assert len(table.chunks) == 3
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from config import settings
+from vectors import quantized, store
+from vectors.quantized import QuantizedEmbeddingStore, write_store
+
+EXPORTED = {"count": 3, "latest_update": "2026-10-01T12:00:00+00:00"}
+
+
+def pages():
+    rng = np.random.default_rng(0)
+    yield ["a", "b"], rng.normal(size=(2, 8)).astype(np.float32)
+    yield ["c"], rng.normal(size=(1, 8)).astype(np.float32)
+
+
+def test_empty_export_opens(tmp_path):
+    directory = str(tmp_path / "store")
+    meta = write_store(directory, iter(()), "int8", {"count": 0, "latest_update": None})
+    assert meta["count"] == 0
+    opened = QuantizedEmbeddingStore(directory)
+    assert len(opened) == 0
+    rows, scores = opened.search(np.ones(meta["dim"], dtype=np.float32), 5)
+    assert len(rows) == 0 and len(scores) == 0
+
+
+def test_stale_reason():
+    meta = {"count": 3, "source": EXPORTED}
+    assert quantized.stale_reason(meta, dict(EXPORTED)) is None
+    assert quantized.stale_reason(meta, {**EXPORTED, "count": 4})
+    assert quantized.stale_reason(meta, {**EXPORTED, "latest_update": "2026-10-01T12:00:00.5+00:00"})
+    # Stores exported before the source was recorded only go stale once a timestamp shows up
+    assert quantized.stale_reason({"count": 3}, {"count": 3, "latest_update": None}) is None
+    assert quantized.stale_reason({"count": 3}, EXPORTED)
+
+
+@pytest.fixture
+def exported_store(tmp_path, monkeypatch):
+    directory = str(tmp_path / "store")
+    write_store(directory, pages(), "int8", EXPORTED)
+    monkeypatch.setattr(settings, "EMBEDDING_STORE_DIR", directory)
+    monkeypatch.setattr(store, "fetch_embeddings", lambda: (["d"], np.ones((1, 8), dtype=np.float32)))
+    monkeypatch.setattr(store, "_matrix", None)
+    return directory
+
+
+def test_refresh_uses_current_store(exported_store, monkeypatch):
+    monkeypatch.setattr(store, "embedding_source_state", lambda: (3, EXPORTED["latest_update"]))
+    assert isinstance(store.refresh_embeddings(), QuantizedEmbeddingStore)
+
+
+def test_refresh_falls_back_to_database_when_stale(exported_store, monkeypatch):
+    monkeypatch.setattr(store, "embedding_source_state", lambda: (3, "2026-10-02T00:00:00+00:00"))
+    matrix = store.refresh_embeddings()
+    assert not isinstance(matrix, QuantizedEmbeddingStore) and matrix.ids == ["d"]
+
+
+def test_refresh_keeps_store_when_check_fails(exported_store, monkeypatch):
+    def unreachable():
+        raise Exception("database unreachable")
+
+    monkeypatch.setattr(store, "embedding_source_state", unreachable)
+    assert isinstance(store.refresh_embeddings(), QuantizedEmbeddingStore)
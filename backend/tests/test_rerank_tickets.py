@@ -0,0 +1,57 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from config import settings
+from routes import recommendations
+from routes.recommendations import RERANK_FAILED, RERANK_PENDING, rerank_tickets, stream_rerank_ticket
+
+
+@pytest.fixture
+def ticket(monkeypatch):
+    monkeypatch.setattr(settings, "MISTRAL_TIMEOUT_SECONDS", 0.3)
+    monkeypatch.setattr(recommendations, "TICKET_TIMEOUT_MARGIN_SECONDS", 0.6)
+    monkeypatch.setattr(recommendations, "TICKET_POLL_SECONDS", 0.02)
+    ticket = uuid.uuid4().hex
+    yield ticket
+    rerank_tickets.delete(ticket)
+
+
+async def first_event(ticket):
+    response = await stream_rerank_ticket(ticket)
+    async for chunk in response.body_iterator:
+        if chunk.startswith("event:"):
+            return chunk.split("\n")[0]
+
+
+def pending(created_at):
+    return {"user_id": "u1", "limit": 5, "candidates": [], "cache_key": None,
+            "status": RERANK_PENDING, "created_at": created_at}
+
+
+def test_stream_waits_past_the_llm_timeout_for_a_slow_rerank(ticket):
+    async def scenario():
+        await rerank_tickets.set_async(ticket, pending(time.time()))
+
+        async def settle():
+            await asyncio.sleep(0.5)
+            await rerank_tickets.set_async(ticket, {**pending(time.time()), "status": RERANK_FAILED})
+
+        task = asyncio.create_task(settle())
+        event = await first_event(ticket)
+        await task
+        return event
+
+    assert asyncio.run(scenario()) == "event: failed"
+
+
+def test_stream_deadline_counts_from_ticket_creation(ticket):
+    async def scenario():
+        await rerank_tickets.set_async(ticket, pending(time.time() - 0.8))
+        started = time.time()
+        return await first_event(ticket), time.time() - started
+
+    event, waited = asyncio.run(scenario())
+    assert event == "event: timeout" and waited < 0.3
@@ -0,0 +1,107 @@
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from rec_engine import reranker as reranker_module
+from rec_engine.rerank_cache import get_rerank, rerank_cache
+from rec_engine.reranker import AsyncReranker
+
+
+@pytest.fixture
+def reranker(mistral_stub):
+    rerank_cache.clear()
+    yield AsyncReranker()
+    rerank_cache.clear()
+
+
+@pytest.fixture
+def request_args(loaded_engine):
+    def build(user_id):
+        profile = loaded_engine.get_user_profile(user_id)
+        candidates = loaded_engine.recommend_for_user_item_cf(user_id, 10)
+        payload = loaded_engine.build_candidate_payload(candidates)
+        return f"test:{user_id}:{time.time_ns()}", profile, payload
+    return build
+
+
+def test_on_time_call_returns_and_caches_scores(reranker, request_args, mistral_stub):
+    key, profile, payload = request_args("u1")
+    scores = reranker.scores(key, profile, payload, deadline=5.0)
+    assert set(scores) == {c["product_id"] for c in payload}
+    assert all(0.0 <= s["llm_score"] <= 1.0 and s["reason"] for s in scores.values())
+    assert get_rerank(key) == scores
+    assert (reranker.calls, reranker.deadline_misses, mistral_stub.requests > 0) == (1, 0, True)
+
+
+def test_deadline_miss_fills_cache_late(reranker, request_args, mistral_stub, monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "RERANK_DEADLINE_MS", 100)
+    mistral_stub.latency = 0.5
+    key, profile, payload = request_args("u2")
+    started = time.time()
+    assert reranker.scores(key, profile, payload) is None
+    assert time.time() - started < 0.4
+    assert reranker.deadline_misses == 1
+    assert get_rerank(key) is None
+
+    # The call is not cancelled: it completes and stores its result for the next request
+    deadline = time.time() + 5
+    while get_rerank(key) is None:
+        assert time.time() < deadline, "late rerank never reached the cache"
+        time.sleep(0.05)
+    assert reranker.completed_late == 1
+
+
+def test_server_error_is_an_empty_result(reranker, request_args, mistral_stub):
+    mistral_stub.fail = True
+    key, profile, payload = request_args("u3")
+    assert reranker.scores(key, profile, payload, deadline=5.0) == {}
+    assert reranker.failures == 1
+    assert get_rerank(key) is None
+
+
+def test_requests_for_key_in_flight_join_it(reranker, request_args, mistral_stub):
+    mistral_stub.latency = 0.3
+    key, profile, payload = request_args("u4")
+    requests = mistral_stub.requests
+    first = reranker.submit(key, profile, payload)
+    second = reranker.submit(key, profile, payload)
+    assert first is second
+    assert reranker.scores(key, profile, payload, deadline=5.0) == first.result()
+    assert (reranker.calls, reranker.joined, mistral_stub.requests - requests) == (1, 2, 1)
+
+
+def run_with_timeout(fn, timeout=5.0):
+    """Run fn on a daemon thread so a deadlock fails the test instead of hanging the suite"""
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", fn()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "reranker deadlocked"
+    return result["value"]
+
+
+def test_prompt_error_is_an_empty_result(reranker, request_args, mistral_stub):
+    key, profile, payload = request_args("u5")
+    payload = [{k: v for k, v in c.items() if k != "product_id"} for c in payload]
+    requests = mistral_stub.requests
+    assert run_with_timeout(lambda: reranker.scores(key, profile, payload, deadline=5.0)) == {}
+    stats = run_with_timeout(reranker.stats)
+    assert (stats["failures"], stats["in_flight"], mistral_stub.requests - requests) == (1, 0, 0)
+
+
+def test_submit_survives_a_call_that_finishes_immediately(reranker, request_args, monkeypatch):
+    def finished(coro, loop):
+        coro.close()
+        future = concurrent.futures.Future()
+        future.set_result({})
+        return future
+
+    monkeypatch.setattr(reranker_module.asyncio, "run_coroutine_threadsafe", finished)
+    key, profile, payload = request_args("u6")
+    future = run_with_timeout(lambda: reranker.submit(key, profile, payload))
+    assert future.result() == {}
+    assert run_with_timeout(reranker.stats)["in_flight"] == 0
@@ -0,0 +1,37 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from rec_engine.rerank_cache import invalidate_user, rerank_epochs
+from routes.recommendations import user_version
+from utils.response_cache import cached_route
+
+app = FastAPI()
+calls = []
+
+
+@app.get("/users/{user_id}/page")
+@cached_route("test.user_page", ttl=60, vary=user_version)
+async def user_page(user_id: str, limit: int = 10):
+    calls.append((user_id, limit))
+    return {"user_id": user_id, "limit": limit, "version": len(calls)}
+
+
+async def fetch(*paths):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return [(await client.get(path)).json()["version"] for path in paths]
+
+
+def test_user_activity_retires_cached_responses():
+    rerank_epochs.clear()
+    calls.clear()
+    first = asyncio.run(fetch("/users/a/page", "/users/a/page?limit=5", "/users/b/page"))
+    assert asyncio.run(fetch("/users/a/page", "/users/a/page?limit=5", "/users/b/page")) == first
+
+    invalidate_user("a")
+    again = asyncio.run(fetch("/users/a/page", "/users/a/page?limit=5", "/users/b/page"))
+    # Every cached page of the active user is recomputed, whatever its limit; others are untouched
+    assert again[:2] != first[:2] and again[2] == first[2]
+    assert len(calls) == 5
+    rerank_epochs.clear()
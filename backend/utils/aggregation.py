@@ -0,0 +1,86 @@
+"""
+Streaming aggregation for catalog scans.
+
+Scans feed rows in as pages arrive and keep only running per-group totals
+and heap-based top-K selections, so peak memory is O(K + groups) instead of
+holding every row until the end. Ties keep the row that was seen first,
+matching a stable sort over the full scan.
+"""
+import heapq
+from typing import Any, Callable, Dict, Generic, Hashable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class TopK(Generic[T]):
+    """The k items with the highest scores seen so far"""
+
+    def __init__(self, k: int):
+        self.k = k
+        # Min-heap of (score, -sequence, item); the sequence breaks ties in arrival order
+        self._heap: List[Tuple[Any, int, T]] = []
+        self._seen = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, score: Any, item: T):
+        entry = (score, -self._seen, item)
+        self._seen += 1
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def items(self) -> List[T]:
+        """Best first"""
+        return [item for _, _, item in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+
+
+class GroupedTopK(Generic[T]):
+    """
+    A TopK per group plus a running total per group.
+    Groups are reported in the order they were first seen.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.tops: Dict[Hashable, TopK[T]] = {}
+        self.totals: Dict[Hashable, float] = {}
+
+    def add(self, group: Hashable, amount: float):
+        self.totals[group] = self.totals.get(group, 0) + amount
+
+    def push(self, group: Hashable, score: Any, item: T):
+        top = self.tops.get(group)
+        if top is None:
+            top = self.tops[group] = TopK(self.k)
+        top.push(score, item)
+
+    def items(self, group: Hashable) -> List[T]:
+        top = self.tops.get(group)
+        return top.items() if top is not None else []
+
+    def top_groups(self, n: int) -> List[Hashable]:
+        """Groups with the largest totals, best first"""
+        return [group for group, _ in sorted(self.totals.items(), key=lambda x: x[1], reverse=True)[:n]]
+
+
+def iter_pages(
+    fetch_page: Callable[[int, int], Optional[List[Dict]]],
+    page_size: int,
+    max_pages: Optional[int] = None,
+) -> Iterator[List[Dict]]:
+    """
+    Yield pages from `fetch_page(offset, limit)` until a short or empty page.
+    Nothing is retained between pages, so each can be freed once consumed.
+    """
+    page = 0
+    while max_pages is None or page < max_pages:
+        data = fetch_page(page * page_size, page_size)
+        if not data:
+            return
+        yield data
+        if len(data) < page_size:
+            return
+        page += 1
@@ -0,0 +1,119 @@
+"""
+In-process caching utilities
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class LRUCache:
+    """
+    Thread-safe bounded LRU cache with optional per-entry TTL.
+    Tracks hits and misses so callers can expose a hit rate.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable, now: float) -> Tuple[bool, Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= now:
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float], now: float):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            found, value = self._lookup(key, time.monotonic())
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def get_many(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, Any], List[Hashable]]:
+        """Return (found, missing) for a batch of keys under a single lock."""
+        found: Dict[Hashable, Any] = {}
+        missing: List[Hashable] = []
+        with self._lock:
+            now = time.monotonic()
+            for key in keys:
+                ok, value = self._lookup(key, now)
+                if ok:
+                    found[key] = value
+                else:
+                    missing.append(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._store(key, value, ttl, time.monotonic())
+
+    def set_many(self, items: Dict[Hashable, Any], ttl: Optional[float] = None):
+        with self._lock:
+            now = time.monotonic()
+            for key, value in items.items():
+                self._store(key, value, ttl, now)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    # Async counterparts of the shared backends' (utils/cache_backends.py);
+    # memory access never blocks, so these run inline
+    async def get_async(self, key: Hashable, default: Any = None) -> Any:
+        return self.get(key, default)
+
+    async def get_many_async(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, Any], List[Hashable]]:
+        return self.get_many(keys)
+
+    async def set_async(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self.set(key, value, ttl)
+
+    async def set_many_async(self, items: Dict[Hashable, Any], ttl: Optional[float] = None):
+        self.set_many(items, ttl)
+
+    async def delete_async(self, key: Hashable):
+        self.delete(key)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
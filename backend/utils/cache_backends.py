@@ -0,0 +1,509 @@
+"""
+Interchangeable cache backends.
+
+Every backend exposes the LRUCache interface (get / get_many / set /
+set_many / delete / clear / stats, with per-call TTLs, and *_async variants
+of the reads and writes for the event loop), so callers pick one with
+`create_cache` and never care where values live:
+
+    memory  LRUCache in this process (the default; no serialisation)
+    file    one file per key under CACHE_DIR, shared by every worker on the host
+    redis   any Redis-protocol server at CACHE_REDIS_URL, shared across hosts
+
+The shared backends store values in a compact binary form: pickled, and
+zlib-compressed when that pays off, behind a one-byte format header. They
+treat their store as best effort: an unreachable server or unreadable file
+is a miss, never an error for the request. Only point them at storage this
+backend owns, since cached values are unpickled on read.
+
+Their I/O blocks, so async code uses the *_async methods, which run it on
+a worker thread. Housekeeping that walks the whole store (file eviction,
+counting entries for `stats`) runs on a background thread, and `size` is
+the count from the last such pass.
+"""
+import asyncio
+import hashlib
+import os
+from abc import ABC, abstractmethod
+import pickle
+import queue
+import socket
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from config import settings
+from utils.cache import LRUCache
+
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+COMPRESS_MIN_BYTES = 512
+# How long a Redis backend treats the server as down after a connection failure
+RETRY_AFTER_SECONDS = 5.0
+# Age after which stats() triggers a background recount of a shared backend's entries
+SIZE_REFRESH_SECONDS = 30.0
+
+
+def dumps(value: Any) -> bytes:
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(data, 3)
+        if len(packed) < len(data):
+            return _ZLIB + packed
+    return _RAW + data
+
+
+def loads(data: bytes) -> Any:
+    header, body = data[:1], data[1:]
+    if header == _ZLIB:
+        body = zlib.decompress(body)
+    elif header != _RAW:
+        raise ValueError("Unknown cache value format")
+    return pickle.loads(body)
+
+
+class SharedCacheBackend(ABC):
+    """
+    Key namespacing, default TTL and hit/miss accounting for out-of-process
+    stores. Subclasses implement the batch operations; get / set go through them.
+    """
+
+    kind = "shared"
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._size: Optional[int] = None
+        self._size_at = 0.0
+        self._maintenance_lock = threading.Lock()
+        self._maintaining = False
+        self._maintenance_requested = False
+
+    def storage_key(self, key: Hashable) -> str:
+        if not isinstance(key, str):
+            key = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{key}"
+
+    def _ttl(self, ttl: Optional[float]) -> Optional[float]:
+        return self.ttl if ttl is None else ttl
+
+    def _count(self, found: int, missing: int):
+        self.hits += found
+        self.misses += missing
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        found, _ = self.get_many([key])
+        return found.get(key, default)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self.set_many({key: value}, ttl)
+
+    @abstractmethod
+    def get_many(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, Any], List[Hashable]]:
+        """Return (found, missing) for a batch of keys"""
+
+    @abstractmethod
+    def set_many(self, items: Dict[Hashable, Any], ttl: Optional[float] = None):
+        pass
+
+    @abstractmethod
+    def delete(self, key: Hashable):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    async def get_async(self, key: Hashable, default: Any = None) -> Any:
+        return await asyncio.to_thread(self.get, key, default)
+
+    async def get_many_async(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, Any], List[Hashable]]:
+        return await asyncio.to_thread(self.get_many, list(keys))
+
+    async def set_async(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    async def set_many_async(self, items: Dict[Hashable, Any], ttl: Optional[float] = None):
+        await asyncio.to_thread(self.set_many, items, ttl)
+
+    async def delete_async(self, key: Hashable):
+        await asyncio.to_thread(self.delete, key)
+
+    @abstractmethod
+    def _maintain(self) -> Optional[int]:
+        """Housekeeping pass over the whole store; returns the entry count"""
+
+    def _schedule_maintenance(self):
+        """Run _maintain on a background thread, or once more after the running pass"""
+        with self._maintenance_lock:
+            if self._maintaining:
+                self._maintenance_requested = True
+                return
+            self._maintaining = True
+        threading.Thread(target=self._maintenance_loop, name=f"cache-{self.namespace}", daemon=True).start()
+
+    def _maintenance_loop(self):
+        while True:
+            try:
+                self._size = self._maintain()
+            except Exception as e:
+                self._fail("maintenance", e)
+            self._size_at = time.time()
+            with self._maintenance_lock:
+                if not self._maintenance_requested:
+                    self._maintaining = False
+                    return
+                self._maintenance_requested = False
+
+    def size(self) -> Optional[int]:
+        """Entry count from the last background pass (None before the first); never scans inline"""
+        if time.time() - self._size_at >= SIZE_REFRESH_SECONDS:
+            self._schedule_maintenance()
+        return self._size
+
+    def _fail(self, action: str, error: Exception):
+        self.errors += 1
+        # One line per failure burst is enough; the counter tracks the rest
+        if self.errors == 1 or self.errors % 1000 == 0:
+            print(f"[Cache] {self.kind} {action} failed for {self.namespace} ({self.errors} errors): {error}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.kind,
+            "namespace": self.namespace,
+            "size": self.size(),
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# ---------- filesystem ----------
+
+_EXPIRY = struct.Struct("<d")
+
+
+class FileCacheBackend(SharedCacheBackend):
+    """
+    One file per key: an 8-byte expiry timestamp followed by the encoded
+    value. Writes go through a temp file and os.replace, so readers in other
+    workers see either the old or the new value. Reads are served from the
+    OS page cache, which all workers share. Every maxsize // 10 writes an
+    eviction pass is scheduled in the background.
+    """
+
+    kind = "file"
+
+    def __init__(self, namespace: str, directory: str, maxsize: int, ttl: Optional[float] = None):
+        super().__init__(namespace, ttl)
+        self.directory = os.path.join(directory, namespace.replace(":", "_"))
+        self.maxsize = maxsize
+        self._writes = 0
+        self._evict_due = False
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: Hashable) -> str:
+        digest = hashlib.sha1(self.storage_key(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def _read(self, path: str, now: float) -> Tuple[bool, Any]:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False, None
+        except OSError:
+            self.errors += 1
+            return False, None
+        try:
+            expires_at = _EXPIRY.unpack_from(data)[0]
+            if expires_at and expires_at <= now:
+                return False, None
+            return True, loads(data[_EXPIRY.size:])
+        except Exception:
+            self.errors += 1
+            return False, None
+
+    def get_many(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, Any], List[Hashable]]:
+        found: Dict[Hashable, Any] = {}
+        missing: List[Hashable] = []
+        now = time.time()
+        for key in keys:
+            ok, value = self._read(self._path(key), now)
+            if ok:
+                found[key] = value
+            else:
+                missing.append(key)
+        self._count(len(found), len(missing))
+        return found, missing
+
+    def set_many(self, items: Dict[Hashable, Any], ttl: Optional[float] = None):
+        ttl = self._ttl(ttl)
+        expires_at = time.time() + ttl if ttl else 0.0
+        for key, value in items.items():
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp_path, "wb") as f:
+                    f.write(_EXPIRY.pack(expires_at) + dumps(value))
+                os.replace(tmp_path, path)
+            except OSError:
+                self.errors += 1
+        self._writes += len(items)
+        if self._writes >= max(self.maxsize // 10, 1):
+            self._writes = 0
+            self._evict_due = True
+            self._schedule_maintenance()
+
+    def _files(self) -> List[str]:
+        paths = []
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                paths.extend(entry.path for entry in os.scandir(shard.path) if not entry.name.endswith(".tmp"))
+        return paths
+
+    def _maintain(self) -> int:
+        if self._evict_due:
+            self._evict_due = False
+            return self._evict()
+        return len(self._files())
+
+    def _evict(self) -> int:
+        """Drop expired files, then the least recently written ones beyond maxsize; returns the count left"""
+        now = time.time()
+        alive = []
+        for path in self._files():
+            try:
+                with open(path, "rb") as f:
+                    expires_at = _EXPIRY.unpack(f.read(_EXPIRY.size))[0]
+            except (OSError, struct.error):
+                expires_at = now
+            if expires_at and expires_at <= now:
+                self._remove(path)
+            else:
+                alive.append(path)
+        if len(alive) > self.maxsize:
+            alive.sort(key=self._mtime)
+            for path in alive[:len(alive) - self.maxsize]:
+                self._remove(path)
+        return min(len(alive), self.maxsize)
+
+    @staticmethod
+    def _mtime(path: str) -> float:
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0.0
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def delete(self, key: Hashable):
+        self._remove(self._path(key))
+
+    def clear(self):
+        for path in self._files():
+            self._remove(path)
+
+
+# ---------- Redis protocol ----------
+
+class RespError(Exception):
+    pass
+
+
+class RespConnection:
+    """Minimal RESP2 client connection (enough for the commands used below)"""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    @staticmethod
+    def encode(*args: Any) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def execute(self, *commands: Tuple) -> List[Any]:
+        """Send every command in one write (a pipeline) and read all replies"""
+        self.sock.sendall(b"".join(self.encode(*command) for command in commands))
+        return [self.read_reply() for _ in commands]
+
+    def read_reply(self) -> Any:
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise RespError(f"Unexpected reply {line!r}")
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisCacheBackend(SharedCacheBackend):
+    """Values in any Redis-protocol server, through a small pool of connections"""
+
+    kind = "redis"
+
+    def __init__(self, namespace: str, url: str, ttl: Optional[float] = None,
+                 pool_size: int = 8, timeout: float = 0.5):
+        super().__init__(namespace, ttl)
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._pool: "queue.LifoQueue[RespConnection]" = queue.LifoQueue(maxsize=pool_size)
+        self._down_until = 0.0
+
+    def _connect_or_back_off(self) -> RespConnection:
+        try:
+            return self._connect()
+        except OSError:
+            # Requests stop paying the connect timeout until the server has had time to recover
+            self._down_until = time.time() + RETRY_AFTER_SECONDS
+            raise
+
+    def _connect(self) -> RespConnection:
+        conn = RespConnection(self.host, self.port, self.timeout)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            conn.execute(*setup)
+        return conn
+
+    def execute(self, *commands: Tuple) -> List[Any]:
+        if time.time() < self._down_until:
+            raise ConnectionError("server marked unavailable")
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect_or_back_off()
+        try:
+            replies = conn.execute(*commands)
+        except (OSError, ConnectionError):
+            conn.close()
+            self._down_until = time.time() + RETRY_AFTER_SECONDS
+            raise
+        except Exception:
+            conn.close()
+            raise
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        return replies
+
+    def get_many(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, Any], List[Hashable]]:
+        keys = list(keys)
+        found: Dict[Hashable, Any] = {}
+        if not keys:
+            return found, []
+        try:
+            values = self.execute(("MGET", *[self.storage_key(k) for k in keys]))[0]
+        except Exception as e:
+            self._fail("read", e)
+            values = [None] * len(keys)
+        missing = []
+        for key, data in zip(keys, values):
+            if data is None:
+                missing.append(key)
+                continue
+            try:
+                found[key] = loads(data)
+            except Exception:
+                self.errors += 1
+                missing.append(key)
+        self._count(len(found), len(missing))
+        return found, missing
+
+    def set_many(self, items: Dict[Hashable, Any], ttl: Optional[float] = None):
+        if not items:
+            return
+        ttl = self._ttl(ttl)
+        expiry = ("PX", int(ttl * 1000)) if ttl else ()
+        commands = [("SET", self.storage_key(key), dumps(value), *expiry) for key, value in items.items()]
+        try:
+            self.execute(*commands)
+        except Exception as e:
+            self._fail("write", e)
+
+    def delete(self, key: Hashable):
+        try:
+            self.execute(("DEL", self.storage_key(key)))
+        except Exception as e:
+            self._fail("delete", e)
+
+    def _scan(self) -> List[bytes]:
+        keys, cursor = [], b"0"
+        while True:
+            cursor, batch = self.execute(("SCAN", cursor, "MATCH", f"{self.namespace}:*", "COUNT", 1000))[0]
+            keys.extend(batch)
+            if cursor in (b"0", 0, "0"):
+                return keys
+
+    def clear(self):
+        try:
+            keys = self._scan()
+            for start in range(0, len(keys), 1000):
+                self.execute(("DEL", *keys[start:start + 1000]))
+        except Exception as e:
+            self._fail("clear", e)
+
+    def _maintain(self) -> int:
+        # Redis expires keys itself; only the count needs a pass over the namespace
+        return len(self._scan())
+
+
+def create_cache(namespace: str, maxsize: int, ttl: Optional[float] = None, backend: Optional[str] = None):
+    """The configured CACHE_BACKEND (or `backend`, if given) for one logical cache"""
+    backend = backend or settings.CACHE_BACKEND
+    if backend == "file":
+        return FileCacheBackend(namespace, settings.CACHE_DIR, maxsize, ttl)
+    if backend == "redis":
+        return RedisCacheBackend(namespace, settings.CACHE_REDIS_URL, ttl)
+    if backend != "memory":
+        print(f"[Cache] Unknown cache backend {backend!r} for {namespace}; using memory")
+    return LRUCache(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,112 @@
+"""
+Bounded thread pools for blocking work called from async routes.
+
+    pool = BoundedExecutor("recommendations", workers=4, queue_limit=32)
+    result = await pool.run(blocking_fn, arg)
+
+Each pool has its own threads, so a slow workload cannot use up the
+event loop's default executor that other routes share. At most
+`queue_limit` calls wait for a free thread; past that `run` raises
+ExecutorSaturated straight away instead of queueing work the client will
+have given up on. A caller cancelled while its call is still queued (for
+example by a timeout) withdraws the call. A call that has already started
+runs to completion.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+import numpy as np
+
+# Recent samples kept for the wait / run time percentiles
+_SAMPLES = 1000
+
+
+class ExecutorSaturated(Exception):
+    """Raised by BoundedExecutor.run when the queue is full"""
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, workers: int, queue_limit: int):
+        self.name = name
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.peak_queued = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.withdrawn = 0
+        self.wait_seconds = deque(maxlen=_SAMPLES)
+        self.run_seconds = deque(maxlen=_SAMPLES)
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            if self.queued >= self.queue_limit:
+                self.rejected += 1
+                raise ExecutorSaturated(f"{self.name}: {self.queued} calls already waiting")
+            self.queued += 1
+            self.submitted += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+        enqueued = time.perf_counter()
+
+        def call():
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.wait_seconds.append(started - enqueued)
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.run_seconds.append(time.perf_counter() - started)
+
+        future = self.pool.submit(call)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # cancel() only succeeds while the call has not started
+            if future.cancel():
+                with self._lock:
+                    self.queued -= 1
+                    self.withdrawn += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = np.array(self.wait_seconds) * 1000
+            runs = np.array(self.run_seconds) * 1000
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "running": self.running,
+                "queued": self.queued,
+                "peak_queued": self.peak_queued,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "withdrawn": self.withdrawn,
+                "queue_wait_ms": _percentiles(waits),
+                "run_ms": _percentiles(runs),
+            }
+
+
+def _percentiles(samples: np.ndarray) -> Dict[str, float]:
+    if not len(samples):
+        return {}
+    return {f"p{p}": round(float(np.percentile(samples, p)), 2) for p in (50, 95, 99)}
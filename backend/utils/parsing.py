@@ -0,0 +1,33 @@
+"""
+Helpers for the text-typed numeric columns of `products`
+(prices like "₹1,299", counts like "78,970", ratings like "4.2")
+"""
+from typing import Any, Dict, Optional
+
+
+def parse_int(value: Any) -> int:
+    """Digits of a count or price string as an int, 0 if there are none"""
+    if value is None:
+        return 0
+    digits = ''.join(filter(str.isdigit, str(value)))
+    return int(digits) if digits else 0
+
+
+def parse_rating(value: Any) -> float:
+    """Star rating as a float, 0.0 if missing or malformed"""
+    try:
+        return float(value or "0")
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def parse_price(item: Dict[str, Any]) -> Optional[float]:
+    """
+    Selling price of a product row: discount_price, falling back to actual_price.
+    Returns None when neither holds a number.
+    """
+    price_str = item.get("discount_price") or item.get("actual_price") or "0"
+    digits = ''.join(filter(str.isdigit, str(price_str).replace(',', '')))
+    if not digits:
+        return None
+    return float(digits)
@@ -0,0 +1,195 @@
+"""
+Stale-while-revalidate response cache for read-mostly FastAPI routes.
+
+    @router.get("/")
+    @cached_route("products.list", ttl=30)
+    async def get_products(page: int = Query(1), ...):
+
+Responses are keyed by route name plus the normalised call arguments, and
+whatever `vary` derives from them (e.g. a per-user version, so a user's
+new activity makes their cached pages unreachable at once). A
+fresh entry is returned as is; once it is older than `ttl` but within
+`stale_ttl` it is still returned immediately while one background task
+recomputes it. Concurrent misses for the same key share a single upstream
+call (per process). Exceptions are never cached, and a failed background refresh keeps
+serving the stale value until it expires.
+"""
+import asyncio
+import functools
+import inspect
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import BackgroundTasks, Request, Response
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from utils.cache_backends import create_cache
+
+# Injected framework objects are not part of the cache key
+_UNKEYED_TYPES = (Request, Response, BackgroundTasks)
+
+_routes: Dict[str, "RouteCache"] = {}
+
+
+def _normalize(value: Any) -> Hashable:
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_normalize(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(v)) for k, v in value.items()))
+    return value
+
+
+class RouteCache:
+    def __init__(self, name: str, ttl: float, stale_ttl: float, maxsize: int):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # Entries hold (value, fresh_until) and expire once too stale to serve.
+        # With a shared CACHE_BACKEND every worker reads the same entries.
+        self.entries = create_cache(f"route:{name}", maxsize=maxsize, ttl=ttl + stale_ttl)
+        self.inflight: Dict[Hashable, asyncio.Future] = {}
+        # Background refresh tasks by key; holding them keeps the tasks alive
+        self.refreshing: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.errors = 0
+        self.staleness_total = 0.0
+
+    async def get(self, key: Hashable, compute: Callable[[], Any], should_cache: Callable[[Any], bool]) -> Any:
+        entry = await self.entries.get_async(key)
+        now = time.time()
+        if entry is not None:
+            value, fresh_until = entry
+            if now < fresh_until:
+                self.hits += 1
+                return value
+            self.stale_hits += 1
+            self.staleness_total += now - fresh_until
+            if key not in self.refreshing:
+                task = asyncio.create_task(self._refresh(key, compute, should_cache))
+                self.refreshing[key] = task
+                task.add_done_callback(lambda _: self.refreshing.pop(key, None))
+            return value
+
+        pending = self.inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_event_loop().create_future()
+        self.inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.errors += 1
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so an unawaited future does not log
+            future.exception()
+            raise
+        else:
+            await self._store(key, value, should_cache)
+            future.set_result(value)
+            return value
+        finally:
+            self.inflight.pop(key, None)
+
+    async def _refresh(self, key: Hashable, compute: Callable[[], Any], should_cache: Callable[[Any], bool]):
+        self.refreshes += 1
+        try:
+            await self._store(key, await compute(), should_cache)
+        except Exception as e:
+            self.errors += 1
+            print(f"[ResponseCache] Background refresh of {self.name} failed: {e}")
+
+    async def _store(self, key: Hashable, value: Any, should_cache: Callable[[Any], bool]):
+        if should_cache(value):
+            await self.entries.set_async(key, (value, time.time() + self.ttl))
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        served = self.hits + self.stale_hits + self.misses + self.coalesced
+        return {
+            "ttl_seconds": self.ttl,
+            "stale_ttl_seconds": self.stale_ttl,
+            "entries": self.entries.stats()["size"],
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "background_refreshes": self.refreshes,
+            "errors": self.errors,
+            "hit_rate": round((self.hits + self.stale_hits + self.coalesced) / served, 4) if served else 0.0,
+            "avg_staleness_seconds": round(self.staleness_total / self.stale_hits, 2) if self.stale_hits else 0.0,
+        }
+
+
+def cached_route(
+    name: str,
+    ttl: float,
+    stale_ttl: Optional[float] = None,
+    maxsize: Optional[int] = None,
+    should_cache: Callable[[Any], bool] = lambda value: True,
+    vary: Optional[Callable[[Dict[str, Any]], Awaitable[Hashable]]] = None,
+):
+    """
+    Cache a route's return value (see module docstring). Apply it below the
+    router decorator; sync handlers are run in the threadpool as FastAPI would.
+    `should_cache` can reject values such as empty error fallbacks.
+    `vary(arguments)` is awaited with the bound call arguments and its
+    result added to the key.
+    """
+    stale_ttl = settings.RESPONSE_CACHE_STALE_SECONDS if stale_ttl is None else stale_ttl
+    cache = _routes[name] = RouteCache(name, ttl, stale_ttl, maxsize or settings.RESPONSE_CACHE_SIZE)
+
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        is_async = asyncio.iscoroutinefunction(func)
+
+        async def make_key(args: Tuple, kwargs: Dict) -> Hashable:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = tuple(sorted(
+                (param, _normalize(value))
+                for param, value in bound.arguments.items()
+                if value is not None and not isinstance(value, _UNKEYED_TYPES)
+            ))
+            if vary is not None:
+                key += (("__vary__", await vary(bound.arguments)),)
+            return key
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            async def compute():
+                if is_async:
+                    return await func(*args, **kwargs)
+                return await run_in_threadpool(func, *args, **kwargs)
+
+            if not settings.RESPONSE_CACHE_ENABLED:
+                return await compute()
+            return await cache.get(await make_key(args, kwargs), compute, should_cache)
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def response_cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in _routes.items()}
+
+
+def clear_response_caches():
+    for cache in _routes.values():
+        cache.clear()
@@ -0,0 +1,3 @@
+"""
+Product embedding matrix and the vector search built on it
+"""
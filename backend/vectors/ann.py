@@ -0,0 +1,351 @@
+"""
+Approximate nearest-neighbour index over product embeddings (IVF-PQ).
+
+Vectors are assigned to the nearest of `nlist` coarse k-means centroids
+(the inverted file). Each vector's residual from its centroid is compressed
+with product quantisation: split into `m` sub-vectors, each replaced by the
+id of the nearest of 256 sub-centroids, so a 384-d float32 vector (1536
+bytes) is stored as `m` bytes. A query probes the `nprobe` closest lists,
+scores their codes with per-list lookup tables (asymmetric distance), and
+optionally re-scores the best candidates exactly against the float matrix.
+
+The index persists to a single .npz file so workers load it instead of
+re-training. Each row keeps a fingerprint of the vector it was encoded
+from. On load, products embedded since the index was trained are encoded
+with the existing centroids and appended, re-embedded products (whose
+fingerprint no longer matches) are re-encoded, and products that are gone
+are dropped; the index is only retrained once more than
+ANN_RETRAIN_FRACTION of the catalog has changed.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from config import settings
+from vectors.store import EmbeddingMatrix, get_embedding_matrix, normalize_rows
+
+PQ_CENTROIDS = 256
+# Share of new, re-embedded or removed products above which the index is retrained instead of updated
+ANN_RETRAIN_FRACTION = 0.05
+# Random projections per row used to notice that a product's vector changed
+FINGERPRINT_DIMS = 4
+
+
+def fingerprint(vectors: np.ndarray) -> np.ndarray:
+    """A few fixed random projections of normalised vectors; equal vectors give equal fingerprints"""
+    projection = np.random.default_rng(0).standard_normal((vectors.shape[1], FINGERPRINT_DIMS))
+    return (np.asarray(vectors, dtype=np.float32) @ projection.astype(np.float32)).astype(np.float32)
+
+
+def _sq_distances(x: np.ndarray, centroids: np.ndarray, centroid_norms: np.ndarray) -> np.ndarray:
+    """Squared L2 distances between rows of x and centroids, without the constant ||x||^2"""
+    return centroid_norms[None, :] - 2.0 * (x @ centroids.T)
+
+
+def assign(x: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    norms = (centroids ** 2).sum(axis=1)
+    labels = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), chunk):
+        labels[start:start + chunk] = _sq_distances(x[start:start + chunk], centroids, norms).argmin(axis=1)
+    return labels
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int = 12, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd's k-means; empty clusters are re-seeded from random points"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        labels = assign(x, centroids)
+        counts = np.bincount(labels, minlength=k).astype(np.float32)
+        one_hot = csr_matrix((np.ones(len(x), dtype=np.float32), (labels, np.arange(len(x)))), shape=(k, len(x)))
+        sums = np.asarray(one_hot @ x, dtype=np.float32)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFPQIndex:
+    def __init__(self, ids: List[str], coarse: np.ndarray, codebooks: np.ndarray,
+                 list_offsets: np.ndarray, list_rows: np.ndarray, codes: np.ndarray,
+                 build_seconds: float = 0.0, fingerprints: Optional[np.ndarray] = None):
+        self.ids = ids
+        self.id_to_row = {pid: i for i, pid in enumerate(ids)}
+        self.coarse = coarse                # (nlist, dim)
+        self.codebooks = codebooks          # (m, 256, dim / m)
+        self.list_offsets = list_offsets    # (nlist + 1,) into list_rows / codes
+        self.list_rows = list_rows          # row ids grouped by list
+        self.codes = codes                  # (n, m) uint8, same order as list_rows
+        self.build_seconds = build_seconds
+        self.fingerprints = fingerprints    # (n, FINGERPRINT_DIMS) by row; None for indexes saved without them
+
+        self.m, _, self.sub_dim = codebooks.shape
+        self.coarse_norms = (coarse ** 2).sum(axis=1)
+        self.codebook_norms = (codebooks ** 2).sum(axis=2)
+        # Where each row sits in list_rows, for reconstruction
+        self.row_position = np.empty(len(ids), dtype=np.int64)
+        self.row_position[list_rows] = np.arange(len(list_rows))
+        self.row_list = np.repeat(np.arange(len(coarse), dtype=np.int32), np.diff(list_offsets))
+
+    @classmethod
+    def build(cls, ids: List[str], vectors: np.ndarray, nlist: Optional[int] = None,
+              m: Optional[int] = None, train_size: int = 25000, seed: int = 0) -> "IVFPQIndex":
+        started = time.time()
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        n, dim = vectors.shape
+        nlist = nlist or max(1, min(settings.ANN_NLIST, n // 39))
+        m = m or settings.ANN_PQ_SUBVECTORS
+        if dim % m:
+            raise ValueError(f"Embedding dim {dim} is not divisible by {m} sub-vectors")
+
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, min(train_size, n), replace=False)]
+        coarse = kmeans(sample, nlist, seed=seed)
+        labels = assign(vectors, coarse)
+
+        residuals = vectors - coarse[labels]
+        sub_dim = dim // m
+        sample_residuals = residuals[rng.choice(n, min(train_size, n), replace=False)]
+        codebooks = np.zeros((m, PQ_CENTROIDS, sub_dim), dtype=np.float32)
+        for j in range(m):
+            part = slice(j * sub_dim, (j + 1) * sub_dim)
+            book = kmeans(sample_residuals[:, part], PQ_CENTROIDS, iterations=8, seed=seed + j)
+            codebooks[j, :len(book)] = book
+        codes = cls._encode(residuals, codebooks)
+        return cls._grouped(ids, coarse, codebooks, labels, codes, time.time() - started, fingerprint(vectors))
+
+    @staticmethod
+    def _encode(residuals: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+        m, _, sub_dim = codebooks.shape
+        codes = np.empty((len(residuals), m), dtype=np.uint8)
+        for j in range(m):
+            codes[:, j] = assign(residuals[:, j * sub_dim:(j + 1) * sub_dim], codebooks[j])
+        return codes
+
+    @classmethod
+    def _grouped(cls, ids: List[str], coarse: np.ndarray, codebooks: np.ndarray, labels: np.ndarray,
+                 codes: np.ndarray, build_seconds: float, fingerprints: np.ndarray) -> "IVFPQIndex":
+        """Index from per-row list labels and codes, grouping rows into their inverted lists"""
+        order = np.argsort(labels, kind="stable")
+        list_offsets = np.searchsorted(labels[order], np.arange(len(coarse) + 1)).astype(np.int64)
+        return cls(ids, coarse, codebooks, list_offsets, order.astype(np.int64), codes[order],
+                   build_seconds=build_seconds, fingerprints=fingerprints)
+
+    def add(self, ids: List[str], vectors: np.ndarray, remove: Sequence[str] = ()) -> "IVFPQIndex":
+        """
+        A copy without the rows of `remove`, and with `ids` appended, encoded
+        against the trained centroids and codebooks. Re-embedded products are
+        passed in both, so their old codes are replaced.
+        """
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        labels = assign(vectors, self.coarse)
+        codes = self._encode(vectors - self.coarse[labels], self.codebooks)
+        old_labels = np.empty(len(self.ids), dtype=np.int32)
+        old_labels[self.list_rows] = self.row_list
+        old_codes = np.empty_like(self.codes)
+        old_codes[self.list_rows] = self.codes
+        old_fingerprints = (
+            self.fingerprints if self.fingerprints is not None
+            else np.full((len(self.ids), FINGERPRINT_DIMS), np.nan, dtype=np.float32)
+        )
+        removed = set(remove)
+        keep = np.array([pid not in removed for pid in self.ids], dtype=bool)
+        return self._grouped(
+            [pid for pid, kept in zip(self.ids, keep) if kept] + list(ids),
+            self.coarse,
+            self.codebooks,
+            np.concatenate([old_labels[keep], labels]),
+            np.concatenate([old_codes[keep], codes]),
+            self.build_seconds,
+            np.concatenate([old_fingerprints[keep], fingerprint(vectors)]),
+        )
+
+    def changes(self, matrix: EmbeddingMatrix) -> Tuple[List[int], List[str]]:
+        """
+        Rows of `matrix` that are missing from the index or were re-embedded
+        since they were encoded, and indexed ids that `matrix` no longer has.
+        Without saved fingerprints every indexed product counts as changed.
+        """
+        rows = np.array([self.id_to_row.get(pid, -1) for pid in matrix.ids], dtype=np.int64)
+        stale = rows < 0
+        if self.fingerprints is None:
+            stale[:] = True
+        elif (~stale).any():
+            known = np.flatnonzero(~stale)
+            current = fingerprint(np.asarray(matrix.matrix[known]))
+            differs = ~np.isclose(current, self.fingerprints[rows[known]], atol=1e-4).all(axis=1)
+            stale[known[differs]] = True
+        gone = [pid for pid in self.ids if pid not in matrix.id_to_row]
+        return np.flatnonzero(stale).tolist(), gone
+
+    # ---------- persistence ----------
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            ids=np.array(self.ids),
+            coarse=self.coarse,
+            codebooks=self.codebooks,
+            list_offsets=self.list_offsets,
+            list_rows=self.list_rows,
+            codes=self.codes,
+            build_seconds=np.array(self.build_seconds),
+            **({"fingerprints": self.fingerprints} if self.fingerprints is not None else {}),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFPQIndex":
+        with np.load(path) as data:
+            return cls(
+                [str(i) for i in data["ids"]],
+                data["coarse"],
+                data["codebooks"],
+                data["list_offsets"],
+                data["list_rows"],
+                data["codes"],
+                build_seconds=float(data["build_seconds"]),
+                fingerprints=data["fingerprints"] if "fingerprints" in data else None,
+            )
+
+    # ---------- querying ----------
+
+    def reconstruct(self, row: int) -> np.ndarray:
+        """Approximate vector for a row: its centroid plus the decoded residual"""
+        codes = self.codes[self.row_position[row]]
+        residual = self.codebooks[np.arange(self.m), codes].reshape(-1)
+        return self.coarse[self.row_list[self.row_position[row]]] + residual
+
+    def search(self, query: np.ndarray, k: int, nprobe: Optional[int] = None,
+               exact: Optional[EmbeddingMatrix] = None, rerank_factor: int = 4) -> List[Tuple[str, float]]:
+        """
+        Approximate top-k (product_id, cosine). With `exact`, the best
+        k * rerank_factor candidates are re-scored against the float matrix.
+        """
+        nprobe = min(nprobe or settings.ANN_NPROBE, len(self.coarse))
+        query = query.astype(np.float32) / max(float(np.linalg.norm(query)), 1e-12)
+
+        coarse_dist = self.coarse_norms - 2.0 * (self.coarse @ query)
+        probes = np.argpartition(coarse_dist, nprobe - 1)[:nprobe]
+
+        cand_rows, cand_dist = [], []
+        for lst in probes:
+            lo, hi = self.list_offsets[lst], self.list_offsets[lst + 1]
+            if lo == hi:
+                continue
+            residual = (query - self.coarse[lst]).reshape(self.m, self.sub_dim)
+            # (m, 256) table of squared distances from each query sub-vector to each sub-centroid
+            table = self.codebook_norms - 2.0 * np.einsum("mkd,md->mk", self.codebooks, residual)
+            table += (residual ** 2).sum(axis=1, keepdims=True)
+            codes = self.codes[lo:hi]
+            cand_dist.append(table[np.arange(self.m)[None, :], codes].sum(axis=1))
+            cand_rows.append(self.list_rows[lo:hi])
+        if not cand_rows:
+            return []
+
+        rows = np.concatenate(cand_rows)
+        dist = np.concatenate(cand_dist)
+        shortlist = min(len(rows), k * rerank_factor if exact is not None else k)
+        best = np.argpartition(dist, shortlist - 1)[:shortlist]
+        rows, dist = rows[best], dist[best]
+
+        if exact is not None:
+            exact_rows = np.array([exact.id_to_row.get(self.ids[r], -1) for r in rows])
+            known = exact_rows >= 0
+            rows, exact_rows = rows[known], exact_rows[known]
+            scores = exact.matrix[exact_rows] @ query
+        else:
+            # ||q - x||^2 = 2 - 2cos for unit vectors
+            scores = 1.0 - dist / 2.0
+
+        order = np.argsort(-scores)[:k]
+        return [(self.ids[rows[i]], float(scores[i])) for i in order]
+
+    def similar_to(self, product_id: str, k: int, exact: Optional[EmbeddingMatrix] = None) -> List[Tuple[str, float]]:
+        """
+        Neighbours of a product, excluding the product itself. Its exact
+        vector is the query when `exact` has it, so products embedded after
+        the index was built still get neighbours.
+        """
+        exact_row = exact.id_to_row.get(product_id) if exact is not None else None
+        row = self.id_to_row.get(product_id)
+        if exact_row is not None:
+            query = exact.matrix[exact_row]
+        elif row is not None:
+            query = self.reconstruct(row)
+        else:
+            return []
+        hits = self.search(query, k + 1, exact=exact)
+        return [(pid, score) for pid, score in hits if pid != product_id][:k]
+
+    def stats(self) -> Dict:
+        memory = (self.coarse.nbytes + self.codebooks.nbytes + self.codes.nbytes
+                  + self.list_rows.nbytes + self.list_offsets.nbytes)
+        return {
+            "vectors": len(self.ids),
+            "nlist": len(self.coarse),
+            "pq_subvectors": self.m,
+            "memory_bytes": int(memory),
+            "bytes_per_vector": round(memory / max(len(self.ids), 1), 1),
+            "build_seconds": round(self.build_seconds, 2),
+        }
+
+
+_index: Optional[IVFPQIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_ann_index() -> Optional[IVFPQIndex]:
+    return _index
+
+
+def load_or_build_ann_index(rebuild: bool = False) -> Optional[IVFPQIndex]:
+    """
+    Load the persisted index, or train one from the loaded embedding matrix
+    and persist it. A loaded index is brought up to date with the matrix
+    (new and re-embedded products encoded, removed ones dropped) and the
+    result persisted; it is retrained once too many products changed.
+    """
+    global _index
+    with _index_lock:
+        path = settings.ANN_INDEX_PATH
+        matrix = get_embedding_matrix()
+
+        if not rebuild and os.path.exists(path):
+            index = IVFPQIndex.load(path)
+            stale_rows, gone = ([], []) if matrix is None else index.changes(matrix)
+            if matrix is None or len(stale_rows) + len(gone) <= ANN_RETRAIN_FRACTION * len(matrix):
+                if stale_rows or gone:
+                    stale_ids = [matrix.ids[row] for row in stale_rows]
+                    index = index.add(stale_ids, matrix.matrix[stale_rows], remove=stale_ids + gone)
+                    index.save(path)
+                    print(f"[Vectors] Updated the ANN index: {len(stale_rows)} products encoded, "
+                          f"{len(gone)} removed")
+                _index = index
+                print(f"[Vectors] Loaded ANN index from {path}: {index.stats()}")
+                return _index
+
+        if matrix is None or len(matrix) == 0:
+            print("[Vectors] No embeddings loaded; skipping ANN index build")
+            return _index
+
+        index = IVFPQIndex.build(matrix.ids, matrix.matrix)
+        index.save(path)
+        _index = index
+        print(f"[Vectors] ✅ Built ANN index: {index.stats()}")
+        return _index
+
+
+if __name__ == "__main__":
+    # Offline rebuild: python -m vectors.ann
+    from vectors.store import refresh_embeddings
+    refresh_embeddings()
+    load_or_build_ann_index(rebuild=True)
@@ -0,0 +1,237 @@
+"""
+Regenerate product clusters from embeddings.
+
+Runs mini-batch k-means (spherical, since embeddings are unit length) over
+the memory-mapped embedding store: each step samples a batch of rows,
+assigns it to the nearest centroid and moves those centroids by the running
+mean of everything they have absorbed. Only the batch and the centroids are
+ever resident, so memory does not grow with the catalog. A final pass
+assigns every product in fixed-size chunks spread over a process pool, and
+the labels are written back in bulk through `bulk_update_cluster_ids`
+before `refresh_clusters` recounts the `clusters` table and retitles the
+clusters it titled itself (scripts/007-cluster-assignments.sql). Products
+that are not in the store lose their cluster_id, since a label from an
+earlier run no longer means the same cluster.
+
+Centroids are saved between runs and reused as the starting point, so
+cluster ids stay stable when the catalog only drifts. Centroid row i is
+cluster id i + CLUSTER_ID_OFFSET.
+
+    python -m vectors.clustering                 # export the store if missing or stale, cluster, write back
+    python -m vectors.clustering --k 300 --fresh # new cluster count, ignore saved centroids
+    python -m vectors.clustering --dry-run       # report cluster sizes without writing
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from config import settings
+from vectors.ann import assign
+from vectors.quantized import QuantizedEmbeddingStore, export, source_state, stale_reason, store_exists
+from vectors.store import normalize_rows
+
+ASSIGN_CHUNK_ROWS = 65536
+WRITE_BATCH = 1000
+REASSIGN_EVERY = 10
+REASSIGN_RATIO = 0.01
+PAGE_SIZE = 1000
+
+# Cluster ids start at 1: the frontend and the clusters table treat 0 as "no cluster"
+CLUSTER_ID_OFFSET = 1
+
+_worker_store: Optional[QuantizedEmbeddingStore] = None
+
+
+def _sample_rows(rng: np.random.Generator, n: int, size: int) -> np.ndarray:
+    # Sorted so reads from the memmap move forward through the file
+    return np.sort(rng.choice(n, min(size, n), replace=False))
+
+
+def init_centroids(store: QuantizedEmbeddingStore, k: int, rng: np.random.Generator,
+                   sample_size: int = 20000) -> np.ndarray:
+    """k-means++ seeding on a uniform sample of rows"""
+    sample = np.asarray(store.matrix[_sample_rows(rng, len(store), sample_size)])
+    centroids = np.empty((k, sample.shape[1]), dtype=np.float32)
+    centroids[0] = sample[rng.integers(len(sample))]
+    closest = 2.0 - 2.0 * (sample @ centroids[0])
+    for i in range(1, k):
+        weights = np.clip(closest, 0, None)
+        total = weights.sum()
+        pick = rng.choice(len(sample), p=weights / total) if total > 0 else rng.integers(len(sample))
+        centroids[i] = sample[pick]
+        closest = np.minimum(closest, 2.0 - 2.0 * (sample @ centroids[i]))
+    return centroids
+
+
+def minibatch_kmeans(store: QuantizedEmbeddingStore, k: int, batch_size: int, epochs: float,
+                     tol: float, seed: int, initial: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int]:
+    """Sculley-style mini-batch updates with per-centroid learning rate 1 / count"""
+    rng = np.random.default_rng(seed)
+    n = len(store)
+    k = min(k, n)
+    centroids = initial.astype(np.float32) if initial is not None else init_centroids(store, k, rng)
+    counts = np.zeros(k, dtype=np.float64)
+    steps = max(1, int(np.ceil(epochs * n / batch_size)))
+
+    for step in range(steps):
+        batch = np.asarray(store.matrix[_sample_rows(rng, n, batch_size)])
+        labels = assign(batch, centroids)
+        one_hot = csr_matrix((np.ones(len(batch), dtype=np.float32), (labels, np.arange(len(batch)))),
+                             shape=(k, len(batch)))
+        sums = np.asarray(one_hot @ batch, dtype=np.float64)
+        batch_counts = np.bincount(labels, minlength=k)
+
+        touched = batch_counts > 0
+        new_counts = counts[touched] + batch_counts[touched]
+        previous = centroids.copy()
+        centroids[touched] = ((centroids[touched] * counts[touched, None] + sums[touched])
+                              / new_counts[:, None]).astype(np.float32)
+        counts[touched] = new_counts
+        centroids = normalize_rows(centroids)
+
+        # Centroids that have absorbed almost nothing are re-seeded on points of the batch
+        if step % REASSIGN_EVERY == REASSIGN_EVERY - 1:
+            starved = counts < REASSIGN_RATIO * counts.max()
+            if starved.any():
+                picks = rng.choice(len(batch), int(starved.sum()), replace=len(batch) < starved.sum())
+                centroids[starved] = batch[picks]
+                counts[starved] = counts[~starved].min() if (~starved).any() else 0
+
+        shift = float(np.abs(centroids - previous).max())
+        if step >= 10 and shift < tol:
+            return centroids, step + 1
+    return centroids, steps
+
+
+def _init_worker(directory: str):
+    global _worker_store
+    _worker_store = QuantizedEmbeddingStore(directory)
+
+
+def _assign_range(args: Tuple[int, int, np.ndarray]) -> Tuple[int, np.ndarray]:
+    start, stop, centroids = args
+    return start, assign(np.asarray(_worker_store.matrix[start:stop]), centroids)
+
+
+def assign_all(directory: str, n: int, centroids: np.ndarray, workers: int) -> np.ndarray:
+    """Label every row, one chunk per task across a process pool"""
+    labels = np.empty(n, dtype=np.int32)
+    tasks = [(start, min(start + ASSIGN_CHUNK_ROWS, n), centroids) for start in range(0, n, ASSIGN_CHUNK_ROWS)]
+    if workers <= 1:
+        _init_worker(directory)
+        results = map(_assign_range, tasks)
+        for start, chunk in results:
+            labels[start:start + len(chunk)] = chunk
+        return labels
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(directory,)) as pool:
+        for start, chunk in pool.map(_assign_range, tasks):
+            labels[start:start + len(chunk)] = chunk
+    return labels
+
+
+def clustered_ids(supabase) -> List[str]:
+    """Ids of every product that currently has a cluster_id"""
+    ids: List[str] = []
+    offset = 0
+    while True:
+        result = (
+            supabase.table("products")
+            .select("id")
+            .not_.is_("cluster_id", "null")
+            .order("id")
+            .range(offset, offset + PAGE_SIZE - 1)
+            .execute()
+        )
+        data = result.data or []
+        ids.extend(str(row["id"]) for row in data)
+        if len(data) < PAGE_SIZE:
+            return ids
+        offset += PAGE_SIZE
+
+
+def write_assignments(ids: List[str], labels: np.ndarray):
+    """Write labels for the store's products and clear cluster_id on every other product"""
+    from database import get_supabase
+    supabase = get_supabase()
+    if not supabase:
+        raise Exception("Supabase client not initialized")
+
+    assigned = set(ids)
+    rows = [{"id": pid, "cluster_id": int(label) + CLUSTER_ID_OFFSET} for pid, label in zip(ids, labels)]
+    cleared = [{"id": pid, "cluster_id": None} for pid in clustered_ids(supabase) if pid not in assigned]
+    rows.extend(cleared)
+
+    changed = 0
+    for start in range(0, len(rows), WRITE_BATCH):
+        result = supabase.rpc("bulk_update_cluster_ids", {"rows": rows[start:start + WRITE_BATCH]}).execute()
+        changed += int(result.data or 0)
+    refreshed = supabase.rpc("refresh_clusters", {}).execute()
+    print(f"[Clustering] ✅ Reassigned {changed} products ({len(cleared)} not in the store cleared); "
+          f"{refreshed.data} clusters refreshed")
+
+
+def ensure_current_store(directory: str):
+    """Export the store when it is missing or no longer matches the database (see refresh_embeddings)"""
+    if store_exists(directory):
+        reason = stale_reason(QuantizedEmbeddingStore(directory).meta, source_state())
+        if reason is None:
+            return
+        print(f"[Clustering] Embedding store is stale ({reason}); re-exporting")
+    export(directory, settings.EMBEDDING_STORE_DTYPE)
+
+
+def run(args) -> int:
+    ensure_current_store(args.dir)
+    store = QuantizedEmbeddingStore(args.dir)
+    if len(store) == 0:
+        print("[Clustering] No embeddings; nothing to cluster")
+        return 1
+
+    initial = None
+    if not args.fresh and os.path.exists(args.centroids):
+        saved = np.load(args.centroids)
+        if saved.shape == (min(args.k, len(store)), store.matrix.shape[1]):
+            initial = saved
+            print(f"[Clustering] Warm-starting from {args.centroids}")
+
+    started = time.time()
+    centroids, steps = minibatch_kmeans(store, args.k, args.batch_size, args.epochs, args.tol, args.seed, initial)
+    fitted = time.time()
+    labels = assign_all(args.dir, len(store), centroids, args.workers)
+    assigned = time.time()
+
+    sizes = np.bincount(labels, minlength=len(centroids))
+    print(f"[Clustering] {len(store)} products into {len(centroids)} clusters: "
+          f"fit {fitted - started:.1f}s ({steps} steps), assign {assigned - fitted:.1f}s; "
+          f"sizes min {sizes.min()}, median {int(np.median(sizes))}, max {sizes.max()}")
+    if args.dry_run:
+        return 0
+
+    os.makedirs(os.path.dirname(args.centroids) or ".", exist_ok=True)
+    np.save(args.centroids, centroids)
+    write_assignments(store.ids, labels)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate product clusters from embeddings")
+    parser.add_argument("--k", type=int, default=settings.CLUSTER_COUNT, help="number of clusters")
+    parser.add_argument("--batch-size", type=int, default=4096, help="rows per mini-batch")
+    parser.add_argument("--epochs", type=float, default=3.0, help="mini-batch passes over the catalog")
+    parser.add_argument("--tol", type=float, default=1e-4, help="stop once no centroid moves more than this")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for the assign pass")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", default=settings.EMBEDDING_STORE_DIR)
+    parser.add_argument("--centroids", default=settings.CLUSTER_CENTROIDS_PATH)
+    parser.add_argument("--fresh", action="store_true", help="ignore saved centroids")
+    parser.add_argument("--dry-run", action="store_true", help="do not write cluster ids back")
+    raise SystemExit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
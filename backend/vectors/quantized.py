@@ -0,0 +1,212 @@
+"""
+Quantised, memory-mapped embedding store.
+
+`python -m vectors.quantized export` streams every product embedding out of
+the database once and writes a directory of flat files:
+
+    ids.json      product ids, one per row
+    codes.bin     row-major int8 (with per-row scale) or float16 vectors
+    scales.bin    float32 per-row scale (int8 only)
+    exact.bin     row-major float32 vectors, only touched for re-scoring
+    meta.json     dtype, dim, count, and the state of the source it was exported from
+
+All files are opened with np.memmap, so workers on one host share the page
+cache instead of each holding a private float32 copy. Search scans the
+quantised codes (a quarter or half of the float32 bytes) and re-scores the
+best `k * EMBEDDING_RESCORE_FACTOR` candidates exactly against exact.bin.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import settings
+from vectors.store import EmbeddingMatrix, merge_top_k, normalize_rows
+
+SUPPORTED_DTYPES = ("int8", "float16")
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Codes (and per-row scales for int8) for already normalised vectors"""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def write_store(
+    directory: str,
+    pages: Iterable[Tuple[List[str], np.ndarray]],
+    dtype: str = "int8",
+    source: Optional[Dict] = None,
+) -> Dict:
+    """
+    Write a store from (ids, vectors) pages in a single streaming pass, then
+    swap it into place so readers never see a half-written directory.
+    `source` (see `source_state`) is recorded in meta.json for staleness checks.
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"dtype must be one of {SUPPORTED_DTYPES}")
+    tmp_dir = f"{directory}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    ids: List[str] = []
+    dim = None
+    with open(os.path.join(tmp_dir, "codes.bin"), "wb") as codes_file, \
+            open(os.path.join(tmp_dir, "scales.bin"), "wb") as scales_file, \
+            open(os.path.join(tmp_dir, "exact.bin"), "wb") as exact_file:
+        for page_ids, vectors in pages:
+            vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+            dim = vectors.shape[1]
+            codes, scales = quantize(vectors, dtype)
+            codes_file.write(codes.tobytes())
+            if scales is not None:
+                scales_file.write(scales.tobytes())
+            exact_file.write(vectors.tobytes())
+            ids.extend(page_ids)
+
+    meta = {"dtype": dtype, "dim": dim or settings.EMBEDDING_DIM, "count": len(ids), "created_at": time.time()}
+    if source is not None:
+        meta["source"] = source
+    with open(os.path.join(tmp_dir, "ids.json"), "w") as f:
+        json.dump(ids, f)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    # Open memmaps keep the old files alive until their readers drop them
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+    return meta
+
+
+def store_exists(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, "meta.json"))
+
+
+def source_state() -> Dict:
+    """Embedded row count and latest `embedding_updated_at` in the database"""
+    from vectors.store import embedding_source_state
+    count, latest = embedding_source_state()
+    return {"count": count, "latest_update": latest}
+
+
+def stale_reason(meta: Dict, current: Dict) -> Optional[str]:
+    """Why a store exported from meta["source"] no longer matches `current`, or None"""
+    exported = meta.get("source") or {"count": meta["count"], "latest_update": None}
+    if current["count"] != exported["count"]:
+        return f"{exported['count']} embedded products at export, {current['count']} now"
+    latest, exported_latest = current["latest_update"], exported["latest_update"]
+    if latest is not None and (
+        exported_latest is None or datetime.fromisoformat(latest) > datetime.fromisoformat(exported_latest)
+    ):
+        return f"embeddings updated at {latest}, after the export"
+    return None
+
+
+class QuantizedEmbeddingStore(EmbeddingMatrix):
+    """Drop-in replacement for EmbeddingMatrix backed by memory-mapped files"""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        with open(os.path.join(directory, "ids.json")) as f:
+            self.ids = json.load(f)
+        self.id_to_row = {pid: i for i, pid in enumerate(self.ids)}
+        self._row_ordinals = None
+
+        count, dim = self.meta["count"], self.meta["dim"]
+        self.dtype = self.meta["dtype"]
+        shape = (count, dim)
+
+        def open_file(name: str, dtype, file_shape: Tuple[int, ...]) -> np.ndarray:
+            # np.memmap cannot map the empty files of a zero-row export
+            if count == 0:
+                return np.empty(file_shape, dtype=dtype)
+            return np.memmap(os.path.join(directory, name), dtype=dtype, mode="r", shape=file_shape)
+
+        self.codes = open_file("codes.bin", self.dtype, shape)
+        self.scales = open_file("scales.bin", np.float32, (count,)) if self.dtype == "int8" else None
+        # `matrix` keeps the EmbeddingMatrix contract (exact float32 rows) for re-scoring and the ANN index
+        self.matrix = open_file("exact.bin", np.float32, shape)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes scanned per query (the exact file is only paged in for re-scoring)"""
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def approximate_scores(self, start: int, stop: int, queries: np.ndarray) -> np.ndarray:
+        block = self.codes[start:stop].astype(np.float32)
+        scores = block @ queries.T
+        if self.scales is not None:
+            scores *= self.scales[start:stop, None]
+        return scores
+
+    def search_many(
+        self,
+        queries: np.ndarray,
+        k: int,
+        masks: Optional[Sequence[Optional[np.ndarray]]] = None,
+        block_rows: Optional[int] = None,
+        rescore: bool = True,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        queries = np.atleast_2d(queries).astype(np.float32, copy=False)
+        block_rows = block_rows or settings.SEMANTIC_BLOCK_ROWS
+        n, batch = len(self.ids), queries.shape[0]
+        masks = masks or [None] * batch
+        shortlist = k * settings.EMBEDDING_RESCORE_FACTOR if rescore else k
+
+        best_scores = [np.empty(0, dtype=np.float32) for _ in range(batch)]
+        best_rows = [np.empty(0, dtype=np.int64) for _ in range(batch)]
+        for start in range(0, n, block_rows):
+            stop = min(start + block_rows, n)
+            block_scores = self.approximate_scores(start, stop, queries)
+            block_index = np.arange(start, stop, dtype=np.int64)
+            for q in range(batch):
+                scores, rows = block_scores[:, q], block_index
+                if masks[q] is not None:
+                    allowed = masks[q][start:stop]
+                    scores, rows = scores[allowed], rows[allowed]
+                scores, rows = merge_top_k(scores, rows, shortlist)
+                best_scores[q], best_rows[q] = merge_top_k(
+                    np.concatenate([best_scores[q], scores]),
+                    np.concatenate([best_rows[q], rows]),
+                    shortlist,
+                )
+
+        results = []
+        for q, (scores, rows) in enumerate(zip(best_scores, best_rows)):
+            if rescore and len(rows):
+                # Sorted row order turns the exact reads into a forward scan of the file
+                rows = np.sort(rows)
+                scores = np.asarray(self.matrix[rows]) @ queries[q]
+            order = np.argsort(-scores, kind="stable")[:k]
+            results.append((rows[order], scores[order]))
+        return results
+
+
+def export(directory: str, dtype: str) -> Dict:
+    from vectors.store import iter_embedding_pages
+    started = time.time()
+    # Taken before streaming, so writes during the export make the store look stale rather than current
+    source = source_state()
+    meta = write_store(directory, iter_embedding_pages(), dtype, source)
+    print(f"[Vectors] ✅ Exported {meta['count']} embeddings as {dtype} to {directory} "
+          f"in {time.time() - started:.1f}s")
+    return meta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantised embedding store")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--dir", default=settings.EMBEDDING_STORE_DIR)
+    parser.add_argument("--dtype", choices=SUPPORTED_DTYPES, default=settings.EMBEDDING_STORE_DTYPE)
+    args = parser.parse_args()
+    export(args.dir, args.dtype)
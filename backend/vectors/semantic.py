@@ -0,0 +1,138 @@
+"""
+Semantic product search: encode the query with the same MiniLM model that
+`embedding.py` uses for products, then run cosine top-k over the embedding
+matrix.
+
+Query vectors are kept in an LRU cache. Concurrent requests are micro-batched:
+the first request opens a short window, every request arriving inside it
+joins the batch, and the batch is encoded with one `model.encode` call and
+scored with one blocked pass over the matrix, off the event loop.
+"""
+import asyncio
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from utils.cache import LRUCache
+from vectors.store import EmbeddingMatrix
+
+_model = None
+_model_lock = threading.Lock()
+
+query_vector_cache = LRUCache(maxsize=settings.SEMANTIC_QUERY_CACHE_SIZE)
+
+
+def get_model():
+    """Load the sentence-transformers model once, on first use"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                print(f"[Vectors] Loading query encoder {settings.EMBEDDING_MODEL}...")
+                _model = SentenceTransformer(settings.EMBEDDING_MODEL)
+    return _model
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def encode_queries(texts: List[str]) -> np.ndarray:
+    """Normalised query vectors, served from the LRU cache where possible"""
+    keys = [normalize_query(t) for t in texts]
+    found, missing = query_vector_cache.get_many(dict.fromkeys(keys))
+    if missing:
+        encoded = get_model().encode(missing, batch_size=len(missing), normalize_embeddings=True)
+        fresh = {key: np.asarray(vec, dtype=np.float32) for key, vec in zip(missing, encoded)}
+        query_vector_cache.set_many(fresh)
+        found.update(fresh)
+    return np.stack([found[key] for key in keys])
+
+
+class _Pending:
+    __slots__ = ("text", "k", "mask", "future")
+
+    def __init__(self, text: str, k: int, mask: Optional[np.ndarray], future: asyncio.Future):
+        self.text = text
+        self.k = k
+        self.mask = mask
+        self.future = future
+
+
+class SemanticBatcher:
+    """Collects concurrent queries for a few milliseconds and serves them as one batch"""
+
+    def __init__(self, window_ms: float, max_batch: int):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending: List[_Pending] = []
+        self._matrix: Optional[EmbeddingMatrix] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.queries = 0
+
+    async def search(
+        self, matrix: EmbeddingMatrix, text: str, k: int, mask: Optional[np.ndarray]
+    ) -> List[Tuple[str, float]]:
+        """Top-k (product_id, cosine) for `text`; `mask` is over the rows of `matrix`"""
+        loop = asyncio.get_running_loop()
+        # Masks are row masks for a specific matrix, so a reload starts a new batch
+        if self._pending and self._matrix is not matrix:
+            self._flush()
+        future = loop.create_future()
+        self._matrix = matrix
+        self._pending.append(_Pending(text, k, mask, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        matrix = self._matrix
+        if not batch or matrix is None:
+            return
+        self.batches += 1
+        self.queries += len(batch)
+        asyncio.get_running_loop().create_task(self._run(matrix, batch))
+
+    async def _run(self, matrix: EmbeddingMatrix, batch: List[_Pending]):
+        try:
+            results = await asyncio.to_thread(self._compute, matrix, batch)
+        except Exception as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        for item, result in zip(batch, results):
+            if not item.future.done():
+                item.future.set_result(result)
+
+    @staticmethod
+    def _compute(matrix: EmbeddingMatrix, batch: List[_Pending]):
+        queries = encode_queries([item.text for item in batch])
+        k = max(item.k for item in batch)
+        results = matrix.search_many(queries, k, [item.mask for item in batch])
+        return [
+            [(matrix.ids[row], float(score)) for row, score in zip(rows[:item.k], scores[:item.k])]
+            for item, (rows, scores) in zip(batch, results)
+        ]
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "query_cache": query_vector_cache.stats(),
+        }
+
+
+batcher = SemanticBatcher(settings.SEMANTIC_BATCH_WINDOW_MS, settings.SEMANTIC_MAX_BATCH)
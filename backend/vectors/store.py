@@ -0,0 +1,261 @@
+"""
+Product embeddings held as one contiguous float32 matrix.
+
+Rows are L2-normalised when loaded, so cosine similarity is a dot product.
+Top-k search walks the matrix in fixed-size row blocks: each block is
+multiplied against a batch of queries at once and merged into a running
+top-k per query, so temporaries stay bounded and concurrent queries share
+a single pass over memory.
+"""
+import json
+import threading
+import time
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import settings
+from database import get_supabase
+from catalog.snapshot import CatalogSnapshot
+
+PAGE_SIZE = 1000
+
+
+def parse_embedding(value: Any) -> Optional[np.ndarray]:
+    """`embedding` comes back as a JSON array or, for pgvector columns, its text form"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    vector = np.asarray(value, dtype=np.float32)
+    if vector.ndim != 1 or vector.shape[0] != settings.EMBEDDING_DIM:
+        return None
+    return vector
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def merge_top_k(
+    scores: np.ndarray, rows: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the k best (score, row) pairs, unordered"""
+    if len(scores) <= k:
+        return scores, rows
+    keep = np.argpartition(-scores, k - 1)[:k]
+    return scores[keep], rows[keep]
+
+
+class EmbeddingMatrix:
+    def __init__(self, ids: List[str], matrix: np.ndarray):
+        self.ids = ids
+        self.id_to_row = {pid: i for i, pid in enumerate(ids)}
+        self.matrix = np.ascontiguousarray(normalize_rows(matrix.astype(np.float32, copy=False)))
+        self._row_ordinals: Optional[Tuple[CatalogSnapshot, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    def row_ordinals(self, snapshot: CatalogSnapshot) -> np.ndarray:
+        """Catalog ordinal of every row (-1 if the product is not in the snapshot)"""
+        cached = self._row_ordinals
+        if cached is not None and cached[0] is snapshot:
+            return cached[1]
+        ordinals = np.array([snapshot.id_to_ordinal.get(pid, -1) for pid in self.ids], dtype=np.int64)
+        self._row_ordinals = (snapshot, ordinals)
+        return ordinals
+
+    def rows_mask(self, snapshot: CatalogSnapshot, catalog_mask: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Translate a mask over catalog ordinals into a mask over matrix rows"""
+        if catalog_mask is None:
+            return None
+        ordinals = self.row_ordinals(snapshot)
+        mask = np.zeros(len(self.ids), dtype=bool)
+        known = ordinals >= 0
+        mask[known] = catalog_mask[ordinals[known]]
+        return mask
+
+    def search_many(
+        self,
+        queries: np.ndarray,
+        k: int,
+        masks: Optional[Sequence[Optional[np.ndarray]]] = None,
+        block_rows: Optional[int] = None,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Exact top-k cosine search for a batch of normalised queries.
+        Returns one (rows, scores) pair per query, best first.
+        """
+        queries = np.atleast_2d(queries).astype(np.float32, copy=False)
+        block_rows = block_rows or settings.SEMANTIC_BLOCK_ROWS
+        n, batch = len(self.ids), queries.shape[0]
+        masks = masks or [None] * batch
+
+        best_scores = [np.empty(0, dtype=np.float32) for _ in range(batch)]
+        best_rows = [np.empty(0, dtype=np.int64) for _ in range(batch)]
+
+        for start in range(0, n, block_rows):
+            stop = min(start + block_rows, n)
+            block_scores = self.matrix[start:stop] @ queries.T  # (block, batch)
+            block_index = np.arange(start, stop, dtype=np.int64)
+            for q in range(batch):
+                scores = block_scores[:, q]
+                rows = block_index
+                if masks[q] is not None:
+                    allowed = masks[q][start:stop]
+                    scores, rows = scores[allowed], rows[allowed]
+                scores, rows = merge_top_k(scores, rows, k)
+                best_scores[q], best_rows[q] = merge_top_k(
+                    np.concatenate([best_scores[q], scores]),
+                    np.concatenate([best_rows[q], rows]),
+                    k,
+                )
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores, kind="stable")
+            results.append((rows[order], scores[order]))
+        return results
+
+    def search(self, query: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_many(query[None, :], k, [mask])[0]
+
+
+def iter_embedding_pages() -> Iterator[Tuple[List[str], np.ndarray]]:
+    """Yield (ids, vectors) for every embedded product, one page at a time"""
+    supabase = get_supabase()
+    if not supabase:
+        raise Exception("Supabase client not initialized")
+
+    offset = 0
+    while True:
+        result = (
+            supabase.table("products")
+            .select("id, embedding")
+            .not_.is_("embedding", "null")
+            .order("id")
+            .range(offset, offset + PAGE_SIZE - 1)
+            .execute()
+        )
+        data = result.data or []
+        ids, vectors = [], []
+        for row in data:
+            vector = parse_embedding(row.get("embedding"))
+            if vector is not None:
+                ids.append(str(row["id"]))
+                vectors.append(vector)
+        if ids:
+            yield ids, np.stack(vectors)
+        if len(data) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+
+def embedding_source_state() -> Tuple[int, Optional[str]]:
+    """
+    Number of embedded products and the latest `embedding_updated_at`
+    (scripts/008-embedding-updated-at.sql); the latter is None when the
+    column is missing or never set.
+    """
+    supabase = get_supabase()
+    if not supabase:
+        raise Exception("Supabase client not initialized")
+
+    result = (
+        supabase.table("products")
+        .select("id", count="exact")
+        .not_.is_("embedding", "null")
+        .limit(1)
+        .execute()
+    )
+    count = result.count or 0
+    try:
+        result = (
+            supabase.table("products")
+            .select("embedding_updated_at")
+            .not_.is_("embedding_updated_at", "null")
+            .order("embedding_updated_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+    except Exception as e:
+        print(f"[Vectors] ⚠️ Could not read embedding_updated_at: {e}")
+        return count, None
+    rows = result.data or []
+    return count, rows[0]["embedding_updated_at"] if rows else None
+
+
+def fetch_embeddings() -> Tuple[List[str], np.ndarray]:
+    """Page `id, embedding` for every embedded product into one preallocated matrix"""
+    ids: List[str] = []
+    capacity = 65536
+    matrix = np.empty((capacity, settings.EMBEDDING_DIM), dtype=np.float32)
+    for page_ids, vectors in iter_embedding_pages():
+        while len(ids) + len(page_ids) > capacity:
+            capacity *= 2
+            matrix = np.resize(matrix, (capacity, settings.EMBEDDING_DIM))
+        matrix[len(ids):len(ids) + len(page_ids)] = vectors
+        ids.extend(page_ids)
+    return ids, matrix[:len(ids)]
+
+
+_matrix: Optional[EmbeddingMatrix] = None
+_load_lock = threading.Lock()
+
+
+def get_embedding_matrix() -> Optional[EmbeddingMatrix]:
+    return _matrix
+
+
+def refresh_embeddings() -> Optional[EmbeddingMatrix]:
+    """
+    Reload the embedding matrix; concurrent callers share one load.
+    Opens the exported quantised store when there is one and it still
+    matches the database, otherwise pages the JSON vectors out of the
+    database.
+    """
+    global _matrix
+    from vectors.quantized import QuantizedEmbeddingStore, source_state, stale_reason, store_exists
+
+    if not _load_lock.acquire(blocking=False):
+        with _load_lock:
+            return _matrix
+    try:
+        started = time.time()
+        store = None
+        if store_exists(settings.EMBEDDING_STORE_DIR):
+            print(f"[Vectors] Opening quantised embedding store at {settings.EMBEDDING_STORE_DIR}...")
+            store = QuantizedEmbeddingStore(settings.EMBEDDING_STORE_DIR)
+            try:
+                reason = stale_reason(store.meta, source_state())
+            except Exception as e:
+                # The store is still the best copy we have if the database cannot be checked
+                print(f"[Vectors] ⚠️ Could not check the store against the database: {e}")
+                reason = None
+            if reason:
+                print(f"[Vectors] ⚠️ Quantised store is stale ({reason}); loading from the database. "
+                      f"Re-export with `python -m vectors.quantized export`.")
+                store = None
+        if store is not None:
+            _matrix = store
+        else:
+            print("[Vectors] Loading product embeddings...")
+            ids, matrix = fetch_embeddings()
+            _matrix = EmbeddingMatrix(ids, matrix)
+        print(
+            f"[Vectors] ✅ Loaded {len(_matrix)} embeddings "
+            f"({_matrix.nbytes / 1e6:.1f} MB) in {time.time() - started:.2f}s"
+        )
+        return _matrix
+    finally:
+        _load_lock.release()
@@ -203,7 +203,7 @@ export function ProductGrid() {
     router.push(`/?${params.toString()}`)
 
     // If product has cluster_id, fetch cluster-based recommendations
-    if (product.cluster_id) {
+    if (product.cluster_id != null) {
       setShowClusterRecs(true)
       try {
         const clusterProducts = await fetchProductsByCluster(product.cluster_id)
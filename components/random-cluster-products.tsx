@@ -2,7 +2,12 @@
 
 import { useState, useEffect } from "react"
 import { useRouter } from "next/navigation"
-import { fetchRandomClusterProducts, fetchProductsByIds, type ClusterInfo } from "@/lib/random-cluster-products"
+import {
+  fetchClusterPage,
+  fetchProductsByIds,
+  fetchRandomClusterProducts,
+  type ClusterInfo,
+} from "@/lib/random-cluster-products"
 import { ProductCard } from "@/components/product-card"
 import { Loader2, ChevronRight } from "lucide-react"
 import type { Product } from "@/lib/types"
@@ -10,9 +15,8 @@ import { Button } from "@/components/ui/button"
 
 interface ClusterWithProducts {
   cluster: ClusterInfo
-  allProducts: Product[]  // All products for this cluster (loaded once)
-  displayedProducts: Product[]  // Currently displayed products
-  displayedCount: number  // How many products are currently shown
+  displayedProducts: Product[]  // Every page loaded so far
+  page: number  // Last page loaded
   hasMore: boolean
   isLoadingMore: boolean
 }
@@ -21,8 +25,9 @@ export function RandomClusterProducts() {
   const router = useRouter()
   const [clustersWithProducts, setClustersWithProducts] = useState<ClusterWithProducts[]>([])
   const [isLoading, setIsLoading] = useState(true)
-  const INITIAL_LIMIT = 5
-  const LOAD_MORE_INCREMENT = 5
+  // Seed of the first response; later pages use it so they continue the same order
+  const [seed, setSeed] = useState<number | null>(null)
+  const PAGE_SIZE = 5
 
   const handleProductClick = (product: Product) => {
     // When a product is clicked from clusters, navigate to the main products section,
@@ -41,42 +46,51 @@ export function RandomClusterProducts() {
     }, 100)
   }
 
-  const loadMoreProducts = (clusterId: number) => {
-    // Client-side pagination - instant loading!
-    setClustersWithProducts(prev =>
-      prev.map(cluster => {
-        if (cluster.cluster.id === clusterId) {
-          const newDisplayedCount = cluster.displayedCount + LOAD_MORE_INCREMENT
-          const newDisplayedProducts = cluster.allProducts.slice(0, newDisplayedCount)
-          const hasMore = newDisplayedCount < cluster.allProducts.length
-          
-          // Scroll the Load More button into view after a brief delay
-          setTimeout(() => {
-            const loadMoreButton = document.getElementById(`load-more-${clusterId}`)
-            if (loadMoreButton) {
-              loadMoreButton.scrollIntoView({ behavior: "smooth", block: "nearest", inline: "end" })
-            }
-          }, 50)
-          
-          return {
-            ...cluster,
-            displayedProducts: newDisplayedProducts,
-            displayedCount: newDisplayedCount,
-            hasMore: hasMore,
-          }
+  const updateCluster = (clusterId: number, update: (cluster: ClusterWithProducts) => ClusterWithProducts) => {
+    setClustersWithProducts(prev => prev.map(cluster => (cluster.cluster.id === clusterId ? update(cluster) : cluster)))
+  }
+
+  const loadMoreProducts = async (clusterData: ClusterWithProducts) => {
+    const clusterId = clusterData.cluster.id
+    if (seed === null || clusterData.isLoadingMore) {
+      return
+    }
+    updateCluster(clusterId, cluster => ({ ...cluster, isLoadingMore: true }))
+    try {
+      // Next page from the backend, in the same seeded order as the first
+      const page = await fetchClusterPage(clusterId, seed, clusterData.page + 1, PAGE_SIZE)
+      const pageProducts = await fetchProductsByIds(page.product_ids)
+      updateCluster(clusterId, cluster => {
+        const shownIds = new Set(cluster.displayedProducts.map((p) => p.id))
+        return {
+          ...cluster,
+          displayedProducts: [...cluster.displayedProducts, ...pageProducts.filter((p) => !shownIds.has(p.id))],
+          page: page.page,
+          hasMore: page.has_more,
+          isLoadingMore: false,
         }
-        return cluster
       })
-    )
+
+      // Scroll the Load More button into view after a brief delay
+      setTimeout(() => {
+        const loadMoreButton = document.getElementById(`load-more-${clusterId}`)
+        if (loadMoreButton) {
+          loadMoreButton.scrollIntoView({ behavior: "smooth", block: "nearest", inline: "end" })
+        }
+      }, 50)
+    } catch (error) {
+      console.error("[RandomClusterProducts] Failed to load more products:", error)
+      updateCluster(clusterId, cluster => ({ ...cluster, isLoadingMore: false }))
+    }
   }
 
   useEffect(() => {
     async function loadClusterProducts() {
       setIsLoading(true)
       try {
-        // Step 1: Fetch ALL products from random clusters (one-time load)
+        // Step 1: Fetch the first page of a few random clusters
         console.log("[RandomClusterProducts] Fetching cluster products...")
-        const data = await fetchRandomClusterProducts()
+        const data = await fetchRandomClusterProducts(PAGE_SIZE)
         console.log("[RandomClusterProducts] Received data:", data)
 
         if (!data.clusters || data.clusters.length === 0) {
@@ -85,43 +99,27 @@ export function RandomClusterProducts() {
           setIsLoading(false)
           return
         }
+        setSeed(data.seed)
 
-        // Step 2: Fetch product details for ALL products in all clusters
+        // Step 2: Fetch product details for those pages in one batch
         const allProductIds = data.clusters.flatMap((c) => c.product_ids)
-        
-        // Fetch products in batches to avoid overwhelming the API
-        const BATCH_SIZE = 100
-        const allProducts: Product[] = []
-        
-        for (let i = 0; i < allProductIds.length; i += BATCH_SIZE) {
-          const batch = allProductIds.slice(i, i + BATCH_SIZE)
-          const batchProducts = await fetchProductsByIds(batch)
-          allProducts.push(...batchProducts)
-        }
+        const allProducts = await fetchProductsByIds(allProductIds)
 
         // Create a map for quick product lookup
         const productMap = new Map(allProducts.map((p) => [p.id, p]))
 
-        // Step 3: Organize products by cluster - store ALL products, show only first 5
+        // Step 3: Organize products by cluster; later pages are fetched on "Load More"
         const clustersWithProds: ClusterWithProducts[] = data.clusters
-          .map((cluster) => {
-            const allClusterProducts = cluster.product_ids
+          .map((cluster) => ({
+            cluster,
+            displayedProducts: cluster.product_ids
               .map((id) => productMap.get(id))
-              .filter((p): p is Product => p !== undefined)
-            
-            // Show only first 5 initially
-            const displayedProducts = allClusterProducts.slice(0, INITIAL_LIMIT)
-            
-            return {
-              cluster,
-              allProducts: allClusterProducts,  // Store all products
-              displayedProducts: displayedProducts,  // Show only first 5
-              displayedCount: INITIAL_LIMIT,
-              hasMore: allClusterProducts.length > INITIAL_LIMIT,
-              isLoadingMore: false,
-            }
-          })
-          .filter((c) => c.allProducts.length > 0)
+              .filter((p): p is Product => p !== undefined),
+            page: cluster.page,
+            hasMore: cluster.has_more,
+            isLoadingMore: false,
+          }))
+          .filter((c) => c.displayedProducts.length > 0)
 
         // Shuffle the clusters for random placement
         const shuffled = [...clustersWithProds].sort(() => Math.random() - 0.5)
@@ -215,9 +213,14 @@ export function RandomClusterProducts() {
                       <Button
                         variant="outline"
                         className="w-full h-full min-h-[200px] flex flex-col items-center justify-center gap-2"
-                        onClick={() => loadMoreProducts(clusterData.cluster.id)}
+                        disabled={clusterData.isLoadingMore}
+                        onClick={() => loadMoreProducts(clusterData)}
                       >
-                        <ChevronRight className="h-6 w-6" />
+                        {clusterData.isLoadingMore ? (
+                          <Loader2 className="h-6 w-6 animate-spin" />
+                        ) : (
+                          <ChevronRight className="h-6 w-6" />
+                        )}
                         <span className="text-sm font-medium">Load More</span>
                       </Button>
                     ) : (
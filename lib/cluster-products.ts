@@ -9,11 +9,11 @@ export async function fetchProductsByCluster(clusterId: number): Promise<Product
   try {
     const backendUrl = getBackendUrl()
     const apiUrl = backendUrl 
-      ? `${backendUrl}/api/random-cluster-products`
-      : `http://localhost:8000/api/random-cluster-products`
+      ? `${backendUrl}/api/random-cluster-products/${clusterId}`
+      : `http://localhost:8000/api/random-cluster-products/${clusterId}`
     
-    // Fetch all cluster products and filter by cluster_id
-    const response = await fetch(apiUrl, {
+    // First page of the cluster itself (a fixed seed keeps the order stable)
+    const response = await fetch(`${apiUrl}?seed=0&page=1&page_size=20`, {
       cache: "no-store",
     })
     
@@ -22,16 +22,13 @@ export async function fetchProductsByCluster(clusterId: number): Promise<Product
       return []
     }
     
-    const data = await response.json()
-    
-    // Find the cluster in the response
-    const cluster = data.clusters?.find((c: any) => c.id === clusterId)
-    if (!cluster || !cluster.product_ids || cluster.product_ids.length === 0) {
+    const cluster = await response.json()
+    if (!cluster.product_ids || cluster.product_ids.length === 0) {
       return []
     }
     
     // Fetch product details using by-ids endpoint
-    const productIds = cluster.product_ids.slice(0, 20)
+    const productIds: string[] = cluster.product_ids
     const idsParam = productIds.join(",")
     const productsResponse = await fetch(`/api/products/by-ids?productIds=${idsParam}`)
     
@@ -1,29 +1,46 @@
 import type { Product } from "./types"
 
+// One page of a cluster's products, in the order fixed by the response seed
 export interface ClusterInfo {
   id: number
   title: string
   description: string
   product_ids: string[]
   total_products?: number
-  has_more?: boolean
-  offset?: number
-  limit?: number
+  page: number
+  has_more: boolean
 }
 
 export interface RandomClusterProductsResponse {
+  seed: number
+  page_size: number
   cluster_products: Record<string, string[]>
   clusters: ClusterInfo[]
 }
 
-export async function fetchRandomClusterProducts(): Promise<RandomClusterProductsResponse> {
-  const response = await fetch(`/api/random-cluster-products`)
+export async function fetchRandomClusterProducts(pageSize: number): Promise<RandomClusterProductsResponse> {
+  const response = await fetch(`/api/random-cluster-products?page_size=${pageSize}`)
   if (!response.ok) {
     throw new Error("Failed to fetch random cluster products")
   }
   return response.json()
 }
 
+// Later pages of one cluster; pass the seed of the first response so pages don't overlap
+export async function fetchClusterPage(
+  clusterId: number,
+  seed: number,
+  page: number,
+  pageSize: number,
+): Promise<ClusterInfo> {
+  const params = new URLSearchParams({ seed: String(seed), page: String(page), page_size: String(pageSize) })
+  const response = await fetch(`/api/random-cluster-products/${clusterId}?${params.toString()}`)
+  if (!response.ok) {
+    throw new Error(`Failed to fetch page ${page} of cluster ${clusterId}`)
+  }
+  return response.json()
+}
+
 export async function fetchProductsByIds(productIds: string[]): Promise<Product[]> {
   if (productIds.length === 0) {
     return []
@@ -0,0 +1,22 @@
+-- Bulk write-back for backend/embedding.py
+-- Takes a JSON array of {"id": ..., "embedding": [...]} objects and updates
+-- every matching product in one statement, instead of one request per row.
+-- jsonb_populate_recordset casts each value to the column's own type, so this
+-- works whether `embedding` is vector(384), float8[] or jsonb.
+
+CREATE OR REPLACE FUNCTION public.bulk_update_embeddings(rows JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated INTEGER;
+BEGIN
+    UPDATE public.products AS p
+    SET embedding = r.embedding
+    FROM jsonb_populate_recordset(NULL::public.products, rows) AS r
+    WHERE p.id = r.id;
+
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$;
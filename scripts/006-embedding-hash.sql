@@ -0,0 +1,38 @@
+-- Incremental re-embedding support for backend/embedding.py
+-- embedding_hash stores a hash of the text each embedding was built from, so
+-- unchanged products are skipped. updated_at lets `embedding.py --since` find
+-- recently edited products.
+
+ALTER TABLE public.products ADD COLUMN IF NOT EXISTS embedding_hash TEXT;
+ALTER TABLE public.products ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+CREATE INDEX IF NOT EXISTS idx_products_created_at ON public.products(created_at);
+CREATE INDEX IF NOT EXISTS idx_products_updated_at ON public.products(updated_at);
+
+-- Reuses update_updated_at_column() from 002-cart-favorites-tables.sql.
+-- Only edits to the embedded text columns bump updated_at, so writing
+-- embeddings back does not mark every product as changed.
+DROP TRIGGER IF EXISTS update_products_updated_at ON public.products;
+CREATE TRIGGER update_products_updated_at
+    BEFORE UPDATE OF name, main_category, sub_category, brand ON public.products
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- Write the hash together with the embedding
+CREATE OR REPLACE FUNCTION public.bulk_update_embeddings(rows JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated INTEGER;
+BEGIN
+    UPDATE public.products AS p
+    SET embedding = r.embedding,
+        embedding_hash = r.embedding_hash
+    FROM jsonb_populate_recordset(NULL::public.products, rows) AS r
+    WHERE p.id = r.id;
+
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$;
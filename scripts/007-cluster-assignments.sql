@@ -0,0 +1,73 @@
+-- Write-back for backend/vectors/clustering.py
+-- bulk_update_cluster_ids takes a JSON array of {"id": ..., "cluster_id": ...}
+-- objects and reassigns every matching product in one statement.
+-- refresh_clusters recomputes clusters.product_count from products.cluster_id,
+-- titles clusters after their most common sub-category, and removes clusters
+-- that no longer have any products. Titles and descriptions are only written
+-- on insert, or when they still hold what refresh_clusters generated last
+-- time (generated_title / generated_description) and the membership now
+-- suggests something else; anything edited by hand, or predating these
+-- columns, is left alone.
+
+CREATE OR REPLACE FUNCTION public.bulk_update_cluster_ids(rows JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated INTEGER;
+BEGIN
+    UPDATE public.products AS p
+    SET cluster_id = r.cluster_id
+    FROM jsonb_populate_recordset(NULL::public.products, rows) AS r
+    WHERE p.id = r.id
+      AND p.cluster_id IS DISTINCT FROM r.cluster_id;
+
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_products_cluster_id ON public.products(cluster_id);
+
+ALTER TABLE public.clusters ADD COLUMN IF NOT EXISTS generated_title TEXT;
+ALTER TABLE public.clusters ADD COLUMN IF NOT EXISTS generated_description TEXT;
+
+CREATE OR REPLACE FUNCTION public.refresh_clusters()
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    refreshed INTEGER;
+BEGIN
+    INSERT INTO public.clusters AS c
+        (id, title, description, product_count, generated_title, generated_description)
+    SELECT id, title, description, product_count, title, description
+    FROM (
+        SELECT
+            cluster_id AS id,
+            mode() WITHIN GROUP (ORDER BY sub_category) AS title,
+            'Top category: ' || mode() WITHIN GROUP (ORDER BY main_category) AS description,
+            COUNT(*) AS product_count
+        FROM public.products
+        WHERE cluster_id IS NOT NULL
+        GROUP BY cluster_id
+    ) AS summary
+    ON CONFLICT (id) DO UPDATE
+    SET product_count = EXCLUDED.product_count,
+        title = CASE WHEN c.title IS NOT DISTINCT FROM c.generated_title
+                     THEN EXCLUDED.title ELSE c.title END,
+        description = CASE WHEN c.description IS NOT DISTINCT FROM c.generated_description
+                           THEN EXCLUDED.description ELSE c.description END,
+        generated_title = CASE WHEN c.title IS NOT DISTINCT FROM c.generated_title
+                               THEN EXCLUDED.generated_title ELSE c.generated_title END,
+        generated_description = CASE WHEN c.description IS NOT DISTINCT FROM c.generated_description
+                                     THEN EXCLUDED.generated_description ELSE c.generated_description END;
+
+    GET DIAGNOSTICS refreshed = ROW_COUNT;
+
+    DELETE FROM public.clusters AS c
+    WHERE NOT EXISTS (SELECT 1 FROM public.products p WHERE p.cluster_id = c.id);
+
+    RETURN refreshed;
+END;
+$$;
@@ -0,0 +1,28 @@
+-- Freshness of the exported quantised embedding store (backend/vectors/quantized.py)
+-- embedding_updated_at records when each embedding was last written, so the
+-- backend can tell that an exported store predates the latest embeddings and
+-- load them from the database instead.
+
+ALTER TABLE public.products ADD COLUMN IF NOT EXISTS embedding_updated_at TIMESTAMP WITH TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS idx_products_embedding_updated_at ON public.products(embedding_updated_at);
+
+-- Stamp every write-back; supersedes the version in 006-embedding-hash.sql
+CREATE OR REPLACE FUNCTION public.bulk_update_embeddings(rows JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated INTEGER;
+BEGIN
+    UPDATE public.products AS p
+    SET embedding = r.embedding,
+        embedding_hash = r.embedding_hash,
+        embedding_updated_at = NOW()
+    FROM jsonb_populate_recordset(NULL::public.products, rows) AS r
+    WHERE p.id = r.id;
+
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$;